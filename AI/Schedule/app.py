@@ -1,114 +1,699 @@
 import os
+import re
+import sys
 import json
-import time
+import uuid
+import asyncio
 import threading
-from datetime import datetime
+import httpx
+from datetime import datetime, timedelta
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from groq import Groq
+from groq import AsyncGroq
 from dotenv import load_dotenv
 
+from recurrence import parse_recurrence, parse_hour_ranges, plan_generation_time
+
+# Make the shared AI/common package importable when this service runs from its own directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm_cache import cache_report, cached_llm_call, cached_llm_call_async
+from common.metrics import counter, instrument_app, record_llm_usage, stage
+from common.profiling import init_profiling
+from common.registry import LLM_REQUEST_TIMEOUT, get_groq_client
+from common.resilience import call_with_resilience, call_with_resilience_async
+from common.tokens import count_tokens
+
 # --- Configuration & Initialization ---
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable Cross-Origin Resource Sharing for website integration
+instrument_app(app, 'schedule')  # Prometheus /metrics and request latency
+init_profiling(app, 'schedule')  # Opt-in per-request profiles under /admin/profiles
 
 # IMPORTANT: Set your GroqCloud API key in a .env file
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-DRAFT_FILE = 'final.json'
+DRAFT_FILE = os.getenv("SCHEDULE_DRAFT_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'final.json'))
+CHAT_MODEL_NAME = "llama3-8b-8192"
+CHAT_TEMPERATURE = 0.75
+
+# How often the scheduler wakes up to look for due jobs
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "15"))
+# Jobs sharing a style profile and due within this window are generated in one LLM call
+COALESCE_WINDOW_SECONDS = float(os.getenv("SCHEDULE_COALESCE_WINDOW_SECONDS", "120"))
+# Upper bound on drafts requested from a single multi-draft call
+COALESCE_MAX_DRAFTS = int(os.getenv("SCHEDULE_COALESCE_MAX_DRAFTS", "8"))
+# 'threaded' runs each due group on its own OS thread with the sync client,
+# 'async' runs timers, generation and persistence on one asyncio event loop
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "threaded").lower()
+# Size of the shared HTTP connection pool (and in-flight call limit) in async mode
+ASYNC_MAX_CONNECTIONS = int(os.getenv("SCHEDULER_ASYNC_MAX_CONNECTIONS", "100"))
+# Drafts are generated this long before their scheduled time and held until it arrives
+PREGENERATE_LEAD_MINUTES = float(os.getenv("PREGENERATE_LEAD_MINUTES", "15"))
+# When the lead time lands in a peak hour, generation may move back at most this far into an off-peak window
+PREGENERATE_MAX_LEAD_HOURS = float(os.getenv("PREGENERATE_MAX_LEAD_HOURS", "12"))
+OFF_PEAK_HOURS = parse_hour_ranges(os.getenv("SCHEDULE_OFF_PEAK_HOURS", "0-7,21-23"))
 
 # Initialize the Groq client
 try:
-    groq_client = Groq(api_key=GROQ_API_KEY)
+    groq_client = get_groq_client()
     print("✅ Groq client initialized successfully.")
 except Exception as e:
     groq_client = None
     print(f"⚠️ Warning: Could not initialize Groq client. The API will not work. Error: {e}")
 
+# --- Scheduler State ---
+# Jobs waiting for their generation time, pre-generated drafts waiting for their
+# scheduled time, and recurring schedules; all guarded by jobs_lock
+pending_jobs = []
+ready_drafts = []
+recurring_schedules = {}
+jobs_lock = threading.Lock()
+# Serializes read-modify-write cycles on DRAFT_FILE across worker threads
+draft_file_lock = threading.Lock()
+scheduler_thread = None
+scheduler_ready = threading.Event()
+# Threaded mode: set when a new job arrives so the scheduler re-computes its sleep
+scheduler_wakeup = threading.Event()
+# Async mode: the event loop, its wake-up event and the pooled async client all live on scheduler_thread
+async_loop = None
+async_wakeup = None
+async_groq_client = None
+
+# Counters exposed on /scheduler_metrics
+scheduler_stats = {
+    'jobs_completed': 0,
+    'jobs_failed': 0,
+    'llm_calls': 0,
+    'coalesced_calls': 0,
+    'coalesced_jobs': 0,
+    'llm_calls_saved': 0,
+    'prompt_tokens_saved': 0,
+    'fallbacks': 0,
+    'drafts_pregenerated': 0,
+    'drafts_released': 0,
+    # LLM calls per hour of day, to check that pre-generation flattens peak-hour load
+    'llm_calls_by_hour': [0] * 24,
+}
+stats_lock = threading.Lock()
+CALLS_SAVED = counter('ai_schedule_llm_calls_saved_total', 'LLM calls avoided by coalescing same-style jobs.')
+TOKENS_SAVED = counter('ai_schedule_prompt_tokens_saved_total', 'Estimated prompt tokens avoided by coalescing.')
+
+
+def _bump_stats(**increments):
+    with stats_lock:
+        for key, value in increments.items():
+            scheduler_stats[key] += value
+
+
+def _record_llm_call(chat_completion):
+    record_llm_usage(CHAT_MODEL_NAME, getattr(chat_completion, 'usage', None))
+    with stats_lock:
+        scheduler_stats['llm_calls'] += 1
+        scheduler_stats['llm_calls_by_hour'][datetime.now().hour] += 1
+
+
+def _record_coalesced_call(job_count: int, prompt_tokens_saved: int):
+    _bump_stats(coalesced_calls=1, coalesced_jobs=job_count,
+                llm_calls_saved=job_count - 1, prompt_tokens_saved=prompt_tokens_saved)
+    CALLS_SAVED.inc(job_count - 1)
+    TOKENS_SAVED.inc(prompt_tokens_saved)
+
 
 # --- Core Logic Functions ---
 
-def generate_post_from_style(client, style_info: dict, prompt_idea: str = None):
+def _build_style_guide(style_info: dict) -> str:
     """
-    Generates a social media post using the Groq API based on a style profile
-    and an optional, specific prompt idea.
+    Builds the style guide block shared by single and multi-draft prompts.
     """
-    print(f"🧠 Generating post for style: {style_info} and idea: '{prompt_idea}'")
-
-    # Base prompt telling the AI its role and to follow the style guide
-    system_prompt = (
-        "Act as an expert social media content creator. Generate one concise and engaging social media post. "
+    return (
         "You must adhere to the following style guide:\n"
         f"**Niche/Topic:** {style_info.get('niche', 'General')}\n"
         f"**Tone:** {style_info.get('tone', 'Neutral')}\n"
         f"**Writing Style:** {style_info.get('writing_style', 'Standard')}\n\n"
     )
 
+
+def _build_single_draft_prompts(style_info: dict, prompt_idea: str = None):
+    """
+    Builds the system and user prompts for a single draft.
+    """
+    # Base prompt telling the AI its role and to follow the style guide
+    system_prompt = (
+        "Act as an expert social media content creator. Generate one concise and engaging social media post. "
+        + _build_style_guide(style_info)
+    )
+
     # Add the specific user idea to the prompt if it exists
     if prompt_idea:
         user_prompt = f"Now, create the post based on this specific idea: '{prompt_idea}'"
     else:
         user_prompt = "Now, create a post based on the niche defined in the style guide."
+    return system_prompt, user_prompt
+
+
+def _chat_messages(system_prompt: str, user_prompt: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def generate_post_from_style(client, style_info: dict, prompt_idea: str = None):
+    """
+    Generates a social media post using the Groq API based on a style profile
+    and an optional, specific prompt idea.
+    """
+    print(f"🧠 Generating post for style: {style_info} and idea: '{prompt_idea}'")
+    system_prompt, user_prompt = _build_single_draft_prompts(style_info, prompt_idea)
+
+    def create():
+        with stage('schedule.generate'):
+            chat_completion = call_with_resilience('schedule.generate', lambda: client.chat.completions.create(
+                messages=_chat_messages(system_prompt, user_prompt),
+                model=CHAT_MODEL_NAME,
+                temperature=CHAT_TEMPERATURE,
+            ))
+        _record_llm_call(chat_completion)
+        return chat_completion.choices[0].message.content.strip()
 
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            model="llama3-8b-8192",
-            temperature=0.75,
-        )
+        # Creative call: only cached when LLM_CACHE_CREATIVE is enabled
+        return cached_llm_call('schedule.generate', CHAT_MODEL_NAME, CHAT_TEMPERATURE,
+                               f"{system_prompt}\n{user_prompt}", create)
+    except Exception as e:
+        print(f"❌ An error occurred with the Groq API: {e}")
+        return None
+
+
+async def generate_post_from_style_async(client, style_info: dict, prompt_idea: str = None):
+    """
+    Async counterpart of generate_post_from_style for the AsyncGroq client.
+    """
+    print(f"🧠 Generating post for style: {style_info} and idea: '{prompt_idea}'")
+    system_prompt, user_prompt = _build_single_draft_prompts(style_info, prompt_idea)
+
+    async def create():
+        with stage('schedule.generate'):
+            chat_completion = await call_with_resilience_async(
+                'schedule.generate', lambda: client.chat.completions.create(
+                    messages=_chat_messages(system_prompt, user_prompt),
+                    model=CHAT_MODEL_NAME,
+                    temperature=CHAT_TEMPERATURE,
+                ))
+        _record_llm_call(chat_completion)
         return chat_completion.choices[0].message.content.strip()
+
+    try:
+        return await cached_llm_call_async('schedule.generate', CHAT_MODEL_NAME, CHAT_TEMPERATURE,
+                                           f"{system_prompt}\n{user_prompt}", create)
     except Exception as e:
         print(f"❌ An error occurred with the Groq API: {e}")
         return None
 
 
-def save_for_review(style_info: dict, generated_draft: str, prompt_idea: str = None):
+DRAFT_MARKER_PATTERN = re.compile(r"^\s*=+\s*DRAFT\s+(\d+)\s*=+\s*$", re.IGNORECASE | re.MULTILINE)
+
+
+def _build_multi_draft_prompts(style_info: dict, prompt_ideas: list):
     """
-    Saves the generated draft and its original context to a JSON file.
+    Builds the system and user prompts asking for one draft per prompt idea,
+    each introduced by a '=== DRAFT n ===' marker line.
     """
-    new_draft = {
+    system_prompt = (
+        f"Act as an expert social media content creator. Generate {len(prompt_ideas)} distinct, concise and "
+        "engaging social media posts, one for each numbered idea. "
+        + _build_style_guide(style_info)
+        + "Start each post with a line containing only its marker, e.g. '=== DRAFT 1 ===', and do not add any "
+        "other text before the first marker or between posts."
+    )
+    idea_lines = []
+    for n, prompt_idea in enumerate(prompt_ideas, start=1):
+        idea = prompt_idea if prompt_idea else "A post based on the niche defined in the style guide."
+        idea_lines.append(f"{n}. {idea}")
+    user_prompt = "Now, create the posts for these ideas:\n" + "\n".join(idea_lines)
+    return system_prompt, user_prompt
+
+
+def split_drafts(content: str, expected: int):
+    """
+    Splits a multi-draft completion into its individual drafts.
+    Returns None when the markers are missing, out of order or the count does not match.
+    """
+    markers = list(DRAFT_MARKER_PATTERN.finditer(content))
+    if len(markers) != expected:
+        return None
+    if [int(m.group(1)) for m in markers] != list(range(1, expected + 1)):
+        return None
+
+    drafts = []
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(content)
+        draft = content[marker.end():end].strip()
+        if not draft:
+            return None
+        drafts.append(draft)
+    return drafts
+
+
+def _read_multi_draft_completion(chat_completion, style_info: dict, prompt_ideas: list,
+                                system_prompt: str, user_prompt: str):
+    """
+    Splits a multi-draft completion and records the calls and prompt tokens saved.
+    """
+    _record_llm_call(chat_completion)
+    drafts = split_drafts(chat_completion.choices[0].message.content, len(prompt_ideas))
+    if drafts is None:
+        print("⚠️ Could not split the multi-draft response.")
+        return None
+
+    # Each single call would resend the full style guide; estimate what one call per job would have cost
+    single_prompt_tokens = 0
+    for prompt_idea in prompt_ideas:
+        single_system, single_user = _build_single_draft_prompts(style_info, prompt_idea)
+        single_prompt_tokens += count_tokens(single_system) + count_tokens(single_user)
+    usage = getattr(chat_completion, 'usage', None)
+    batch_prompt_tokens = getattr(usage, 'prompt_tokens', None) or (
+        count_tokens(system_prompt) + count_tokens(user_prompt))
+    _record_coalesced_call(len(prompt_ideas), max(0, single_prompt_tokens - batch_prompt_tokens))
+    return drafts
+
+
+def generate_posts_from_style_batch(client, style_info: dict, prompt_ideas: list):
+    """
+    Generates one draft per prompt idea for a shared style profile with a single
+    multi-draft chat completion. Returns a list of drafts in input order, or None
+    when the call fails or the response cannot be split.
+    """
+    print(f"🧠 Generating {len(prompt_ideas)} posts in one call for style: {style_info}")
+    system_prompt, user_prompt = _build_multi_draft_prompts(style_info, prompt_ideas)
+
+    try:
+        with stage('schedule.generate_batch'):
+            chat_completion = call_with_resilience('schedule.generate_batch', lambda: client.chat.completions.create(
+                messages=_chat_messages(system_prompt, user_prompt),
+                model=CHAT_MODEL_NAME,
+                temperature=CHAT_TEMPERATURE,
+            ))
+    except Exception as e:
+        print(f"❌ An error occurred with the Groq API: {e}")
+        return None
+    return _read_multi_draft_completion(chat_completion, style_info, prompt_ideas, system_prompt, user_prompt)
+
+
+async def generate_posts_from_style_batch_async(client, style_info: dict, prompt_ideas: list):
+    """
+    Async counterpart of generate_posts_from_style_batch for the AsyncGroq client.
+    """
+    print(f"🧠 Generating {len(prompt_ideas)} posts in one call for style: {style_info}")
+    system_prompt, user_prompt = _build_multi_draft_prompts(style_info, prompt_ideas)
+
+    try:
+        with stage('schedule.generate_batch'):
+            chat_completion = await call_with_resilience_async(
+                'schedule.generate_batch', lambda: client.chat.completions.create(
+                    messages=_chat_messages(system_prompt, user_prompt),
+                    model=CHAT_MODEL_NAME,
+                    temperature=CHAT_TEMPERATURE,
+                ))
+    except Exception as e:
+        print(f"❌ An error occurred with the Groq API: {e}")
+        return None
+    return _read_multi_draft_completion(chat_completion, style_info, prompt_ideas, system_prompt, user_prompt)
+
+
+def _build_draft_record(style_info: dict, generated_draft: str, prompt_idea: str = None,
+                        scheduled_for: datetime = None) -> dict:
+    record = {
         'generation_timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'original_style': style_info,
         'original_prompt_idea': prompt_idea if prompt_idea else 'None (Generated from style only)',
         'generated_draft': generated_draft
     }
-    try:
-        data = []
-        if os.path.exists(DRAFT_FILE) and os.path.getsize(DRAFT_FILE) > 0:
-            with open(DRAFT_FILE, 'r') as f:
-                data = json.load(f)
+    if scheduled_for:
+        record['scheduled_for'] = scheduled_for.strftime('%Y-%m-%d %H:%M:%S')
+    return record
+
+
+def save_drafts_for_review(records: list):
+    """
+    Appends draft records to the JSON file in a single read/write cycle.
+    """
+    if not records:
+        return
+    with draft_file_lock, stage('schedule.persist'):
+        try:
+            data = []
+            if os.path.exists(DRAFT_FILE) and os.path.getsize(DRAFT_FILE) > 0:
+                with open(DRAFT_FILE, 'r') as f:
+                    data = json.load(f)
 
-        data.append(new_draft)
+            data.extend(records)
 
-        with open(DRAFT_FILE, 'w') as f:
-            json.dump(data, f, indent=4)
+            with open(DRAFT_FILE, 'w') as f:
+                json.dump(data, f, indent=4)
 
-        print(f"✅ Draft saved to '{DRAFT_FILE}'.")
-    except (IOError, json.JSONDecodeError) as e:
-        print(f"❌ Could not read or write to the JSON file: {e}")
+            print(f"✅ {len(records)} draft(s) saved to '{DRAFT_FILE}'.")
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"❌ Could not read or write to the JSON file: {e}")
 
 
-def scheduled_task(scheduled_time: datetime, style_info: dict, prompt_idea: str = None):
+def save_for_review(style_info: dict, generated_draft: str, prompt_idea: str = None):
     """
-    This function runs in a background thread, waits for the scheduled time,
-    and then triggers the post generation and saving.
+    Saves the generated draft and its original context to a JSON file.
     """
-    while datetime.now() < scheduled_time:
-        time.sleep(15)
+    save_drafts_for_review([_build_draft_record(style_info, generated_draft, prompt_idea)])
+
 
-    print(f"\n🔔 Time reached! Running scheduled task...")
+def _style_key(style_info: dict) -> str:
+    return json.dumps(style_info, sort_keys=True)
+
+
+def take_due_groups(now: datetime):
+    """
+    Removes every job whose time has come from the queue and groups it with
+    same-style jobs due within COALESCE_WINDOW_SECONDS. Returns a list of job groups.
+    """
+    horizon = now + timedelta(seconds=COALESCE_WINDOW_SECONDS)
+    groups = []
+    with jobs_lock:
+        due_keys = []
+        for job in pending_jobs:
+            if job['due_time'] <= now and job['style_key'] not in due_keys:
+                due_keys.append(job['style_key'])
+        if not due_keys:
+            return groups
+
+        taken = {key: [] for key in due_keys}
+        remaining = []
+        for job in sorted(pending_jobs, key=lambda j: j['due_time']):
+            bucket = taken.get(job['style_key'])
+            if bucket is not None and job['due_time'] <= horizon:
+                bucket.append(job)
+            else:
+                remaining.append(job)
+        pending_jobs[:] = remaining
+
+    for jobs in taken.values():
+        for i in range(0, len(jobs), COALESCE_MAX_DRAFTS):
+            groups.append(jobs[i:i + COALESCE_MAX_DRAFTS])
+    return groups
+
+
+def take_due_releases(now: datetime) -> list:
+    """
+    Removes pre-generated drafts whose scheduled time has arrived and returns their records.
+    """
+    with jobs_lock:
+        due = [item for item in ready_drafts if item['release_time'] <= now]
+        if due:
+            ready_drafts[:] = [item for item in ready_drafts if item['release_time'] > now]
+    return [item['record'] for item in due]
+
+
+def release_due_drafts(now: datetime):
+    records = take_due_releases(now)
+    if records:
+        save_drafts_for_review(records)
+        _bump_stats(drafts_released=len(records))
+
+
+def _finish_job_group(jobs: list, drafts: list):
+    """
+    Saves drafts whose scheduled time has passed and holds pre-generated ones until it arrives.
+    """
+    now = datetime.now()
+    to_save = []
+    completed = 0
+    with jobs_lock:
+        for job, draft in zip(jobs, drafts):
+            if not draft:
+                continue
+            completed += 1
+            record = _build_draft_record(job['style_info'], draft, job['prompt_idea'], job['release_time'])
+            if job['release_time'] > now:
+                ready_drafts.append({'release_time': job['release_time'], 'record': record,
+                                     'schedule_id': job.get('schedule_id')})
+            else:
+                to_save.append(record)
+    save_drafts_for_review(to_save)
+    held = completed - len(to_save)
+    _bump_stats(jobs_completed=completed, jobs_failed=len(jobs) - completed, drafts_pregenerated=held)
+    if held:
+        _wake_scheduler()
+    print("✅ Background task complete.")
+
+
+def _advance_recurring(jobs: list):
+    """
+    Queues the next occurrence for every recurring schedule whose job was just dispatched.
+    """
+    for job in jobs:
+        schedule_id = job.get('schedule_id')
+        if not schedule_id:
+            continue
+        with jobs_lock:
+            entry = recurring_schedules.get(schedule_id)
+            if not entry or not entry['active']:
+                continue
+            next_occurrence = _next_occurrence(entry, job['release_time'])
+            entry['next_occurrence'] = next_occurrence
+            if next_occurrence is None:
+                entry['active'] = False
+                continue
+            if entry['remaining'] is not None:
+                entry['remaining'] -= 1
+        enqueue_job(next_occurrence, entry['style_info'], entry['prompt_idea'], schedule_id)
+
+
+def _next_occurrence(entry: dict, after: datetime):
+    if entry['remaining'] is not None and entry['remaining'] <= 1:
+        return None
+    occurrence = entry['schedule'].next_after(after)
+    if occurrence is None or (entry['until'] and occurrence > entry['until']):
+        return None
+    return occurrence
+
+
+def run_job_group(jobs: list):
+    """
+    Generates drafts for a group of same-style jobs, using one multi-draft call
+    when the group has more than one job and falling back to one call per job.
+    """
+    style_info = jobs[0]['style_info']
+    print(f"\n🔔 Time reached! Running {len(jobs)} scheduled task(s)...")
     if not groq_client:
         print("❌ Cannot generate post because Groq client is not initialized.")
+        _bump_stats(jobs_failed=len(jobs))
         return
 
-    generated_post = generate_post_from_style(groq_client, style_info, prompt_idea)
-    if generated_post:
-        save_for_review(style_info, generated_post, prompt_idea)
-    print("✅ Background task complete.")
+    drafts = None
+    if len(jobs) > 1:
+        drafts = generate_posts_from_style_batch(groq_client, style_info, [job['prompt_idea'] for job in jobs])
+        if drafts is None:
+            print("↩️ Falling back to one generation call per job.")
+            _bump_stats(fallbacks=1)
+    if drafts is None:
+        drafts = [generate_post_from_style(groq_client, style_info, job['prompt_idea']) for job in jobs]
+    _finish_job_group(jobs, drafts)
+
+
+async def run_job_group_async(jobs: list, semaphore: asyncio.Semaphore):
+    """
+    Async counterpart of run_job_group. Fallback calls for a group run concurrently,
+    bounded by the shared connection pool semaphore.
+    """
+    style_info = jobs[0]['style_info']
+    print(f"\n🔔 Time reached! Running {len(jobs)} scheduled task(s)...")
+    if not async_groq_client:
+        print("❌ Cannot generate post because Groq client is not initialized.")
+        _bump_stats(jobs_failed=len(jobs))
+        return
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    drafts = None
+    if len(jobs) > 1:
+        drafts = await bounded(generate_posts_from_style_batch_async(
+            async_groq_client, style_info, [job['prompt_idea'] for job in jobs]))
+        if drafts is None:
+            print("↩️ Falling back to one generation call per job.")
+            _bump_stats(fallbacks=1)
+    if drafts is None:
+        drafts = await asyncio.gather(*[
+            bounded(generate_post_from_style_async(async_groq_client, style_info, job['prompt_idea']))
+            for job in jobs
+        ])
+    # Draft file writes (serialized by draft_file_lock) run off the event loop
+    await asyncio.to_thread(_finish_job_group, jobs, drafts)
+
+
+def scheduler_loop():
+    """
+    Runs in a background thread, waking up when the next job is due (at most
+    every SCHEDULER_TICK_SECONDS) to release held drafts and dispatch due job
+    groups to worker threads.
+    """
+    while True:
+        now = datetime.now()
+        release_due_drafts(now)
+        for jobs in take_due_groups(now):
+            _advance_recurring(jobs)
+            threading.Thread(target=run_job_group, args=(jobs,), daemon=True).start()
+
+        scheduler_wakeup.clear()
+        timeout = _seconds_until_next_event(datetime.now())
+        scheduler_wakeup.wait(SCHEDULER_TICK_SECONDS if timeout is None else min(timeout, SCHEDULER_TICK_SECONDS))
+
+
+def _seconds_until_next_event(now: datetime):
+    """
+    Seconds until the next job must be generated or the next held draft released.
+    """
+    with jobs_lock:
+        times = [job['due_time'] for job in pending_jobs] + [item['release_time'] for item in ready_drafts]
+    if not times:
+        return None
+    return max(0.0, (min(times) - now).total_seconds())
+
+
+def _create_async_groq_client():
+    """
+    Creates the AsyncGroq client on top of one pooled httpx client shared by every job.
+    """
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS,
+                            max_keepalive_connections=ASYNC_MAX_CONNECTIONS),
+        timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT),
+    )
+    return AsyncGroq(api_key=GROQ_API_KEY, http_client=http_client)
+
+
+async def async_scheduler_main():
+    """
+    Event-loop scheduler: sleeps exactly until the next due job or draft release
+    (or until a new job is enqueued) instead of polling, then runs due groups as tasks.
+    """
+    global async_loop, async_wakeup, async_groq_client
+    async_loop = asyncio.get_running_loop()
+    async_wakeup = asyncio.Event()
+    try:
+        async_groq_client = _create_async_groq_client()
+        print("✅ Async Groq client initialized successfully.")
+    except Exception as e:
+        async_groq_client = None
+        print(f"⚠️ Warning: Could not initialize async Groq client. Error: {e}")
+    semaphore = asyncio.Semaphore(ASYNC_MAX_CONNECTIONS)
+    running = set()
+    scheduler_ready.set()
+
+    while True:
+        now = datetime.now()
+        await asyncio.to_thread(release_due_drafts, now)
+        for jobs in take_due_groups(now):
+            _advance_recurring(jobs)
+            task = asyncio.create_task(run_job_group_async(jobs, semaphore))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+        async_wakeup.clear()
+        try:
+            await asyncio.wait_for(async_wakeup.wait(), timeout=_seconds_until_next_event(datetime.now()))
+        except asyncio.TimeoutError:
+            pass
+
+
+def _ensure_scheduler_started():
+    global scheduler_thread
+    with jobs_lock:
+        if scheduler_thread is None:
+            if SCHEDULER_MODE == 'async':
+                scheduler_thread = threading.Thread(target=asyncio.run, args=(async_scheduler_main(),), daemon=True)
+            else:
+                scheduler_thread = threading.Thread(target=scheduler_loop, daemon=True)
+                scheduler_ready.set()
+            scheduler_thread.start()
+    scheduler_ready.wait()
+
+
+def _wake_scheduler():
+    """
+    Makes the scheduler re-arm its timer after a new job or held draft was added.
+    """
+    if SCHEDULER_MODE == 'async':
+        async_loop.call_soon_threadsafe(async_wakeup.set)
+    else:
+        scheduler_wakeup.set()
+
+
+def enqueue_job(scheduled_time: datetime, style_info: dict, prompt_idea: str = None,
+                schedule_id: str = None) -> str:
+    """
+    Adds a post generation job to the scheduler queue and returns its id.
+    The draft is generated ahead of `scheduled_time` (see plan_generation_time)
+    and released to the review file when `scheduled_time` arrives.
+    """
+    job_id = uuid.uuid4().hex
+    style_key = _style_key(style_info)
+    job = {
+        'id': job_id,
+        'due_time': plan_generation_time(
+            scheduled_time, datetime.now(),
+            lead=timedelta(minutes=PREGENERATE_LEAD_MINUTES),
+            max_lead=timedelta(hours=PREGENERATE_MAX_LEAD_HOURS),
+            off_peak_hours=OFF_PEAK_HOURS,
+            # Same-style jobs get the same off-peak slot, so they are still coalesced
+            spread_key=style_key,
+        ),
+        'release_time': scheduled_time,
+        'style_info': style_info,
+        'style_key': style_key,
+        'prompt_idea': prompt_idea,
+        'schedule_id': schedule_id,
+    }
+    _ensure_scheduler_started()
+    with jobs_lock:
+        pending_jobs.append(job)
+    _wake_scheduler()
+    return job_id
+
+
+def create_recurring_schedule(schedule, first_occurrence: datetime, style_info: dict, prompt_idea: str = None,
+                              count: int = None, until: datetime = None) -> dict:
+    """
+    Registers a recurring schedule and queues its first occurrence.
+    Each dispatched occurrence queues the next one, so only one job per schedule is pending.
+    """
+    entry = {
+        'id': uuid.uuid4().hex,
+        'schedule': schedule,
+        'style_info': style_info,
+        'prompt_idea': prompt_idea,
+        'remaining': count,
+        'until': until,
+        'next_occurrence': first_occurrence,
+        'active': True,
+    }
+    with jobs_lock:
+        recurring_schedules[entry['id']] = entry
+    enqueue_job(first_occurrence, style_info, prompt_idea, entry['id'])
+    return entry
+
+
+def _describe_schedule(entry: dict) -> dict:
+    next_occurrence = entry['next_occurrence']
+    return {
+        "schedule_id": entry['id'],
+        "recurrence": entry['schedule'].describe(),
+        "next_occurrence": next_occurrence.strftime('%Y-%m-%d %H:%M:%S') if next_occurrence else None,
+        "remaining": entry['remaining'],
+        "until": entry['until'].strftime('%Y-%m-%d %H:%M:%S') if entry['until'] else None,
+        "active": entry['active'],
+        "style": entry['style_info'],
+        "prompt_idea": entry['prompt_idea'] if entry['prompt_idea'] else "None",
+    }
 
 
 # --- Flask API Endpoint ---
@@ -118,6 +703,9 @@ def schedule_post_endpoint():
     """
     API endpoint to schedule a post generation task.
     Accepts an 'identified_style', a 'scheduled_time', and an optional 'prompt_idea'.
+    An optional 'recurrence' ({"cron": "0 9 * * 1-5"} or {"interval_minutes": 60}, plus
+    optional 'count' and 'until') turns it into a recurring schedule starting at 'scheduled_time'
+    (or now, if omitted).
     """
     data = request.get_json()
     if not data:
@@ -126,30 +714,97 @@ def schedule_post_endpoint():
     style_info = data.get('identified_style')
     scheduled_time_str = data.get('scheduled_time')
     prompt_idea = data.get('prompt_idea')  # This is the new optional field
+    recurrence = data.get('recurrence')
 
     if not style_info or not all(k in style_info for k in ['niche', 'tone', 'writing_style']):
         return jsonify(
             {"error": "Payload must include 'identified_style' with 'niche', 'tone', and 'writing_style' keys."}), 400
-    if not scheduled_time_str:
+    if not scheduled_time_str and not recurrence:
         return jsonify({"error": "Payload must include a 'scheduled_time' key (e.g., '2025-08-06 09:30:00')."}), 400
 
     try:
-        scheduled_time = datetime.strptime(scheduled_time_str, '%Y-%m-%d %H:%M:%S')
-        if scheduled_time < datetime.now():
-            return jsonify({"error": "Scheduled time cannot be in the past."}), 400
+        if scheduled_time_str:
+            scheduled_time = datetime.strptime(scheduled_time_str, '%Y-%m-%d %H:%M:%S')
+            if scheduled_time < datetime.now():
+                return jsonify({"error": "Scheduled time cannot be in the past."}), 400
+        else:
+            scheduled_time = datetime.now().replace(microsecond=0)
     except ValueError:
         return jsonify({"error": "Invalid datetime format. Please use 'YYYY-MM-DD HH:MM:S'."}), 400
 
-    thread = threading.Thread(target=scheduled_task, args=(scheduled_time, style_info, prompt_idea))
-    thread.daemon = True
-    thread.start()
+    if not recurrence:
+        job_id = enqueue_job(scheduled_time, style_info, prompt_idea)
+
+        return jsonify({
+            "message": "Post generation scheduled successfully",
+            "job_id": job_id,
+            "scheduled_for": scheduled_time_str,
+            "style": style_info,
+            "prompt_idea": prompt_idea if prompt_idea else "None"
+        }), 202
+
+    try:
+        schedule = parse_recurrence(recurrence, scheduled_time)
+        count = recurrence.get('count')
+        count = int(count) if count is not None else None
+        if count is not None and count < 1:
+            raise ValueError("'count' must be at least 1.")
+        until = recurrence.get('until')
+        until = datetime.strptime(until, '%Y-%m-%d %H:%M:%S') if until else None
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid recurrence: {e}"}), 400
+
+    # The first occurrence is the first fire time at or after the start
+    first_occurrence = schedule.next_after(scheduled_time - timedelta(seconds=1))
+    if first_occurrence is None or (until and first_occurrence > until):
+        return jsonify({"error": "Recurrence never fires within the requested range."}), 400
 
-    return jsonify({
-        "message": "Post generation scheduled successfully",
-        "scheduled_for": scheduled_time_str,
-        "style": style_info,
-        "prompt_idea": prompt_idea if prompt_idea else "None"
-    }), 202
+    entry = create_recurring_schedule(schedule, first_occurrence, style_info, prompt_idea, count, until)
+    return jsonify(dict(_describe_schedule(entry), message="Recurring post generation scheduled successfully")), 202
+
+
+@app.route('/recurring_schedules', methods=['GET'])
+def list_recurring_schedules_endpoint():
+    """
+    Lists active recurring schedules and their next occurrence.
+    """
+    with jobs_lock:
+        entries = [_describe_schedule(e) for e in recurring_schedules.values() if e['active']]
+    return jsonify({"schedules": entries})
+
+
+@app.route('/recurring_schedules/<schedule_id>', methods=['DELETE'])
+def cancel_recurring_schedule_endpoint(schedule_id):
+    """
+    Stops a recurring schedule and drops its pending occurrence, including a
+    draft already pre-generated for it but not yet released.
+    """
+    with jobs_lock:
+        entry = recurring_schedules.get(schedule_id)
+        if not entry or not entry['active']:
+            return jsonify({"error": "Recurring schedule not found."}), 404
+        entry['active'] = False
+        pending_jobs[:] = [job for job in pending_jobs if job.get('schedule_id') != schedule_id]
+        ready_drafts[:] = [item for item in ready_drafts if item.get('schedule_id') != schedule_id]
+    return jsonify({"message": "Recurring schedule cancelled", "schedule_id": schedule_id})
+
+
+@app.route('/scheduler_metrics', methods=['GET'])
+def scheduler_metrics_endpoint():
+    """
+    Reports queue depth, pre-generation counts, how many LLM calls and
+    prompt tokens coalescing has saved, and LLM cache hit rates.
+    """
+    with stats_lock:
+        stats = dict(scheduler_stats, llm_calls_by_hour=list(scheduler_stats['llm_calls_by_hour']))
+    with jobs_lock:
+        stats['pending_jobs'] = len(pending_jobs)
+        stats['ready_drafts'] = len(ready_drafts)
+        stats['recurring_schedules'] = sum(1 for s in recurring_schedules.values() if s['active'])
+    stats['coalesce_window_seconds'] = COALESCE_WINDOW_SECONDS
+    stats['scheduler_mode'] = SCHEDULER_MODE
+    stats['llm_cache'] = cache_report()
+    return jsonify(stats)
 
 
 if __name__ == '__main__':
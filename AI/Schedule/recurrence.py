@@ -0,0 +1,186 @@
+import bisect
+import zlib
+from datetime import datetime, timedelta
+
+# Field order and bounds of a standard 5-field cron expression
+CRON_FIELDS = [
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day_of_month', 1, 31),
+    ('month', 1, 12),
+    ('day_of_week', 0, 7),  # 0 and 7 are both Sunday
+]
+
+# Stop searching for the next fire time after this many years (e.g. '0 0 31 2 *' never fires)
+MAX_SEARCH_YEARS = 5
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> list:
+    """
+    Parses one cron field ('*', '*/15', '1-5', '0,30', '9-17/2') into a sorted list of values.
+    """
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Invalid step in cron field '{field}'.")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = end = int(part)
+            if step != 1:
+                end = high
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field '{field}' is out of range {low}-{high}.")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+class CronSchedule:
+    """
+    A 5-field cron expression ('minute hour day_of_month month day_of_week').
+    next_after jumps field by field instead of scanning minute by minute.
+    """
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError("Cron expression must have 5 fields: minute hour day_of_month month day_of_week.")
+        self.expression = expression
+        parsed = [_parse_cron_field(part, low, high) for part, (_, low, high) in zip(parts, CRON_FIELDS)]
+        self.minutes, self.hours, self.days, self.months, days_of_week = parsed
+        # Python's weekday() is Monday=0, cron is Sunday=0
+        self.weekdays = sorted({(d - 1) % 7 for d in days_of_week})
+        # Standard cron semantics: if both day fields are restricted, either may match
+        self.days_restricted = parts[2] != '*'
+        self.weekdays_restricted = parts[4] != '*'
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = moment.weekday() in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime):
+        """
+        Returns the first fire time strictly after `moment`, or None if there is none.
+        """
+        t = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * MAX_SEARCH_YEARS)
+        while t <= limit:
+            if t.month not in self.months:
+                i = bisect.bisect_left(self.months, t.month)
+                if i < len(self.months):
+                    t = t.replace(month=self.months[i], day=1, hour=0, minute=0)
+                else:
+                    t = t.replace(year=t.year + 1, month=self.months[0], day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(t):
+                t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if t.hour not in self.hours:
+                i = bisect.bisect_left(self.hours, t.hour)
+                if i < len(self.hours):
+                    t = t.replace(hour=self.hours[i], minute=0)
+                else:
+                    t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if t.minute not in self.minutes:
+                i = bisect.bisect_left(self.minutes, t.minute)
+                if i < len(self.minutes):
+                    t = t.replace(minute=self.minutes[i])
+                else:
+                    t = (t + timedelta(hours=1)).replace(minute=0)
+                continue
+            return t
+        return None
+
+    def describe(self) -> dict:
+        return {'cron': self.expression}
+
+
+class IntervalSchedule:
+    """
+    Fires every `interval` starting at `start`; next_after is computed arithmetically.
+    """
+
+    def __init__(self, interval: timedelta, start: datetime):
+        if interval <= timedelta(0):
+            raise ValueError("Interval must be positive.")
+        self.interval = interval
+        self.start = start
+
+    def next_after(self, moment: datetime):
+        if moment < self.start:
+            return self.start
+        elapsed = (moment - self.start) // self.interval + 1
+        return self.start + elapsed * self.interval
+
+    def describe(self) -> dict:
+        return {'interval_minutes': self.interval.total_seconds() / 60}
+
+
+def parse_recurrence(spec: dict, start: datetime):
+    """
+    Builds a schedule from a payload such as {'cron': '0 9 * * 1-5'} or {'interval_minutes': 60}.
+    Raises ValueError for anything else.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("'recurrence' must be an object with a 'cron' or 'interval_minutes' key.")
+    if 'cron' in spec:
+        return CronSchedule(str(spec['cron']))
+    if 'interval_minutes' in spec:
+        return IntervalSchedule(timedelta(minutes=float(spec['interval_minutes'])), start)
+    raise ValueError("'recurrence' must include a 'cron' or 'interval_minutes' key.")
+
+
+def parse_hour_ranges(text: str) -> set:
+    """
+    Parses an hour list such as '0-6,22-23' into a set of hours.
+    """
+    hours = set()
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        hours.update(_parse_cron_field(part, 0, 23))
+    return hours
+
+
+def plan_generation_time(occurrence: datetime, now: datetime, lead: timedelta, max_lead: timedelta,
+                         off_peak_hours: set, spread_key: str = '') -> datetime:
+    """
+    Picks when to pre-generate the draft for `occurrence`.
+
+    The default is `lead` before the occurrence. If that falls in a peak hour, the
+    generation moves back into the latest off-peak window within `max_lead`, at a
+    point spread deterministically by `spread_key` so queued jobs don't pile up at
+    the window's edge, while jobs with the same key share a point. The result is
+    never earlier than `now` or than `max_lead` before the occurrence.
+    """
+    target = occurrence - lead
+    earliest = max(now, occurrence - max_lead)
+    if target <= earliest:
+        return max(now, target)
+    if not off_peak_hours or target.hour in off_peak_hours:
+        return target
+
+    # Walk back hour by hour to the end of the nearest off-peak window
+    hour_start = target.replace(minute=0, second=0, microsecond=0)
+    while hour_start.hour not in off_peak_hours:
+        hour_start -= timedelta(hours=1)
+        if hour_start + timedelta(hours=1) <= earliest:
+            return target
+    window_end = hour_start + timedelta(hours=1)
+    window_start = hour_start
+    while (window_start - timedelta(hours=1)).hour in off_peak_hours:
+        window_start -= timedelta(hours=1)
+
+    # The point depends only on the whole window and the key, not on `now`, so jobs
+    # sharing a key (e.g. a style) land together and can still be coalesced
+    fraction = zlib.crc32(spread_key.encode('utf-8')) / 0xFFFFFFFF
+    return max(window_start + (window_end - window_start) * fraction, earliest).replace(microsecond=0)
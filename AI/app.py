@@ -148,6 +148,11 @@ from dotenv import load_dotenv
 
 # Import the refactored logic functions
 from style_analyzer import analyze_posts, refine_post_for_platforms
+from common import registry
+from common.metrics import instrument_app
+from common.profiling import init_profiling
+from common.resilience import register_error_handlers
+from common.singleflight import coalesce
 
 # Load environment variables
 load_dotenv()
@@ -155,6 +160,9 @@ load_dotenv()
 # Initialize Flask app and CORS
 app = Flask(__name__)
 CORS(app)
+instrument_app(app, 'style')
+init_profiling(app, 'style')
+register_error_handlers(app)  # 503/504 when LLM calls time out or the circuit is open
 
 
 @app.route('/generate', methods=['POST'])
@@ -171,19 +179,24 @@ def generate_style_analysis():
     if not posts or not isinstance(posts, list) or len(posts) == 0:
         return jsonify({"error": "Payload must include a 'posts' key with a list of strings."}), 400
 
-    # Perform the analysis
-    style_info = analyze_posts(posts)
-    if not style_info:
-        return jsonify({"error": "Failed to analyze post style. Check API key or server logs."}), 500
+    def analyze():
+        # Perform the analysis
+        style_info = analyze_posts(posts)
+        if not style_info:
+            return {"error": "Failed to analyze post style. Check API key or server logs."}, 500
 
-    # Return only the identified style
-    return jsonify({
-        "identified_style": {
-            "tone": style_info.tone,
-            "niche": style_info.niche,
-            "writing_style": style_info.writing_style
-        }
-    })
+        # Return only the identified style
+        return {
+            "identified_style": {
+                "tone": style_info.tone,
+                "niche": style_info.niche,
+                "writing_style": style_info.writing_style
+            }
+        }, 200
+
+    # Identical concurrent requests share one analysis
+    body, status = coalesce('style.generate', {"posts": posts}, analyze)
+    return jsonify(body), status
 
 
 @app.route('/refine_post', methods=['POST'])
@@ -208,18 +221,27 @@ def refine_post_endpoint():
     if not topic or not isinstance(topic, str):
         return jsonify({"error": "Payload must include a 'topic' string."}), 400
 
-    # Call the generation function
-    refined_posts = refine_post_for_platforms(topic, style_info)
+    def refine():
+        # Call the generation function
+        refined_posts = refine_post_for_platforms(topic, style_info)
+
+        if not refined_posts:
+            return {"error": "Failed to generate refined posts."}, 500
 
-    if not refined_posts:
-        return jsonify({"error": "Failed to generate refined posts."}), 500
+        # Return the successful response
+        return {
+            "linkedin_post": refined_posts.linkedin_post,
+            "twitter_post": refined_posts.twitter_post
+        }, 200
 
-    # Return the successful response
-    return jsonify({
-        "linkedin_post": refined_posts.linkedin_post,
-        "twitter_post": refined_posts.twitter_post
-    })
+    # Identical concurrent requests share one generation
+    body, status = coalesce('style.refine_post', {"topic": topic, "identified_style": style_info}, refine)
+    return jsonify(body), status
 
 
 if __name__ == '__main__':
+    # Serve right away; the LLM client loads in the background
+    # Only in the serving process, not in the debug reloader's watcher parent
+    if registry.WARM_UP_MODE != 'off' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        registry.start_background_warm_up(('chat_llm',))
     app.run(host='0.0.0.0', port=5005, debug=True)
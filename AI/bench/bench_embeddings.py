@@ -0,0 +1,111 @@
+"""
+Embedding throughput (chunks/second) of ragdheeraj/embedding_executor.py against
+batch size, torch intra-op threads and concurrent batch workers, with and without
+length-sorted batching.
+
+The chunks come from the RAG splitter run over synthetic documents whose
+paragraphs vary widely in length, so batches mix short and long chunks the way
+real uploads do. Needs torch and sentence-transformers (the RAG model's backend).
+
+Usage:
+    python bench_embeddings.py --chunks 512 --batch-size 8 16 32 64 128 --threads 1 2 4 8 --workers 1 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AI_ROOT)
+sys.path.insert(0, os.path.join(AI_ROOT, 'ragdheeraj'))
+from embedding_executor import EmbeddingExecutor
+from text_splitter import SentenceAwareSplitter
+
+WORDS = ("layoffs hiring market product engineers platform quarter growth revenue customers "
+         "teams roadmap culture remote office budget cloud model data security release").split()
+
+
+class UnsortedExecutor(EmbeddingExecutor):
+    """
+    Batches in input order, as a plain slicing loop would.
+    """
+
+    def batches(self, texts: list) -> list:
+        return [list(range(start, min(start + self.batch_size, len(texts))))
+                for start in range(0, len(texts), self.batch_size)]
+
+
+def synthetic_chunks(rng, count: int) -> list:
+    chunks = []
+    splitter = SentenceAwareSplitter(chunk_size=1000, chunk_overlap=200)
+    while len(chunks) < count:
+        paragraphs = []
+        for _ in range(rng.integers(3, 12)):
+            sentences = [' '.join(rng.choice(WORDS, rng.integers(4, 30))).capitalize() + '.'
+                         for _ in range(rng.integers(1, 15))]
+            paragraphs.append(' '.join(sentences))
+        chunks.extend(splitter.split_text('\n\n'.join(paragraphs)))
+    return chunks[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--chunks', type=int, default=512)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[8, 16, 32, 64, 128])
+    parser.add_argument('--threads', type=int, nargs='+', default=None,
+                        help='Intra-op thread counts (default: 1, 2, 4, ... up to the core count).')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--repeats', type=int, default=2, help='Timed runs per setting; the best is reported.')
+    args = parser.parse_args()
+
+    try:
+        import torch
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        sys.exit(f"⚠️ This benchmark needs torch and sentence-transformers: {e}")
+
+    cores = os.cpu_count() or 1
+    threads = args.threads or sorted({min(cores, 2 ** i) for i in range(cores.bit_length())})
+    model = SentenceTransformer(args.model, device='cpu')
+
+    def embed_documents(texts):
+        return model.encode(texts, batch_size=len(texts), normalize_embeddings=False).tolist()
+
+    texts = synthetic_chunks(np.random.default_rng(0), args.chunks)
+    lengths = [len(text) for text in texts]
+    report = {'settings': vars(args), 'cores': cores, 'torch': torch.__version__,
+              'chunk_chars': {'min': min(lengths), 'median': int(np.median(lengths)), 'max': max(lengths)},
+              'runs': []}
+
+    embed_documents(texts[:8])  # Warm-up: model load and first-call allocation
+    for thread_count in threads:
+        torch.set_num_threads(thread_count)
+        for workers in args.workers:
+            for batch_size in args.batch_size:
+                for sort, executor_class in (('sorted', EmbeddingExecutor), ('unsorted', UnsortedExecutor)):
+                    executor = executor_class(embed_documents, batch_size=batch_size, workers=workers)
+                    best = min(_timed(executor, texts) for _ in range(args.repeats))
+                    report['runs'].append(dict(intra_op_threads=thread_count, workers=workers,
+                                               batch_size=batch_size, batching=sort,
+                                               chunks_per_second=round(len(texts) / best, 1)))
+                    print(f"threads={thread_count} workers={workers} batch={batch_size} {sort}: "
+                          f"{len(texts) / best:.1f} chunks/s", file=sys.stderr)
+                    executor._pool.shutdown()
+
+    best = max(report['runs'], key=lambda run: run['chunks_per_second'])
+    report['best'] = best
+    print(json.dumps(report, indent=2))
+
+
+def _timed(executor: EmbeddingExecutor, texts: list) -> float:
+    start = time.perf_counter()
+    executor.embed(texts)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Overhead of TreeSHAP explanations over plain engagement prediction.
+
+Times engagement/engagement_predictor.py on batches of synthetic posts three
+ways: prediction only, prediction with explanations (both uncached), and a
+repeat of the explained batch answered from the prediction cache.
+
+Usage:
+    python bench_explain.py --batch-size 1 16 128 1024 --repeats 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from contextlib import redirect_stdout
+
+import numpy as np
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AI_ROOT)
+sys.path.insert(0, os.path.join(AI_ROOT, 'engagement'))
+with redirect_stdout(sys.stderr):  # Keep stdout for the JSON report
+    import engagement_predictor
+
+WORDS = "launch team growth hiring lessons product customers great terrible excited disappointed".split()
+
+
+def synthetic_posts(rng, count: int) -> list:
+    return [{"text": ' '.join(rng.choice(WORDS, rng.integers(5, 60))),
+             "platform": rng.choice(['LinkedIn', 'Twitter']),
+             "timestamp": f"2025-08-{rng.integers(1, 29):02d} {rng.integers(0, 24):02d}:{rng.integers(0, 60):02d}:00"}
+            for _ in range(count)]
+
+
+def _time(posts: list, explain: bool, cached: bool, repeats: int) -> float:
+    """
+    Median seconds per batch.
+    """
+    times = []
+    for _ in range(repeats):
+        if not cached:
+            engagement_predictor._cache.clear()
+        start = time.perf_counter()
+        _, error = engagement_predictor.predict_engagement_batch(posts, explain=explain)
+        times.append(time.perf_counter() - start)
+        if error:
+            sys.exit(f"❌ Prediction failed: {error}")
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1, 16, 128, 1024])
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    if not engagement_predictor.lgbm_model:
+        sys.exit("❌ Engagement models are not loaded.")
+    engagement_predictor.PREDICTION_CACHE_SIZE = max(args.batch_size)
+    rng = np.random.default_rng(0)
+    report = {'settings': vars(args), 'runs': []}
+    for batch_size in args.batch_size:
+        posts = synthetic_posts(rng, batch_size)
+        _time(posts, True, False, 2)  # Warm-up
+        predict = _time(posts, False, False, args.repeats)
+        explain = _time(posts, True, False, args.repeats)
+        cached = _time(posts, True, True, args.repeats)
+        report['runs'].append({
+            'batch_size': batch_size,
+            'predict_ms': round(1000 * predict, 2),
+            'predict_explain_ms': round(1000 * explain, 2),
+            'cached_explain_ms': round(1000 * cached, 2),
+            'explain_overhead': round(explain / predict, 2),
+            'explain_ms_per_post': round(1000 * (explain - predict) / batch_size, 3),
+        })
+        print(f"batch={batch_size}: predict {1000 * predict:.1f} ms, with explanations {1000 * explain:.1f} ms, "
+              f"cached {1000 * cached:.1f} ms", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Recall@k and query latency of ragdheeraj/library_index.py on synthetic embeddings.
+
+Builds a fresh index of clustered random unit vectors (the shape of sentence
+embeddings: many topics, each a tight cloud), trains its IVF lists, then
+compares IVF search at several nprobe values against exact search, scoring
+candidates with float32 vectors, int8 codes alone, and int8 codes with float
+rescoring of the shortlist.
+
+Usage:
+    python bench_library.py --vectors 1000000 --dim 384 --queries 200 --nprobe 8 16 32 64
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+
+import numpy as np
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AI_ROOT)
+sys.path.insert(0, os.path.join(AI_ROOT, 'ragdheeraj'))
+import library_index
+
+INSERT_BATCH = 50000
+SCAN_BLOCK = 100000
+
+
+def synthetic_vectors(rng, centers: np.ndarray, count: int, noise: float) -> np.ndarray:
+    vectors = centers[rng.integers(0, len(centers), count)] + noise * rng.standard_normal(
+        (count, centers.shape[1]), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """
+    Ground truth in one blocked pass over the stored vectors.
+    """
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), k), dtype=np.int64)
+    for start in range(0, len(vectors), SCAN_BLOCK):
+        scores = queries @ np.asarray(vectors[start:start + SCAN_BLOCK]).T
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + scores.shape[1]),
+                                                               scores.shape)], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_ids = np.take_along_axis(merged_ids, top, axis=1)
+    return best_ids
+
+
+def _latency(values: list) -> dict:
+    ordered = sorted(values)
+    return {'p50_ms': round(1000 * ordered[len(ordered) // 2], 2),
+            'p99_ms': round(1000 * ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))], 2),
+            'mean_ms': round(1000 * sum(ordered) / len(ordered), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vectors', type=int, default=1000000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--topics', type=int, default=2000)
+    parser.add_argument('--noise', type=float, default=0.06, help='Per-dimension spread around each topic.')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32, 64])
+    parser.add_argument('--rescore-factor', type=int, default=library_index.RAG_LIBRARY_RESCORE_FACTOR)
+    parser.add_argument('--exact-queries', type=int, default=20, help='Exact searches timed through the index.')
+    parser.add_argument('--dir', default=None, help='Index directory (default: a temporary one, removed after).')
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix='bench-library-')
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.topics, args.dim), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    # Load everything first and train once, rather than retraining as the library grows
+    library_index.RAG_LIBRARY_TRAIN_MIN = args.vectors + 1
+    index = library_index.LibraryIndex(directory)
+    report = {'settings': vars(args), 'directory': directory}
+    try:
+        start = time.perf_counter()
+        for first in range(0, args.vectors, INSERT_BATCH):
+            count = min(INSERT_BATCH, args.vectors - first)
+            index.add(synthetic_vectors(rng, centers, count, args.noise), [''] * count,
+                      [f"doc-{(first + i) // 100}" for i in range(count)])
+        report['insert_seconds'] = round(time.perf_counter() - start, 2)
+        start = time.perf_counter()
+        with redirect_stdout(sys.stderr):  # Keep stdout for the JSON report
+            index.train()
+        report['train_seconds'] = round(time.perf_counter() - start, 2)
+        report['index'] = index.stats()
+        report['disk_mb'] = round(sum(os.path.getsize(os.path.join(directory, f))
+                                      for f in os.listdir(directory)) / 2 ** 20, 1)
+        # What candidate scoring keeps hot: the float vectors, or the int8 codes and scales
+        float_mb = os.path.getsize(index.vectors_path) / 2 ** 20
+        int8_mb = (os.path.getsize(index.codes_path) + os.path.getsize(index.scales_path)) / 2 ** 20
+        report['scoring_memory_mb'] = {'float32': round(float_mb, 1), 'int8': round(int8_mb, 1),
+                                       'reduction': round(float_mb / int8_mb, 2)}
+
+        queries = synthetic_vectors(rng, centers, args.queries, args.noise)
+        truth = exact_top_k(index._vectors, queries, args.k)
+
+        exact_times = []
+        for query in queries[:args.exact_queries]:
+            start = time.perf_counter()
+            index.search(query, k=args.k, exact=True)
+            exact_times.append(time.perf_counter() - start)
+        report['exact'] = _latency(exact_times)
+
+        scorings = {'float32': dict(quantized=False), 'int8': dict(quantized=True, rescore_factor=0),
+                    'int8_rescored': dict(quantized=True, rescore_factor=args.rescore_factor)}
+        report['ivf'] = []
+        for nprobe in args.nprobe:
+            for scoring, options in scorings.items():
+                times, recalls = [], []
+                for query, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    hits = index.search(query, k=args.k, nprobe=nprobe, **options)
+                    times.append(time.perf_counter() - start)
+                    recalls.append(len({hit['id'] for hit in hits} & set(expected.tolist())) / args.k)
+                report['ivf'].append(dict(nprobe=nprobe, scoring=scoring,
+                                          recall_at_k=round(float(np.mean(recalls)), 4), **_latency(times)))
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Exercises common/resilience.py against the stub LLM with injected latency spikes.
+
+Runs the stub in-process and sends chat completions through call_with_resilience:
+
+  1. spikes, hedging off   - the tail is set by the spikes (or the deadline)
+  2. spikes, hedging on    - duplicates sent after the observed p95 cut the tail
+  3. outage (100% errors)  - the circuit breaker opens and later calls fail fast
+
+Usage:
+    python bench_resilience.py --calls 400 --concurrency 16 --spike-rate 0.02 --spike-latency 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import resilience
+from loadgen import summarize
+from stub_llm import StubConfig, create_server
+
+REQUEST_BODY = json.dumps({
+    "model": "llama3-70b-8192",
+    "messages": [{"role": "user", "content": "Write a short post about resilience."}],
+}).encode('utf-8')
+
+
+def _chat_completion(url: str, timeout: float):
+    request = urllib.request.Request(url, data=REQUEST_BODY, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def _start_stub(port: int, config: StubConfig):
+    server = create_server('127.0.0.1', port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_phase(name: str, url: str, calls: int, concurrency: int, hedge: bool, deadline: float) -> dict:
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    hedges_before = resilience.HEDGES.value(name=name)
+    wins_before = resilience.HEDGE_WINS.value(name=name)
+
+    def one_call(_):
+        start = time.perf_counter()
+        try:
+            resilience.call_with_resilience(name, lambda: _chat_completion(url, timeout=deadline * 2),
+                                            breaker=name, deadline=deadline, hedge=hedge)
+        except Exception as e:
+            with lock:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_call, range(calls)))
+    result = summarize(latencies, sum(errors.values()), time.perf_counter() - started)
+    result.update(phase=name, hedging=hedge, errors_by_type=errors,
+                  hedges_sent=resilience.HEDGES.value(name=name) - hedges_before,
+                  hedge_wins=resilience.HEDGE_WINS.value(name=name) - wins_before)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--spike-rate', type=float, default=0.02)
+    parser.add_argument('--spike-latency', type=float, default=3.0)
+    parser.add_argument('--deadline', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=5198)
+    args = parser.parse_args()
+
+    # Hedge as soon as the p95 is known rather than after the production minimum delay
+    resilience.LLM_HEDGE_MIN_DELAY = 0.0
+    url = f"http://127.0.0.1:{args.port}/openai/v1/chat/completions"
+    results = []
+
+    server = _start_stub(args.port, StubConfig(latency=args.latency, jitter=args.jitter, tokens_per_second=0,
+                                               spike_rate=args.spike_rate, spike_latency=args.spike_latency))
+    try:
+        for hedge in (False, True):
+            name = 'spikes_hedged' if hedge else 'spikes_unhedged'
+            # Seed the latency window so the p95 delay applies from the first measured call
+            run_phase(name, url, resilience.LLM_HEDGE_MIN_SAMPLES * 2, args.concurrency, False, args.deadline)
+            results.append(run_phase(name, url, args.calls, args.concurrency, hedge, args.deadline))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    server = _start_stub(args.port, StubConfig(latency=args.latency, jitter=0, tokens_per_second=0, error_rate=1.0))
+    try:
+        outage = run_phase('outage', url, args.calls, args.concurrency, True, args.deadline)
+        with urllib.request.urlopen(f"http://127.0.0.1:{args.port}/stats") as response:
+            outage['calls_reaching_llm'] = json.load(response)['requests']
+        results.append(outage)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(json.dumps({'settings': vars(args), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
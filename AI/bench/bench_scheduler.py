@@ -0,0 +1,122 @@
+"""
+Benchmarks the threaded and asyncio scheduler modes against each other.
+
+Each mode runs in its own subprocess with a simulated Groq client that sleeps
+for a fixed latency, so the numbers reflect scheduler overhead rather than the
+API. Every job gets a distinct style so nothing is coalesced.
+
+Usage:
+    python bench_scheduler.py --jobs 2000 --latency 0.5
+"""
+import os
+import sys
+import json
+import time
+import types
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEDULE_DIR = os.path.join(AI_ROOT, 'Schedule')
+
+
+def _completion(messages):
+    content = f"Simulated draft for: {messages[-1]['content'][:40]}"
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))],
+        usage=types.SimpleNamespace(prompt_tokens=0),
+    )
+
+
+class _SimulatedClient:
+    """
+    Mimics the client.chat.completions.create surface of Groq / AsyncGroq.
+    """
+
+    def __init__(self, latency: float, is_async: bool):
+        self.latency = latency
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(
+            create=self._create_async if is_async else self._create))
+
+    def _create(self, messages, **kwargs):
+        time.sleep(self.latency)
+        return _completion(messages)
+
+    async def _create_async(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _completion(messages)
+
+
+def run_worker(jobs: int, latency: float):
+    """
+    Runs inside the subprocess: schedules `jobs` jobs due now and waits for them all.
+    """
+    from datetime import datetime
+    sys.path.insert(0, SCHEDULE_DIR)
+    import app as schedule_app
+
+    schedule_app.DRAFT_FILE = os.path.join(tempfile.mkdtemp(), 'final.json')
+    schedule_app.groq_client = _SimulatedClient(latency, is_async=False)
+    schedule_app._create_async_groq_client = lambda: _SimulatedClient(latency, is_async=True)
+
+    peak_threads = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    now = datetime.now()
+    for i in range(jobs):
+        style = {'niche': f'niche-{i}', 'tone': 'Professional', 'writing_style': 'Informative'}
+        schedule_app.enqueue_job(now, style, f'idea {i}')
+
+    while True:
+        with schedule_app.stats_lock:
+            done = schedule_app.scheduler_stats['jobs_completed'] + schedule_app.scheduler_stats['jobs_failed']
+        peak_threads = max(peak_threads, threading.active_count())
+        if done >= jobs:
+            break
+        time.sleep(0.01)
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    print(json.dumps({
+        'mode': schedule_app.SCHEDULER_MODE,
+        'jobs': jobs,
+        'latency_seconds': latency,
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu, 3),
+        'jobs_per_second': round(jobs / wall, 1),
+        'jobs_per_cpu_second': round(jobs / cpu, 1) if cpu else None,
+        'peak_threads': peak_threads,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.5, help='Simulated LLM latency in seconds.')
+    parser.add_argument('--modes', default='threaded,async')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.jobs, args.latency)
+        return
+
+    results = []
+    for mode in args.modes.split(','):
+        env = dict(os.environ, SCHEDULER_MODE=mode, SCHEDULER_TICK_SECONDS='0.05',
+                   SCHEDULER_ASYNC_MAX_CONNECTIONS=str(args.jobs))
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', '--jobs', str(args.jobs),
+             '--latency', str(args.latency)],
+            cwd=SCHEDULE_DIR, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps({'cpu_count': os.cpu_count(), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
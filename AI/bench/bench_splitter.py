@@ -0,0 +1,92 @@
+"""
+Throughput of ragdheeraj/text_splitter.py on multi-MB documents, against
+LangChain's RecursiveCharacterTextSplitter when it is installed.
+
+The input is ragdheeraj/document.txt repeated (with its paragraphs shuffled)
+up to each requested size.
+
+Usage:
+    python bench_splitter.py --sizes-mb 1 4 16 --repeat 3
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(AI_ROOT, 'ragdheeraj'))
+from text_splitter import SentenceAwareSplitter
+
+
+def _langchain_splitter(chunk_size: int, chunk_overlap: int):
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        try:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+        except ImportError:
+            return None
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def build_document(size_bytes: int, seed: int = 0) -> str:
+    with open(os.path.join(AI_ROOT, 'ragdheeraj', 'document.txt'), encoding='utf-8') as f:
+        paragraphs = [p for p in f.read().split('\n\n') if p.strip()]
+    rng = random.Random(seed)
+    parts, total = [], 0
+    while total < size_bytes:
+        paragraph = rng.choice(paragraphs)
+        parts.append(paragraph)
+        total += len(paragraph) + 2
+    return '\n\n'.join(parts)
+
+
+def _best_of(repeat: int, fn):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--chunk-overlap', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    splitter = SentenceAwareSplitter(args.chunk_size, args.chunk_overlap)
+    baseline = _langchain_splitter(args.chunk_size, args.chunk_overlap)
+    if baseline is None:
+        print("⚠️ LangChain's text splitter is not installed; reporting the native splitter only.", file=sys.stderr)
+
+    results = []
+    for size_mb in args.sizes_mb:
+        text = build_document(int(size_mb * 1024 * 1024))
+        mb = len(text.encode('utf-8')) / (1024 * 1024)
+        row = {'size_mb': round(mb, 2)}
+
+        seconds, spans = _best_of(args.repeat, lambda: splitter.split_spans(text))
+        row['native_spans'] = {'seconds': round(seconds, 4), 'mb_per_s': round(mb / seconds, 1), 'chunks': len(spans)}
+        seconds, chunks = _best_of(args.repeat, lambda: splitter.split_text(text))
+        row['native_text'] = {'seconds': round(seconds, 4), 'mb_per_s': round(mb / seconds, 1),
+                              'mean_chars': round(sum(map(len, chunks)) / max(1, len(chunks)))}
+
+        if baseline is not None:
+            seconds, chunks = _best_of(args.repeat, lambda: baseline.split_text(text))
+            row['langchain_text'] = {'seconds': round(seconds, 4), 'mb_per_s': round(mb / seconds, 1),
+                                     'chunks': len(chunks),
+                                     'mean_chars': round(sum(map(len, chunks)) / max(1, len(chunks)))}
+            row['speedup'] = round(row['langchain_text']['seconds'] / row['native_text']['seconds'], 1)
+        results.append(row)
+
+    print(json.dumps({'settings': vars(args), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
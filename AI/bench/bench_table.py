@@ -0,0 +1,79 @@
+"""
+Latency of engagement predictions from the precomputed lookup table
+(engagement/prediction_table.py) against the tree models, and the table's
+build time, size and error report.
+
+Times the bare model call and the bare table lookup on prepared features,
+then predict_engagement end to end (feature extraction included) in both
+modes.
+
+Usage:
+    python bench_table.py --posts 200 --repeats 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from contextlib import redirect_stdout
+
+import numpy as np
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AI_ROOT)
+sys.path.insert(0, os.path.join(AI_ROOT, 'engagement'))
+with redirect_stdout(sys.stderr):  # Keep stdout for the JSON report
+    import engagement_predictor
+    import prediction_table
+
+from bench_explain import synthetic_posts
+
+
+def _per_call_us(fn, items: list, repeats: int) -> float:
+    """
+    Median over repeats of the mean microseconds per item.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        times.append((time.perf_counter() - start) / len(items))
+    return round(1e6 * float(np.median(times)), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    if not engagement_predictor.lgbm_model:
+        sys.exit("❌ Engagement models are not loaded.")
+    models = {'lightgbm': engagement_predictor.lgbm_model, 'xgboost': engagement_predictor.xgb_model}
+    start = time.perf_counter()
+    table = prediction_table.PredictionTable.build(models, engagement_predictor.FEATURE_ORDER)
+    report = {'settings': vars(args), 'build_seconds': round(time.perf_counter() - start, 2),
+              'table': table.report}
+
+    posts = synthetic_posts(np.random.default_rng(0), args.posts)
+    features = [engagement_predictor.row_features(post) for post in posts]
+    frames = [engagement_predictor.preprocess_input(post) for post in posts]
+    report['per_prediction_us'] = {
+        'models': _per_call_us(lambda frame: [model.predict(frame) for model in models.values()],
+                               frames, args.repeats),
+        'table_lookup': _per_call_us(lambda row: table.lookup(*row), features, args.repeats),
+    }
+
+    # End to end, feature extraction included; the prediction cache is off so the models really run
+    engagement_predictor.PREDICTION_CACHE_SIZE = 0
+    prediction_table._state.update(models=models, table=table)
+    for mode in ('model', 'table'):
+        engagement_predictor.ENGAGEMENT_PREDICTION_MODE = mode
+        report['per_prediction_us'][f"predict_engagement_{mode}"] = _per_call_us(
+            engagement_predictor.predict_engagement, posts, args.repeats)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Import-time report for the services, and a startup regression check.
+
+Loads each service the way gateway.py does, in a fresh interpreter under
+`python -X importtime`, and reports the wall time of the load, the cumulative
+import cost per top-level package, and the slowest individual imports.
+
+With --budget-ms, exits non-zero when any service takes longer to load than the
+budget, or when one imports a module listed in --deferred at startup (those are
+meant to load on first use or during the background warm-up), so it can run as
+a CI step:
+
+Usage:
+    python import_report.py --services style rag --top 15
+    python import_report.py --services style rag --budget-ms 1500
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AI_ROOT)
+from gateway import SERVICES
+
+# Heavy integrations the services must not import while starting up
+DEFERRED_MODULES = ['langchain', 'langchain_core', 'langchain_groq', 'langchain_community', 'torch',
+                    'sentence_transformers']
+
+# "import time:       self [us] |  cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+_LOAD_SERVICE = """
+import sys, json, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import gateway
+gateway.load_service({name!r})
+seconds = time.perf_counter() - started
+print(json.dumps({{'load_ms': round(1000 * seconds, 1),
+                  'deferred_loaded': sorted(m for m in {deferred!r} if m in sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    The -X importtime lines as (module, self_us, cumulative_us) tuples.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def package_costs(entries: list) -> dict:
+    """
+    Cumulative import microseconds per top-level package: the sum of its modules'
+    own time, so a package is charged for its submodules but not for other
+    packages it pulls in.
+    """
+    costs = defaultdict(int)
+    for module, self_us, _ in entries:
+        costs[module.split('.')[0]] += self_us
+    return dict(costs)
+
+
+def measure_service(name: str, deferred: list) -> dict:
+    code = _LOAD_SERVICE.format(root=AI_ROOT, name=name, deferred=deferred)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=AI_ROOT, capture_output=True,
+                            text=True)
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'load failed'}
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    entries = parse_importtime(result.stderr)
+    report['import_ms'] = round(sum(self_us for _, self_us, _ in entries) / 1000, 1)
+    report['modules_imported'] = len(entries)
+    report['packages'] = package_costs(entries)
+    report['slowest_imports'] = sorted(entries, key=lambda entry: entry[2], reverse=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--services', nargs='+', default=list(SERVICES), choices=list(SERVICES))
+    parser.add_argument('--top', type=int, default=10, help="Packages and imports listed per service.")
+    parser.add_argument('--budget-ms', type=float, default=None, help="Fail when a service loads slower than this.")
+    parser.add_argument('--deferred', nargs='*', default=DEFERRED_MODULES,
+                        help="Modules that must not be imported at startup when checking the budget.")
+    args = parser.parse_args()
+
+    report = {'settings': vars(args), 'services': {}}
+    failures = []
+    for name in args.services:
+        result = measure_service(name, args.deferred)
+        if 'error' in result:
+            failures.append(f"{name}: {result['error']}")
+        else:
+            top_packages = sorted(result['packages'].items(), key=lambda item: item[1], reverse=True)[:args.top]
+            result['packages'] = {package: round(us / 1000, 1) for package, us in top_packages}
+            result['slowest_imports'] = [
+                {'module': module, 'cumulative_ms': round(cumulative_us / 1000, 1), 'self_ms': round(self_us / 1000, 1)}
+                for module, self_us, cumulative_us in result['slowest_imports'][:args.top]]
+            print(f"{name}: loaded in {result['load_ms']} ms ({result['modules_imported']} modules)",
+                  file=sys.stderr)
+            if args.budget_ms is not None:
+                if result['load_ms'] > args.budget_ms:
+                    failures.append(f"{name}: loaded in {result['load_ms']} ms, budget {args.budget_ms} ms")
+                if result['deferred_loaded']:
+                    failures.append(f"{name}: imported {', '.join(result['deferred_loaded'])} at startup")
+        report['services'][name] = result
+    print(json.dumps(report, indent=2))
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}", file=sys.stderr)
+        sys.exit(1)
+    if args.budget_ms is not None:
+        print(f"✅ All services loaded within {args.budget_ms} ms without deferred imports.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
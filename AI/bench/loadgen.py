@@ -0,0 +1,108 @@
+"""
+Minimal closed-loop HTTP load generator shared by the benchmark scripts.
+"""
+import json
+import math
+import time
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+
+def percentile(sorted_values: list, fraction: float):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    completed = len(latencies)
+    to_ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None
+    return {
+        "requests": completed + errors,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": to_ms(percentile(latencies, 0.50)),
+            "p95": to_ms(percentile(latencies, 0.95)),
+            "p99": to_ms(percentile(latencies, 0.99)),
+            "max": to_ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def wait_for_port(host: str, port: int, timeout: float = 60.0):
+    """
+    Blocks until something accepts connections on host:port.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Nothing listening on {host}:{port} after {timeout}s")
+
+
+def build_request(url: str, payload=None, body: bytes = None, content_type: str = None, method: str = 'POST'):
+    """
+    Returns a zero-argument factory producing a fresh urllib Request for each call.
+    `payload` is sent as JSON; `body` + `content_type` are sent as-is (e.g. multipart).
+    """
+    if payload is not None:
+        body = json.dumps(payload).encode('utf-8')
+        content_type = 'application/json'
+    headers = {'Content-Type': content_type} if content_type else {}
+    return lambda: urllib.request.Request(url, data=body, headers=headers, method=method)
+
+
+def run_load(request_factory, concurrency: int, duration: float = None, total_requests: int = None,
+             timeout: float = 60.0, ok_statuses=(200, 201, 202)) -> dict:
+    """
+    Drives `concurrency` client threads, each sending requests back to back, for
+    `duration` seconds or until `total_requests` have been sent.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    sent = [0]
+    deadline = time.monotonic() + duration if duration else None
+
+    def claim():
+        with lock:
+            if total_requests is not None and sent[0] >= total_requests:
+                return False
+            sent[0] += 1
+            return True
+
+    def client():
+        while (deadline is None or time.monotonic() < deadline) and claim():
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request_factory(), timeout=timeout) as response:
+                    response.read()
+                    ok = response.status in ok_statuses
+            except (urllib.error.URLError, OSError):
+                ok = False
+            latency = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(latency)
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
@@ -0,0 +1,216 @@
+"""
+Offline end-to-end benchmark of the AI services against the local stub LLM.
+
+Starts stub_llm.py, starts the gateway with the Groq clients pointed at the
+stub, then drives each endpoint at every concurrency level and prints (or
+writes) one JSON document. Payloads, stub settings and its RNG seed are fixed,
+and the git commit is recorded, so two result files from different commits can
+be compared directly; --baseline prints the throughput and p95 deltas.
+
+The embedding model for /generate_rag_post and the engagement pickles still
+load locally; only the LLM is stubbed.
+
+Usage:
+    python run_bench.py --concurrency 1,4,16 --duration 15 --output results.json
+    python run_bench.py --scenarios predict_engagement,schedule_post --baseline old.json
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.request
+from datetime import datetime, timedelta
+
+from loadgen import build_request, run_load, wait_for_port
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STYLE = {"tone": "Professional", "niche": "Technology", "writing_style": "Informative"}
+POSTS = [
+    "Excited to announce our new product launch 🚀 It has been a long journey for the whole team.",
+    "Three lessons I learned scaling a data platform from 10 to 10,000 customers.",
+    "Hiring! We're looking for engineers who care about reliability and clean APIs.",
+]
+DOCUMENT = "\n\n".join(
+    f"Section {i}. Our quarterly report covers revenue growth, customer retention and the roadmap for "
+    f"the analytics product. Team {i} shipped improvements to onboarding, reporting and integrations."
+    for i in range(1, 41)
+)
+MULTIPART_BOUNDARY = 'benchboundary7f3a'
+
+
+def _multipart(fields: dict, files: dict) -> bytes:
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{MULTIPART_BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n')
+    for name, (filename, content) in files.items():
+        parts.append(f'--{MULTIPART_BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: text/plain\r\n\r\n{content}\r\n')
+    parts.append(f'--{MULTIPART_BOUNDARY}--\r\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def _schedule_payload() -> dict:
+    # Due within the pre-generation lead, so the scheduler also exercises the stub
+    scheduled_time = (datetime.now() + timedelta(minutes=5)).strftime('%Y-%m-%d %H:%M:%S')
+    return {"identified_style": STYLE, "scheduled_time": scheduled_time, "prompt_idea": "Benchmark post"}
+
+
+# name -> (gateway service, builder returning a request factory for a base URL)
+SCENARIOS = {
+    'generate': ('style', lambda url: build_request(f"{url}/style/generate", {"posts": POSTS})),
+    'refine_post': ('style', lambda url: build_request(
+        f"{url}/style/refine_post", {"identified_style": STYLE, "topic": "Lessons from our product launch"})),
+    'generate_rag_post': ('rag', lambda url: build_request(
+        f"{url}/rag/generate_rag_post",
+        body=_multipart({"instruction": "Write a LinkedIn post summarizing the report."},
+                        {"document": ("report.txt", DOCUMENT)}),
+        content_type=f"multipart/form-data; boundary={MULTIPART_BOUNDARY}")),
+    'predict_engagement': ('engagement', lambda url: build_request(
+        f"{url}/engagement/predict_engagement",
+        {"text": POSTS[0], "platform": "LinkedIn", "timestamp": "2025-08-06 09:30:00"})),
+    'explain_engagement': ('engagement', lambda url: build_request(
+        f"{url}/engagement/predict_engagement",
+        {"text": POSTS[1], "platform": "LinkedIn", "timestamp": "2025-08-06 09:30:00", "explain": True})),
+    'schedule_post': ('schedule', lambda url: lambda: build_request(
+        f"{url}/schedule/schedule_post", _schedule_payload())()),
+}
+
+
+def _git_info() -> dict:
+    def git(*args):
+        result = subprocess.run(['git', *args], cwd=AI_ROOT, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+    return {"commit": git('rev-parse', 'HEAD'), "dirty": bool(git('status', '--porcelain', '--', '.'))}
+
+
+def _start(command: list, cwd: str, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, 'w')
+    return subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def _stop(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def _stub_stats(stub_url: str) -> dict:
+    with urllib.request.urlopen(f"{stub_url}/stats", timeout=10) as response:
+        return json.load(response)
+
+
+def run_scenarios(url: str, stub_url: str, scenarios: list, concurrency_levels: list, args) -> list:
+    results = []
+    for name in scenarios:
+        request_factory = SCENARIOS[name][1](url)
+        run_load(request_factory, concurrency=1, total_requests=args.warmup, timeout=args.timeout)
+        for concurrency in concurrency_levels:
+            before = _stub_stats(stub_url)
+            result = run_load(request_factory, concurrency=concurrency, duration=args.duration, timeout=args.timeout)
+            after = _stub_stats(stub_url)
+            llm_calls = after['requests'] - before['requests']
+            result.update(scenario=name, concurrency=concurrency, llm_calls=llm_calls,
+                          llm_calls_per_request=round(llm_calls / result['requests'], 3) if result['requests'] else None)
+            print(f"  {name} @ {concurrency}: {result['throughput_rps']} req/s, "
+                  f"p95 {result['latency_ms']['p95']} ms, {result['errors']} error(s)", file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def compare(results: list, baseline: dict) -> list:
+    """
+    Pairs each result with the baseline's result for the same scenario and concurrency.
+    """
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline.get('results', [])}
+    deltas = []
+    for result in results:
+        old = previous.get((result['scenario'], result['concurrency']))
+        if not old or not old['throughput_rps'] or not old['latency_ms']['p95']:
+            continue
+        new_p95 = result['latency_ms']['p95']
+        deltas.append({
+            "scenario": result['scenario'],
+            "concurrency": result['concurrency'],
+            "throughput_change_pct": round((result['throughput_rps'] / old['throughput_rps'] - 1) * 100, 1)
+            if result['throughput_rps'] else None,
+            "p95_change_pct": round((new_p95 / old['latency_ms']['p95'] - 1) * 100, 1) if new_p95 else None,
+        })
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma-separated concurrency levels.')
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds per scenario and level.')
+    parser.add_argument('--warmup', type=int, default=3, help='Sequential requests before measuring.')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--port', type=int, default=5100, help='Gateway port.')
+    parser.add_argument('--stub-port', type=int, default=5199)
+    parser.add_argument('--stub-args', default='', help='Extra stub_llm.py arguments, e.g. "--latency 0.5".')
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout.')
+    parser.add_argument('--baseline', help='Earlier results file to compare against.')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenario(s) {unknown}; choose from {list(SCENARIOS)}")
+    services = sorted({SCENARIOS[name][0] for name in scenarios})
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+
+    work_dir = tempfile.mkdtemp(prefix='ai-bench-')
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = _start([sys.executable, 'stub_llm.py', '--port', str(args.stub_port)] + args.stub_args.split(),
+                  BENCH_DIR, dict(os.environ), os.path.join(work_dir, 'stub.log'))
+    env = dict(os.environ, GROQ_API_KEY='stub', GROQ_BASE_URL=stub_url, GROQ_API_BASE=stub_url,
+               GATEWAY_PORT=str(args.port), SCHEDULE_DRAFT_FILE=os.path.join(work_dir, 'final.json'))
+    gateway = None
+    try:
+        wait_for_port('127.0.0.1', args.stub_port, timeout=30)
+        gateway = _start([sys.executable, 'gateway.py', '--services', ','.join(services)],
+                         AI_ROOT, env, os.path.join(work_dir, 'gateway.log'))
+        wait_for_port('127.0.0.1', args.port, timeout=300)
+        started = time.time()
+        results = run_scenarios(f"http://127.0.0.1:{args.port}", stub_url, scenarios, concurrency_levels, args)
+        stub_config = _stub_stats(stub_url)['config']
+    finally:
+        if gateway is not None:
+            _stop(gateway)
+        _stop(stub)
+
+    report = {
+        "git": _git_info(),
+        "started_at": datetime.fromtimestamp(started).isoformat(timespec='seconds'),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "stub": stub_config,
+        "duration_seconds": args.duration,
+        "results": results,
+        "logs": work_dir,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline_commit"] = baseline.get('git', {}).get('commit')
+        report["changes"] = compare(results, baseline)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Throughput benchmark: the Flask dev server vs serve.py's preforked workers.
+
+Both run the engagement service and are driven with /predict_engagement, which
+is CPU-bound and needs no LLM, so the difference is down to the serving mode.
+
+Usage:
+    python serve_throughput.py --concurrency 16 --duration 20 --workers 4 --threads 8
+"""
+import os
+import sys
+import json
+import signal
+import argparse
+import subprocess
+
+from loadgen import build_request, run_load, wait_for_port
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAYLOAD = {
+    "text": "Excited to announce our new product launch 🚀",
+    "platform": "LinkedIn",
+    "timestamp": "2025-08-06 09:30:00",
+}
+
+
+def _start(command: list, cwd: str) -> subprocess.Popen:
+    # Own process group, so the dev server's reloader child is stopped too
+    return subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def _stop(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def bench(name: str, command: list, cwd: str, port: int, args) -> dict:
+    process = _start(command, cwd)
+    try:
+        wait_for_port('127.0.0.1', port, timeout=120)
+        request = build_request(f"http://127.0.0.1:{port}/predict_engagement", PAYLOAD)
+        run_load(request, concurrency=args.concurrency, total_requests=args.concurrency * 5)  # warm-up
+        result = run_load(request, concurrency=args.concurrency, duration=args.duration)
+    finally:
+        _stop(process)
+    return dict(result, mode=name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--port', type=int, default=5101, help='Port for serve.py (the dev server uses 5001).')
+    args = parser.parse_args()
+
+    results = [
+        bench('dev_server', [sys.executable, 'app.py'], os.path.join(AI_ROOT, 'engagement'), 5001, args),
+        bench('serve', [sys.executable, 'serve.py', '--service', 'engagement', '--port', str(args.port),
+                        '--workers', str(args.workers), '--threads', str(args.threads)], AI_ROOT, args.port, args),
+    ]
+    print(json.dumps({
+        "cpu_count": os.cpu_count(),
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "threads": args.threads,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
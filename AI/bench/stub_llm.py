@@ -0,0 +1,259 @@
+"""
+Local stand-in for the Groq (OpenAI-compatible) chat completions API.
+
+Point the services at it with GROQ_BASE_URL (Groq SDK) and GROQ_API_BASE
+(LangChain's ChatGroq), e.g. GROQ_BASE_URL=http://127.0.0.1:5199. It answers
+POST /openai/v1/chat/completions with:
+
+  * tool calls whose arguments are filled in from the requested JSON schema, so
+    with_structured_output(...) in style_analyzer.py parses,
+  * '=== DRAFT n ===' sections when the scheduler asks for several drafts at once,
+  * plain text otherwise.
+
+Latency per call is `latency + uniform(0, jitter) + completion_tokens / tokens_per_second`,
+and `error_rate` of the calls fail with `error_status`. `spike_rate` of the calls
+take an extra `spike_latency` seconds, to exercise deadlines and hedging.
+GET /stats returns call counts.
+
+Usage:
+    python stub_llm.py --port 5199 --latency 0.3 --jitter 0.1 --tokens-per-second 400 --error-rate 0.01
+    python stub_llm.py --spike-rate 0.05 --spike-latency 10
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "growth team launch product insight strategy customers data impact learn build share community "
+    "future innovation results journey leadership market quality focus success idea network value"
+).split()
+MULTI_DRAFT_PATTERN = re.compile(r"Generate (\d+) distinct")
+
+
+class StubConfig:
+    def __init__(self, latency=0.3, jitter=0.1, tokens_per_second=400.0, completion_tokens=120,
+                 error_rate=0.0, error_status=500, spike_rate=0.0, spike_latency=10.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class StubState:
+    """
+    Shared RNG and call counters; the RNG is seeded so runs are repeatable.
+    """
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'spikes': 0, 'tool_calls': 0, 'prompt_tokens': 0,
+                      'completion_tokens': 0}
+
+    def draw(self):
+        with self.lock:
+            return self.random.random(), self.random.random(), self.random.random()
+
+    def count(self, **amounts):
+        with self.lock:
+            for key, amount in amounts.items():
+                self.stats[key] += amount
+
+
+def _filler(tokens: int) -> str:
+    # Roughly 0.75 words per token
+    words = max(1, int(tokens * 0.75))
+    return ' '.join(WORDS[i % len(WORDS)] for i in range(words)).capitalize() + '.'
+
+
+def _value_from_schema(schema: dict, defs: dict, tokens: int):
+    """
+    Builds a value matching a JSON schema (the subset Pydantic emits for simple models).
+    """
+    if '$ref' in schema:
+        schema = defs.get(schema['$ref'].split('/')[-1], {})
+    if 'enum' in schema:
+        return schema['enum'][0]
+    if 'anyOf' in schema:
+        return _value_from_schema(schema['anyOf'][0], defs, tokens)
+    kind = schema.get('type', 'string')
+    if kind == 'object':
+        properties = schema.get('properties', {})
+        share = max(1, tokens // max(1, len(properties)))
+        return {name: _value_from_schema(prop, defs, share) for name, prop in properties.items()}
+    if kind == 'array':
+        return [_value_from_schema(schema.get('items', {}), defs, tokens)]
+    if kind == 'integer':
+        return 1
+    if kind == 'number':
+        return 0.5
+    if kind == 'boolean':
+        return True
+    return _filler(tokens)
+
+
+def _chosen_tool(body: dict):
+    tools = body.get('tools') or []
+    choice = body.get('tool_choice')
+    if isinstance(choice, dict):
+        name = choice.get('function', {}).get('name')
+        return next((t['function'] for t in tools if t['function'].get('name') == name), None)
+    if tools and choice != 'none':
+        return tools[0]['function']
+    return None
+
+
+def build_completion(body: dict, completion_tokens: int) -> dict:
+    """
+    Returns an OpenAI-style chat.completion object answering `body`.
+    """
+    messages = body.get('messages', [])
+    prompt_text = ' '.join(str(m.get('content') or '') for m in messages)
+    message = {'role': 'assistant', 'content': None}
+    finish_reason = 'stop'
+
+    tool = _chosen_tool(body)
+    if tool is not None:
+        parameters = tool.get('parameters', {})
+        arguments = _value_from_schema(parameters, parameters.get('$defs', {}), completion_tokens)
+        message['tool_calls'] = [{
+            'id': f"call_{uuid.uuid4().hex[:12]}",
+            'type': 'function',
+            'function': {'name': tool.get('name'), 'arguments': json.dumps(arguments)},
+        }]
+        finish_reason = 'tool_calls'
+    else:
+        multi = MULTI_DRAFT_PATTERN.search(prompt_text) if '=== DRAFT' in prompt_text else None
+        if multi:
+            drafts = int(multi.group(1))
+            share = max(1, completion_tokens // drafts)
+            message['content'] = '\n'.join(f"=== DRAFT {i} ===\n{_filler(share)}" for i in range(1, drafts + 1))
+        elif (body.get('response_format') or {}).get('type') == 'json_object':
+            message['content'] = json.dumps({'text': _filler(completion_tokens)})
+        else:
+            message['content'] = _filler(completion_tokens)
+
+    prompt_tokens = len(prompt_text) // 4
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'stub'),
+        'system_fingerprint': 'stub',
+        'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason, 'logprobs': None}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+
+def make_handler(state: StubState):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                with state.lock:
+                    self._send_json(200, dict(state.stats, config=state.config.as_dict()))
+            else:
+                self._send_json(404, {'error': {'message': 'Not found'}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length)
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'Not found'}})
+                return
+            try:
+                body = json.loads(raw or b'{}')
+            except ValueError:
+                self._send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+                return
+
+            config = state.config
+            error_draw, jitter_draw, spike_draw = state.draw()
+            completion_tokens = min(config.completion_tokens, body.get('max_tokens') or config.completion_tokens)
+            delay = config.latency + jitter_draw * config.jitter
+            if config.tokens_per_second > 0:
+                delay += completion_tokens / config.tokens_per_second
+            spiked = spike_draw < config.spike_rate
+            if spiked:
+                delay += config.spike_latency
+
+            if error_draw < config.error_rate:
+                time.sleep(config.latency)
+                state.count(requests=1, errors=1)
+                self._send_json(config.error_status, {'error': {'message': 'Injected stub error',
+                                                                'type': 'internal_server_error'}})
+                return
+
+            completion = build_completion(body, completion_tokens)
+            time.sleep(delay)
+            state.count(requests=1, spikes=int(spiked),
+                        tool_calls=int('tool_calls' in completion['choices'][0]['message']),
+                        prompt_tokens=completion['usage']['prompt_tokens'],
+                        completion_tokens=completion_tokens)
+            self._send_json(200, completion)
+
+    return StubHandler
+
+
+def create_server(host: str, port: int, config: StubConfig) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(StubState(config)))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5199)
+    parser.add_argument('--latency', type=float, default=0.3, help='Base seconds before the first token.')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Extra uniform random seconds per call.')
+    parser.add_argument('--tokens-per-second', type=float, default=400.0, help='0 disables generation time.')
+    parser.add_argument('--completion-tokens', type=int, default=120)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--spike-rate', type=float, default=0.0, help='Fraction of calls given a latency spike.')
+    parser.add_argument('--spike-latency', type=float, default=10.0, help='Extra seconds added by a spike.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = StubConfig(latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+                        completion_tokens=args.completion_tokens, error_rate=args.error_rate,
+                        error_status=args.error_status, spike_rate=args.spike_rate,
+                        spike_latency=args.spike_latency, seed=args.seed)
+    server = create_server(args.host, args.port, config)
+    print(f"✅ Stub LLM listening on http://{args.host}:{args.port} with {json.dumps(config.as_dict())}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
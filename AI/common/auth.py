@@ -0,0 +1,15 @@
+import hmac
+
+# Header carrying the token for admin and data-changing endpoints
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+
+def token_authorized(request, token: str) -> bool:
+    """
+    True if the request carries `token` in the X-Admin-Token header. Always False
+    when no token is configured, so guarded endpoints are closed by default.
+    """
+    if not token:
+        return False
+    supplied = request.headers.get(ADMIN_TOKEN_HEADER) or ''
+    return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+from common.metrics import counter
+
+# --- Configuration ---
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+# One SQLite file shared by every service and worker process on the machine
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "ai-llm-cache.sqlite"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+# Calls with temperature > 0 are meant to vary, so they are only cached when this is set
+LLM_CACHE_CREATIVE = os.getenv("LLM_CACHE_CREATIVE", "0") == "1"
+# Evict least-recently-used entries once every this many writes per process
+EVICT_EVERY = 50
+
+CACHE_LOOKUPS = counter('ai_llm_cache_lookups_total', 'LLM cache lookups by result (hit, miss, bypass).',
+                        ['caller', 'result'])
+CACHE_LATENCY_SAVED = counter('ai_llm_cache_latency_saved_seconds_total',
+                              'LLM latency avoided by cache hits, measured when the entry was stored.', ['caller'])
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Collapses whitespace, so prompts built from indented f-strings key the same way.
+    """
+    return _WHITESPACE.sub(' ', prompt).strip()
+
+
+def _schema_signature(schema):
+    if schema is None:
+        return None
+    if hasattr(schema, 'model_json_schema'):
+        return schema.model_json_schema()
+    if hasattr(schema, 'schema'):
+        return schema.schema()
+    return schema
+
+
+def cache_key(model: str, temperature: float, prompt: str, schema=None) -> str:
+    payload = json.dumps([model, float(temperature), normalize_prompt(prompt), _schema_signature(schema)],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _encode(value, schema) -> str:
+    if schema is not None and hasattr(value, 'dict'):
+        return json.dumps(value.model_dump() if hasattr(value, 'model_dump') else value.dict())
+    return json.dumps(value)
+
+
+def _decode(text: str, schema):
+    value = json.loads(text)
+    if schema is not None and isinstance(schema, type):
+        return schema(**value)
+    return value
+
+
+class LLMCache:
+    """
+    SQLite-backed response store with TTL expiry and LRU eviction. WAL mode lets
+    several processes read while one writes; each thread gets its own connection.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are also keyed by pid
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, model TEXT, value TEXT, latency REAL, "
+                "created REAL, last_used REAL, hits INTEGER DEFAULT 0)")
+            connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str):
+        """
+        Returns (value, original latency) for a live entry, or None.
+        """
+        connection = self._connection()
+        row = connection.execute("SELECT value, latency, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[2] > self.ttl_seconds:
+            connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        connection.execute("UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        return row[0], row[1]
+
+    def put(self, key: str, model: str, value: str, latency: float):
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, model, value, latency, created, last_used, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)", (key, model, value, latency, now, now))
+        with self._writes_lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        connection = self._connection()
+        connection.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+        connection.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def summary(self) -> dict:
+        row = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(hits * latency), 0) FROM llm_cache").fetchone()
+        return {'entries': row[0], 'hits': row[1], 'latency_saved_seconds': round(row[2], 3)}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def cacheable(temperature: float) -> bool:
+    return LLM_CACHE_ENABLED and (temperature == 0 or LLM_CACHE_CREATIVE)
+
+
+def _lookup(caller: str, key: str, schema):
+    try:
+        entry = get_cache().get(key)
+    except sqlite3.Error as e:
+        print(f"⚠️ LLM cache lookup failed: {e}")
+        return None
+    if entry is None:
+        return None
+    CACHE_LOOKUPS.inc(caller=caller, result='hit')
+    CACHE_LATENCY_SAVED.inc(entry[1] or 0.0, caller=caller)
+    return _decode(entry[0], schema)
+
+
+def _store(caller: str, key: str, model: str, value, schema, latency: float):
+    CACHE_LOOKUPS.inc(caller=caller, result='miss')
+    if value is None:
+        return
+    try:
+        get_cache().put(key, model, _encode(value, schema), latency)
+    except (sqlite3.Error, TypeError, ValueError) as e:
+        print(f"⚠️ Could not store LLM response in the cache: {e}")
+
+
+def cached_llm_call(caller: str, model: str, temperature: float, prompt: str, compute, schema=None):
+    """
+    Returns the cached response for (model, temperature, prompt, schema), or calls
+    `compute()` and caches its result. `schema` is the Pydantic model of structured
+    outputs; responses are rebuilt from it on a hit. None results are not cached.
+    """
+    if not cacheable(temperature):
+        CACHE_LOOKUPS.inc(caller=caller, result='bypass')
+        return compute()
+    key = cache_key(model, temperature, prompt, schema)
+    value = _lookup(caller, key, schema)
+    if value is not None:
+        return value
+    start = time.perf_counter()
+    value = compute()
+    _store(caller, key, model, value, schema, time.perf_counter() - start)
+    return value
+
+
+async def cached_llm_call_async(caller: str, model: str, temperature: float, prompt: str, compute, schema=None):
+    """
+    cached_llm_call for coroutine functions; `compute` is awaited on a miss.
+    """
+    if not cacheable(temperature):
+        CACHE_LOOKUPS.inc(caller=caller, result='bypass')
+        return await compute()
+    key = cache_key(model, temperature, prompt, schema)
+    value = _lookup(caller, key, schema)
+    if value is not None:
+        return value
+    start = time.perf_counter()
+    value = await compute()
+    _store(caller, key, model, value, schema, time.perf_counter() - start)
+    return value
+
+
+def cache_report() -> dict:
+    """
+    Hit rate and latency saved for this process, plus totals for the shared cache file.
+    """
+    by_caller = {}
+    for (caller, result), count in CACHE_LOOKUPS.samples().items():
+        by_caller.setdefault(caller, {'hit': 0, 'miss': 0, 'bypass': 0})[result] = count
+    for caller, counts in by_caller.items():
+        lookups = counts['hit'] + counts['miss']
+        counts['hit_rate'] = round(counts['hit'] / lookups, 3) if lookups else None
+        counts['latency_saved_seconds'] = round(CACHE_LATENCY_SAVED.value(caller=caller), 3)
+    report = {'enabled': LLM_CACHE_ENABLED, 'creative': LLM_CACHE_CREATIVE, 'process': by_caller}
+    if LLM_CACHE_ENABLED:
+        try:
+            report['shared'] = get_cache().summary()
+        except sqlite3.Error as e:
+            report['shared'] = {'error': str(e)}
+    return report
@@ -0,0 +1,330 @@
+import os
+import json
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets (seconds) covering in-process stages (~1ms) through slow LLM calls (~1min)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# How often a process sharing its metrics (see share_across_processes) republishes them
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# All metrics in this process, by name. Services loaded twice in one process
+# (e.g. both style_analyzer copies in the gateway) get the same metric objects.
+_metrics = {}
+_metrics_lock = threading.Lock()
+# Directory the processes of one server publish their metrics to; None when serving alone
+_shared_dir = None
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels.
+    """
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def samples(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, series: list):
+        with self._lock:
+            for key, value in series:
+                self._values[tuple(key)] = self._values.get(tuple(key), 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets. observe() does one bisect and one increment;
+    bucket counts are only made cumulative when rendered.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._series.items()]
+
+    def merge(self, series: list):
+        with self._lock:
+            for key, (counts, total, count) in series:
+                merged = self._series.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def _get_or_create(cls, name, documentation, labelnames, **kwargs):
+    with _metrics_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    return _get_or_create(Counter, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+# --- Shared Metrics ---
+STAGE_DURATION = histogram('ai_stage_duration_seconds', 'Time spent in a named pipeline stage.', ['stage'])
+STAGE_ERRORS = counter('ai_stage_errors_total', 'Exceptions raised inside a named pipeline stage.', ['stage'])
+LLM_REQUESTS = counter('ai_llm_requests_total', 'Completed LLM calls.', ['model'])
+LLM_TOKENS = counter('ai_llm_tokens_total', 'LLM tokens used, by prompt/completion.', ['model', 'type'])
+HTTP_DURATION = histogram('ai_http_request_duration_seconds', 'HTTP request latency.',
+                          ['service', 'endpoint', 'method', 'status'])
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times the enclosed block into ai_stage_duration_seconds{stage=name}; exceptions
+    are counted in ai_stage_errors_total and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=name)
+
+
+def record_llm_usage(model: str, usage):
+    """
+    Records one LLM call and its token usage. `usage` may be a dict (LangChain
+    llm_output['token_usage']) or an object with prompt_tokens/completion_tokens (Groq SDK).
+    """
+    LLM_REQUESTS.inc(model=model)
+    if usage is None:
+        return
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        tokens = usage.get(kind) if isinstance(usage, dict) else getattr(usage, kind, None)
+        if tokens:
+            LLM_TOKENS.inc(tokens, model=model, type=kind.split('_')[0])
+
+
+_usage_callback = None
+
+
+def llm_usage_callback():
+    """
+    Returns a LangChain callback handler that feeds record_llm_usage. LangChain is
+    imported here rather than at module level so services without it can use metrics.
+    """
+    global _usage_callback
+    if _usage_callback is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class LLMUsageCallback(BaseCallbackHandler):
+            def on_llm_end(self, response, **kwargs):
+                output = response.llm_output or {}
+                record_llm_usage(output.get('model_name', 'unknown'), output.get('token_usage'))
+
+        _usage_callback = LLMUsageCallback()
+    return _usage_callback
+
+
+def _snapshot() -> dict:
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return {metric.name: {'kind': metric.kind, 'documentation': metric.documentation,
+                          'labelnames': metric.labelnames, 'buckets': getattr(metric, 'buckets', None),
+                          'series': metric.snapshot()} for metric in metrics}
+
+
+def publish_metrics():
+    """
+    Writes this process's metrics to the shared directory, replacing its previous copy.
+    """
+    if _shared_dir is None:
+        return
+    path = os.path.join(_shared_dir, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def share_across_processes(directory: str, fresh: bool = False, publish_every: float = METRICS_FLUSH_SECONDS):
+    """
+    Makes this process publish its metrics to `directory` (every `publish_every`
+    seconds, if non-zero), and /metrics render the sum over every process that
+    published there, so a scrape covers all of a server's workers whichever one
+    answers. Files of exited workers are kept so the counters never go backwards.
+    `fresh` drops the values inherited over a fork, which the parent has published.
+    """
+    global _shared_dir
+    os.makedirs(directory, exist_ok=True)
+    _shared_dir = directory
+    if fresh:
+        with _metrics_lock:
+            for metric in _metrics.values():
+                metric.reset()
+    publish_metrics()
+    if not publish_every:
+        return
+
+    def publish_periodically():
+        while True:
+            time.sleep(publish_every)
+            try:
+                publish_metrics()
+            except OSError as e:
+                print(f"⚠️ Could not publish metrics to {directory}: {e}")
+
+    threading.Thread(target=publish_periodically, name='metrics-publisher', daemon=True).start()
+
+
+def _merged_metrics() -> list:
+    """
+    Every metric summed over the snapshots in the shared directory, this process's
+    own published first so it is current.
+    """
+    publish_metrics()
+    merged = {}
+    for name in sorted(os.listdir(_shared_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(_shared_dir, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # Removed or cleared while listing
+        for metric_name, data in snapshot.items():
+            metric = merged.get(metric_name)
+            if metric is None:
+                if data['kind'] == 'histogram':
+                    metric = Histogram(metric_name, data['documentation'], data['labelnames'], data['buckets'])
+                else:
+                    metric = Counter(metric_name, data['documentation'], data['labelnames'])
+                merged[metric_name] = metric
+            metric.merge(data['series'])
+    return list(merged.values())
+
+
+def render_prometheus() -> str:
+    """
+    Renders every metric in the Prometheus text exposition format, summed over the
+    server's processes when they share their metrics.
+    """
+    if _shared_dir is not None:
+        metrics = _merged_metrics()
+    else:
+        with _metrics_lock:
+            metrics = list(_metrics.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def instrument_app(app, service: str):
+    """
+    Adds request-latency tracking and a Prometheus /metrics endpoint to a Flask app.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = getattr(g, '_metrics_start', None)
+        if start is not None:
+            HTTP_DURATION.observe(time.perf_counter() - start, service=service,
+                                  endpoint=request.endpoint or 'unknown', method=request.method,
+                                  status=str(response.status_code))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    return app
@@ -0,0 +1,136 @@
+import os
+import re
+import math
+import hashlib
+
+from common.metrics import counter
+from common.tokens import count_tokens, truncate_to_tokens
+
+# --- Configuration ---
+# Maximum tokens of post text sent to the style analysis prompt
+STYLE_ANALYSIS_TOKEN_BUDGET = int(os.getenv("STYLE_ANALYSIS_TOKEN_BUDGET", "3000"))
+# Posts whose 64-bit simhashes differ in at most this many bits count as near-duplicates
+SIMHASH_MAX_DISTANCE = 3
+# Hashed bag-of-words dimensions used for the diversity distance
+FEATURE_DIMENSIONS = 512
+
+POSTS_SAMPLED = counter('ai_style_posts_total', 'Posts submitted for style analysis, by outcome.', ['outcome'])
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> list:
+    return _WORD.findall(text.lower())
+
+
+def _stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit simhash over word bigrams (single words for very short posts).
+    """
+    words = _words(text)
+    shingles = [' '.join(pair) for pair in zip(words, words[1:])] or words
+    weights = [0] * 64
+    for shingle in shingles:
+        h = _stable_hash(shingle)
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def dedup_near_identical(posts: list) -> list:
+    """
+    Returns indices of posts to keep, dropping later posts within
+    SIMHASH_MAX_DISTANCE bits of an earlier one. Hashes are bucketed by four
+    16-bit bands; two hashes that close always share at least one band.
+    """
+    bands = [{} for _ in range(4)]
+    kept = []
+    for index, post in enumerate(posts):
+        h = simhash(post)
+        keys = [(h >> (16 * band)) & 0xFFFF for band in range(4)]
+        candidates = {other for band, key in enumerate(keys) for other in bands[band].get(key, ())}
+        if any(bin(h ^ other).count('1') <= SIMHASH_MAX_DISTANCE for other in candidates):
+            continue
+        for band, key in enumerate(keys):
+            bands[band].setdefault(key, []).append(h)
+        kept.append(index)
+    return kept
+
+
+def _feature_vector(text: str) -> dict:
+    """
+    L2-normalised hashed term-frequency vector, stored sparsely.
+    """
+    vector = {}
+    for word in _words(text):
+        slot = _stable_hash(word) % FEATURE_DIMENSIONS
+        vector[slot] = vector.get(slot, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {slot: v / norm for slot, v in vector.items()}
+
+
+def _distance(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return 1.0 - sum(v * b.get(slot, 0.0) for slot, v in a.items())
+
+
+def select_representative_posts(posts: list, token_budget: int = STYLE_ANALYSIS_TOKEN_BUDGET,
+                                 separator: str = "\n\n---\n\n") -> list:
+    """
+    Picks a diverse subset of `posts` whose joined text fits in `token_budget`.
+
+    Near-duplicates are dropped first. The remaining posts are picked greedily as
+    k-center cluster heads: the one closest to the centroid, then whichever post
+    is farthest from everything picked so far, skipping posts that no longer fit.
+    The result keeps the original order. A single post larger than the whole
+    budget is truncated rather than dropped.
+    """
+    posts = [post for post in posts if isinstance(post, str) and post.strip()]
+    POSTS_SAMPLED.inc(len(posts), outcome='submitted')
+    if not posts:
+        return []
+
+    unique = dedup_near_identical(posts)
+    POSTS_SAMPLED.inc(len(posts) - len(unique), outcome='duplicate')
+
+    tokens = {i: count_tokens(posts[i]) for i in unique}
+    separator_tokens = count_tokens(separator)
+    if sum(tokens.values()) + separator_tokens * (len(unique) - 1) <= token_budget:
+        POSTS_SAMPLED.inc(len(unique), outcome='selected')
+        return [posts[i] for i in unique]
+
+    vectors = {i: _feature_vector(posts[i]) for i in unique}
+    centroid = {}
+    for vector in vectors.values():
+        for slot, v in vector.items():
+            centroid[slot] = centroid.get(slot, 0.0) + v
+    norm = math.sqrt(sum(v * v for v in centroid.values())) or 1.0
+    centroid = {slot: v / norm for slot, v in centroid.items()}
+
+    first = min(unique, key=lambda i: _distance(vectors[i], centroid))
+    if tokens[first] > token_budget:
+        POSTS_SAMPLED.inc(1, outcome='selected')
+        return [truncate_to_tokens(posts[first], token_budget)]
+
+    selected = [first]
+    used = tokens[first]
+    nearest = {i: _distance(vectors[i], vectors[first]) for i in unique if i != first}
+    while nearest:
+        remaining = token_budget - used - separator_tokens
+        fitting = [i for i in nearest if tokens[i] <= remaining]
+        if not fitting:
+            break
+        pick = max(fitting, key=lambda i: (nearest[i], -i))
+        selected.append(pick)
+        used += tokens[pick] + separator_tokens
+        del nearest[pick]
+        for i in nearest:
+            nearest[i] = min(nearest[i], _distance(vectors[i], vectors[pick]))
+
+    POSTS_SAMPLED.inc(len(selected), outcome='selected')
+    return [posts[i] for i in sorted(selected)]
@@ -0,0 +1,231 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import pstats
+import cProfile
+import tempfile
+import threading
+from collections import Counter
+
+from common.auth import token_authorized
+
+# --- Configuration ---
+# Profiling is opt-in; when enabled, requests are profiled at PROFILE_SAMPLE_RATE
+# or when they carry the PROFILE_HEADER header (e.g. "X-Profile: 1").
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ai-profiles"))
+# Admin endpoints and header-triggered profiling require a matching X-Admin-Token header;
+# while it is unset both are disabled and only PROFILE_SAMPLE_RATE profiles requests
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+# Stack sampling interval for the collapsed-stack (flamegraph) output
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.001"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "200"))
+PROFILE_TOP_N = 60
+
+PROFILE_FILES = {
+    'calltree': 'calltree.txt',
+    'collapsed': 'collapsed.txt',
+}
+_SAFE_ID = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval and counts identical
+    stacks, producing the collapsed-stack format flamegraph tools read.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class RequestProfile:
+    """
+    cProfile (for the call-tree text) plus a stack sampler (for the flamegraph)
+    around one request's handler.
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        self.started = time.perf_counter()
+        self.cprofile_active = False
+
+    def start(self):
+        try:
+            self.profiler.enable()
+            self.cprofile_active = True
+        except ValueError:
+            # Only one cProfile may be active at a time on newer Pythons; keep the sampler
+            pass
+        self.sampler.start()
+
+    def stop(self):
+        if self.cprofile_active:
+            self.profiler.disable()
+        self.sampler.stop()
+        return time.perf_counter() - self.started
+
+    def call_tree(self) -> str:
+        if not self.cprofile_active:
+            return "cProfile was unavailable for this request (another profiler was active).\n"
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+        stats.print_callees(PROFILE_TOP_N)
+        return out.getvalue()
+
+
+def _authorized(request) -> bool:
+    return token_authorized(request, PROFILE_ADMIN_TOKEN)
+
+
+def _admin_error(request):
+    """
+    The error response for an admin request that may not proceed, else None.
+    """
+    from flask import jsonify
+    if not PROFILE_ADMIN_TOKEN:
+        return jsonify({"error": "Profile admin endpoints are disabled; set PROFILE_ADMIN_TOKEN to enable them"}), 403
+    if not _authorized(request):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+def _should_profile(request) -> bool:
+    if not PROFILING_ENABLED or request.path.startswith('/admin/profiles') or request.path == '/metrics':
+        return False
+    if request.headers.get(PROFILE_HEADER) and _authorized(request):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _save_profile(profile: RequestProfile, duration: float, service: str, request, status: int):
+    directory = os.path.join(PROFILE_DIR, profile.request_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, PROFILE_FILES['calltree']), 'w') as f:
+        f.write(profile.call_tree())
+    with open(os.path.join(directory, PROFILE_FILES['collapsed']), 'w') as f:
+        f.write(profile.sampler.collapsed())
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({
+            'request_id': profile.request_id,
+            'service': service,
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'duration_ms': round(duration * 1000, 2),
+            'samples': sum(profile.sampler.samples.values()),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }, f, indent=2)
+    _enforce_retention()
+
+
+def _enforce_retention():
+    entries = sorted((e for e in os.scandir(PROFILE_DIR) if e.is_dir()), key=lambda e: e.stat().st_mtime)
+    for entry in entries[:max(0, len(entries) - PROFILE_MAX_STORED)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def list_profiles() -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        meta_path = os.path.join(entry.path, 'meta.json')
+        if entry.is_dir() and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                profiles.append(json.load(f))
+    return sorted(profiles, key=lambda p: p['created'], reverse=True)
+
+
+def init_profiling(app, service: str):
+    """
+    Adds opt-in request profiling and the /admin/profiles download endpoints to a Flask app.
+    """
+    from flask import g, jsonify, request, send_file
+
+    @app.before_request
+    def _start_profile():
+        if _should_profile(request):
+            # The client's request id is only a label; the server-generated part keeps ids unique
+            client_id = _SAFE_ID.sub('', request.headers.get('X-Request-ID', ''))[:64]
+            request_id = f"{client_id}-{uuid.uuid4().hex}" if client_id else uuid.uuid4().hex
+            g._profile = RequestProfile(request_id)
+            g._profile.start()
+
+    @app.after_request
+    def _tag_profile(response):
+        profile = getattr(g, '_profile', None)
+        if profile is not None:
+            response.headers['X-Profile-Id'] = profile.request_id
+            g._profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return
+        duration = profile.stop()
+        try:
+            _save_profile(profile, duration, service, request, g.pop('_profile_status', 500))
+        except OSError as e:
+            print(f"⚠️ Could not store profile {profile.request_id}: {e}")
+
+    @app.route('/admin/profiles', methods=['GET'])
+    def list_profiles_endpoint():
+        error = _admin_error(request)
+        if error:
+            return error
+        return jsonify({"profiles": list_profiles()})
+
+    @app.route('/admin/profiles/<request_id>/<kind>', methods=['GET'])
+    def download_profile_endpoint(request_id, kind):
+        error = _admin_error(request)
+        if error:
+            return error
+        if kind not in PROFILE_FILES or _SAFE_ID.search(request_id):
+            return jsonify({"error": f"Unknown profile file. Use one of {list(PROFILE_FILES)}."}), 404
+        path = os.path.join(PROFILE_DIR, request_id, PROFILE_FILES[kind])
+        if not os.path.exists(path):
+            return jsonify({"error": "Profile not found."}), 404
+        return send_file(path, mimetype='text/plain', as_attachment=True,
+                         download_name=f"{request_id}-{PROFILE_FILES[kind]}")
+
+    return app
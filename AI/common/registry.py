@@ -0,0 +1,174 @@
+import os
+import tempfile
+import threading
+
+from common.metrics import llm_usage_callback
+
+# --- Configuration ---
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENGAGEMENT_DIR = os.path.join(AI_ROOT, 'engagement')
+LGBM_MODEL_PATH = os.path.join(ENGAGEMENT_DIR, 'lightgbm_multi_engagement_model.pkl')
+XGB_MODEL_PATH = os.path.join(ENGAGEMENT_DIR, 'xgboost_multi_engagement_model.pkl')
+# Writable data outside the source tree: the datasets observations are appended to and the
+# models updated from them (engagement/model_updater.py); the shipped pickles stay untouched
+ENGAGEMENT_DATA_DIR = os.getenv("ENGAGEMENT_DATA_DIR", os.path.join(tempfile.gettempdir(), "ai-engagement"))
+UPDATED_LGBM_MODEL_PATH = os.path.join(ENGAGEMENT_DATA_DIR, os.path.basename(LGBM_MODEL_PATH))
+UPDATED_XGB_MODEL_PATH = os.path.join(ENGAGEMENT_DATA_DIR, os.path.basename(XGB_MODEL_PATH))
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# HTTP timeout for LLM clients; bounds calls abandoned at their deadline by common.resilience
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+# How services load their components at startup: "eager" blocks until they are ready,
+# "background" loads them on a daemon thread while requests are already served, and
+# "off" leaves each one to its first use
+WARM_UP_MODE = os.getenv("WARM_UP_MODE", "eager")
+# LangChain modules imported on first use by the services; warm_up() imports them ahead
+LANGCHAIN_MODULES = [
+    'langchain.chains.combine_documents',
+    'langchain_core.documents',
+    'langchain_core.prompts',
+]
+
+# Chat models the services use, warmed up front by warm_up()
+WARM_CHAT_MODELS = [
+    ("llama3-70b-8192", 0),
+    ("llama3-70b-8192", 0.7),
+]
+
+# Process-wide instances keyed by component; each key gets its own creation lock
+# so a slow load (e.g. the embedding model) doesn't block unrelated lookups.
+_instances = {}
+_key_locks = {}
+_registry_lock = threading.Lock()
+# pid -> background warm-up thread, so a forked worker starts its own
+_warm_up_threads = {}
+
+
+def _get_or_create(key, factory):
+    instance = _instances.get(key)
+    if instance is not None:
+        return instance
+    with _registry_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        instance = _instances.get(key)
+        if instance is None:
+            instance = factory()
+            _instances[key] = instance
+    return instance
+
+
+def get_chat_llm(model: str, temperature: float):
+    """
+    Returns the shared ChatGroq instance for a model/temperature pair.
+    """
+    def create():
+        from langchain_groq import ChatGroq
+        return ChatGroq(model=model, temperature=temperature, groq_api_key=os.getenv("GROQ_API_KEY"),
+                        timeout=LLM_REQUEST_TIMEOUT, callbacks=[llm_usage_callback()])
+
+    return _get_or_create(('chat_llm', model, temperature), create)
+
+
+def get_groq_client():
+    """
+    Returns the shared synchronous Groq client.
+    """
+    def create():
+        from groq import Groq
+        return Groq(api_key=os.getenv("GROQ_API_KEY"), timeout=LLM_REQUEST_TIMEOUT)
+
+    return _get_or_create(('groq_client',), create)
+
+
+def get_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL):
+    """
+    Returns the shared HuggingFace embedding model.
+    """
+    def create():
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+
+    return _get_or_create(('embeddings', model_name), create)
+
+
+def engagement_model_paths() -> tuple:
+    """
+    The (LightGBM, XGBoost) pickles to load: the updated pair in ENGAGEMENT_DATA_DIR
+    once there is one, else the models shipped with the repo.
+    """
+    if os.path.exists(UPDATED_LGBM_MODEL_PATH) and os.path.exists(UPDATED_XGB_MODEL_PATH):
+        return UPDATED_LGBM_MODEL_PATH, UPDATED_XGB_MODEL_PATH
+    return LGBM_MODEL_PATH, XGB_MODEL_PATH
+
+
+def get_engagement_models():
+    """
+    Returns the (LightGBM, XGBoost) engagement models, loaded once per process.
+    Raises FileNotFoundError if the pickles are missing.
+    """
+    def create():
+        import joblib
+        lgbm_path, xgb_path = engagement_model_paths()
+        return joblib.load(lgbm_path), joblib.load(xgb_path)
+
+    return _get_or_create(('engagement_models',), create)
+
+
+def import_langchain_modules():
+    """
+    Imports the LangChain modules the services otherwise import on first use.
+    """
+    import importlib
+    return [importlib.import_module(name) for name in LANGCHAIN_MODULES]
+
+
+def warm_up(components=('chat_llm', 'groq_client', 'embeddings', 'engagement_models', 'langchain')):
+    """
+    Creates the requested shared components up front so the first request doesn't pay for them.
+    Failures are reported and skipped; the owning service reports them again on use.
+    """
+    loaders = {
+        'chat_llm': lambda: [get_chat_llm(model, temperature) for model, temperature in WARM_CHAT_MODELS],
+        'groq_client': get_groq_client,
+        'embeddings': get_embeddings,
+        'engagement_models': get_engagement_models,
+        'langchain': import_langchain_modules,
+    }
+    for component in components:
+        try:
+            loaders[component]()
+            print(f"✅ Warmed up shared {component}.")
+        except Exception as e:
+            print(f"⚠️ Warning: Could not warm up {component}: {e}")
+
+
+def start_background_warm_up(components) -> threading.Thread:
+    """
+    Runs warm_up() on a daemon thread, once per process. Call it after forking;
+    a lookup that arrives first simply waits for (or does) that component's load.
+    """
+    with _registry_lock:
+        thread = _warm_up_threads.get(os.getpid())
+        if thread is None:
+            thread = threading.Thread(target=warm_up, args=(tuple(components),), name='registry-warm-up', daemon=True)
+            _warm_up_threads[os.getpid()] = thread
+            thread.start()
+    return thread
+
+
+def warm_up_on_start(components, mode: str = None):
+    """
+    Warms up the components as WARM_UP_MODE (or `mode`) says: now, in the background, or not at all.
+    """
+    mode = mode or WARM_UP_MODE
+    if mode == 'eager':
+        warm_up(components)
+    elif mode == 'background':
+        start_background_warm_up(components)
+
+
+def loaded_components() -> list:
+    """
+    Lists the keys of everything currently held by the registry.
+    """
+    return [list(key) for key in _instances]
@@ -0,0 +1,338 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from common.metrics import counter
+
+# --- Configuration ---
+# Overall time a caller waits for an LLM call, hedges included
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") == "1"
+# A duplicate request is sent once the first has taken longer than this percentile
+# of recent latencies for the same call site (but never sooner than the minimum delay)
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+# Latencies needed before the percentile is trusted; until then the deadline / 2 is used
+LLM_HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Consecutive failures that open a breaker, and how long it stays open before a probe
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+LLM_CALL_POOL_SIZE = int(os.getenv("LLM_CALL_POOL_SIZE", "64"))
+# Transport errors of the HTTP clients under the LLM SDKs (httpx, groq/openai), matched by
+# name so this module imports none of them; status errors are judged by their status code
+TRANSIENT_ERROR_NAMES = {'TransportError', 'TimeoutException', 'APIConnectionError', 'APITimeoutError'}
+
+HEDGES = counter('ai_llm_hedges_total', 'Hedged duplicate LLM requests sent.', ['name'])
+HEDGE_WINS = counter('ai_llm_hedge_wins_total', 'Hedged requests that finished before the original.', ['name'])
+DEADLINES = counter('ai_llm_deadline_exceeded_total', 'LLM calls abandoned at their deadline.', ['name'])
+CIRCUIT_REJECTIONS = counter('ai_llm_circuit_rejections_total', 'Calls refused by an open circuit breaker.',
+                             ['breaker'])
+CIRCUIT_OPENED = counter('ai_llm_circuit_opened_total', 'Times a circuit breaker opened.', ['breaker'])
+
+
+class LLMUnavailableError(Exception):
+    """
+    Base class for calls refused or abandoned by the resilience layer.
+    """
+    status_code = 503
+
+
+class DeadlineExceeded(LLMUnavailableError, TimeoutError):
+    status_code = 504
+
+
+class CircuitOpenError(LLMUnavailableError):
+    status_code = 503
+
+    def __init__(self, breaker: str, retry_after: float):
+        super().__init__(f"Circuit '{breaker}' is open; retry in {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """
+    Sliding window of successful call latencies.
+    """
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float):
+        with self._lock:
+            if len(self._samples) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after CIRCUIT_FAILURE_THRESHOLD consecutive failures. After
+    CIRCUIT_RESET_SECONDS one probe call is let through (half-open); its outcome
+    closes the breaker or re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """
+        Lets a call through or raises CircuitOpenError. Returns True for the half-open
+        probe, whose caller must then record an outcome whatever happens.
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return False
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+                return True
+        CIRCUIT_REJECTIONS.inc(breaker=self.name)
+        raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    CIRCUIT_OPENED.inc(breaker=self.name)
+                    print(f"⚠️ Circuit '{self.name}' opened after {self.failures} failure(s).")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_trackers = {}
+_registry_lock = threading.Lock()
+_pool = None
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        return _breakers.setdefault(name, CircuitBreaker(name))
+
+
+def _get_tracker(name: str) -> LatencyTracker:
+    with _registry_lock:
+        return _trackers.setdefault(name, LatencyTracker())
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _registry_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=LLM_CALL_POOL_SIZE, thread_name_prefix='llm-call')
+        return _pool
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    True for failures that say the provider is struggling: timeouts, transport
+    errors, 429 and 5xx responses. Anything else (4xx, parse or validation errors)
+    is deterministic, so it neither trips the breaker nor is retried by a hedge.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def hedge_delay(name: str, deadline: float):
+    """
+    Seconds to wait before sending a duplicate request, or None to never hedge.
+    """
+    if not LLM_HEDGE_ENABLED:
+        return None
+    observed = _get_tracker(name).percentile(LLM_HEDGE_PERCENTILE)
+    delay = max(LLM_HEDGE_MIN_DELAY, observed if observed is not None else deadline / 2)
+    return delay if delay < deadline else None
+
+
+def call_with_resilience(name: str, fn, breaker: str = 'groq', deadline: float = None, hedge: bool = True):
+    """
+    Runs `fn()` on the LLM call pool with a deadline, a hedged duplicate after the
+    call site's p95 latency, and the named circuit breaker. `fn` must be safe to
+    run twice. Raises DeadlineExceeded, CircuitOpenError or the call's own error.
+    Deadlines and transient errors (see is_transient) count against the breaker;
+    other errors mean the provider answered and count as a success.
+
+    A call past its deadline keeps running in the pool until the client's own
+    HTTP timeout, but the caller (and its Flask worker) is released.
+    """
+    deadline = deadline or LLM_DEADLINE_SECONDS
+    circuit = get_breaker(breaker)
+    probe = circuit.before_call()
+    settled = False
+    try:
+        result = _call_sync(name, fn, circuit, deadline, hedge)
+        settled = True
+        return result
+    except Exception as e:
+        settled = True
+        if not isinstance(e, DeadlineExceeded) and not is_transient(e):
+            circuit.record_success()  # The provider answered; the request itself was bad
+        else:
+            circuit.record_failure()
+        raise
+    finally:
+        if probe and not settled:
+            circuit.record_failure()  # Interrupted probe: re-open rather than stay half-open
+
+
+def _call_sync(name: str, fn, circuit: CircuitBreaker, deadline: float, hedge: bool):
+    tracker = _get_tracker(name)
+    pool = _get_pool()
+
+    start = time.monotonic()
+    end = start + deadline
+    delay = hedge_delay(name, deadline) if hedge else None
+    hedge_at = start + delay if delay else None
+    pending = {pool.submit(fn)}
+    hedged = None
+    last_error = None
+
+    while pending:
+        wake = end if hedge_at is None else min(end, hedge_at)
+        done, pending = wait(pending, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                last_error = e
+                continue
+            tracker.record(time.monotonic() - start)
+            circuit.record_success()
+            if future is hedged:
+                HEDGE_WINS.inc(name=name)
+            return result
+
+        now = time.monotonic()
+        if now >= end:
+            break
+        if hedge_at is not None and now >= hedge_at and pending and hedged is None:
+            HEDGES.inc(name=name)
+            hedged = pool.submit(fn)
+            pending.add(hedged)
+            hedge_at = None
+
+    if not pending and last_error is not None:
+        raise last_error
+    DEADLINES.inc(name=name)
+    raise DeadlineExceeded(f"LLM call '{name}' exceeded its {deadline:g}s deadline.")
+
+
+async def call_with_resilience_async(name: str, coro_fn, breaker: str = 'groq', deadline: float = None,
+                                     hedge: bool = True):
+    """
+    Async counterpart of call_with_resilience: `coro_fn()` returns a fresh coroutine
+    per attempt, and losing or late attempts are cancelled rather than abandoned.
+    """
+    deadline = deadline or LLM_DEADLINE_SECONDS
+    circuit = get_breaker(breaker)
+    probe = circuit.before_call()
+    settled = False
+    try:
+        result = await _call_async(name, coro_fn, circuit, deadline, hedge)
+        settled = True
+        return result
+    except Exception as e:
+        settled = True
+        if not isinstance(e, DeadlineExceeded) and not is_transient(e):
+            circuit.record_success()  # The provider answered; the request itself was bad
+        else:
+            circuit.record_failure()
+        raise
+    finally:
+        if probe and not settled:
+            circuit.record_failure()  # Cancelled probe: re-open rather than stay half-open
+
+
+async def _call_async(name: str, coro_fn, circuit: CircuitBreaker, deadline: float, hedge: bool):
+    tracker = _get_tracker(name)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    end = start + deadline
+    delay = hedge_delay(name, deadline) if hedge else None
+    hedge_at = start + delay if delay else None
+    pending = {asyncio.ensure_future(coro_fn())}
+    hedged = None
+    last_error = None
+
+    try:
+        while pending:
+            wake = end if hedge_at is None else min(end, hedge_at)
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, wake - loop.time()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    if not is_transient(task.exception()):
+                        raise task.exception()
+                    last_error = task.exception()
+                    continue
+                tracker.record(loop.time() - start)
+                circuit.record_success()
+                if task is hedged:
+                    HEDGE_WINS.inc(name=name)
+                return task.result()
+
+            now = loop.time()
+            if now >= end:
+                break
+            if hedge_at is not None and now >= hedge_at and pending and hedged is None:
+                HEDGES.inc(name=name)
+                hedged = asyncio.ensure_future(coro_fn())
+                pending.add(hedged)
+                hedge_at = None
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if not pending and last_error is not None:
+        raise last_error
+    DEADLINES.inc(name=name)
+    raise DeadlineExceeded(f"LLM call '{name}' exceeded its {deadline:g}s deadline.")
+
+
+def register_error_handlers(app):
+    """
+    Maps resilience errors escaping a view to 503 (with Retry-After) or 504 JSON responses.
+    """
+    from flask import jsonify
+
+    @app.errorhandler(LLMUnavailableError)
+    def _llm_unavailable(error):
+        response = jsonify({"error": str(error)})
+        response.status_code = error.status_code
+        if isinstance(error, CircuitOpenError):
+            response.headers['Retry-After'] = str(int(error.retry_after))
+        return response
+
+    return app
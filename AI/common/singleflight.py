@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+from common.metrics import counter
+
+# --- Configuration ---
+# 'thread' coalesces within one process, 'sqlite' also across worker processes, 'off' disables it
+SINGLEFLIGHT_MODE = os.getenv("SINGLEFLIGHT_MODE", "thread").lower()
+SINGLEFLIGHT_DB_PATH = os.getenv("SINGLEFLIGHT_DB_PATH", os.path.join(tempfile.gettempdir(), "ai-singleflight.sqlite"))
+# Longest a follower waits on another worker before doing the work itself (also how old
+# an unfinished claim must be before it is treated as abandoned by a crashed worker)
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "90"))
+# How long a finished cross-worker result stays readable for followers that were waiting on
+# it; a request arriving after the call finished never reads it, it claims the key again
+SINGLEFLIGHT_RESULT_SECONDS = float(os.getenv("SINGLEFLIGHT_RESULT_SECONDS", "2"))
+POLL_INTERVAL = 0.05
+
+COALESCED = counter('ai_singleflight_requests_total', 'Requests by single-flight role (leader, follower, remote_follower).',
+                    ['name', 'role'])
+
+
+def payload_key(name: str, payload) -> str:
+    """
+    Canonical hash of a JSON payload: key order and whitespace don't matter.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{name}\n{canonical}".encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _follower_error(error: BaseException) -> BaseException:
+    """
+    A fresh exception for one follower, so followers don't all raise (and extend the
+    traceback of) the leader's single instance. It keeps the type and attributes, so
+    error handlers keyed on the type still apply.
+    """
+    try:
+        copy = type(error).__new__(type(error), *error.args)
+        copy.__dict__.update(error.__dict__)
+    except Exception:
+        copy = RuntimeError(f"Coalesced call failed: {error!r}")
+    return copy
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time in this process; concurrent callers with the
+    same key wait for it and get its result (or a copy of its exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn):
+        """
+        Returns (result, shared), where shared is True for callers that waited on another.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise _follower_error(call.error) from call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class SQLiteSingleFlight:
+    """
+    Cross-worker single flight: the first worker to claim a key in a shared SQLite
+    table does the work and stores the JSON result; the others poll for it. Only
+    workers that arrived while the call was running get the result: a finished row
+    is claimed afresh, so it never serves as a cache. Errors are not shared: the
+    claim is dropped and a waiting worker does the work itself.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS inflight ("
+                "key TEXT PRIMARY KEY, owner INTEGER, started REAL, finished REAL, result TEXT)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _claim(self, key: str) -> bool:
+        connection = self._connection()
+        now = time.time()
+        connection.execute("DELETE FROM inflight WHERE finished < ? OR (finished IS NULL AND started < ?)",
+                           (now - SINGLEFLIGHT_RESULT_SECONDS, now - SINGLEFLIGHT_WAIT_SECONDS))
+        cursor = connection.execute(
+            "INSERT INTO inflight (key, owner, started) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "owner = excluded.owner, started = excluded.started, finished = NULL, result = NULL "
+            "WHERE finished IS NOT NULL", (key, os.getpid(), now))
+        return cursor.rowcount == 1
+
+    def do(self, key: str, fn):
+        deadline = time.monotonic() + SINGLEFLIGHT_WAIT_SECONDS
+        while True:
+            if self._claim(key):
+                try:
+                    result = fn()
+                except BaseException:
+                    self._connection().execute("DELETE FROM inflight WHERE key = ?", (key,))
+                    raise
+                self._connection().execute("UPDATE inflight SET finished = ?, result = ? WHERE key = ?",
+                                           (time.time(), json.dumps(result), key))
+                return result, False
+
+            while time.monotonic() < deadline:
+                row = self._connection().execute("SELECT finished, result FROM inflight WHERE key = ?",
+                                                 (key,)).fetchone()
+                if row is None:
+                    break  # The leader failed; try to claim the key ourselves
+                if row[0] is not None:
+                    return json.loads(row[1]), True
+                time.sleep(POLL_INTERVAL)
+            else:
+                return fn(), False
+
+
+_local_flight = SingleFlight()
+_shared_flight = None
+_shared_lock = threading.Lock()
+
+
+def _get_shared_flight() -> SQLiteSingleFlight:
+    global _shared_flight
+    with _shared_lock:
+        if _shared_flight is None:
+            _shared_flight = SQLiteSingleFlight(SINGLEFLIGHT_DB_PATH)
+        return _shared_flight
+
+
+def coalesce(name: str, payload, fn):
+    """
+    Runs `fn()` once for all concurrent callers passing an identical `payload` under
+    `name`, and returns its result to each of them. In 'sqlite' mode the result must
+    be JSON-serializable, since other workers read it from the shared database.
+    """
+    if SINGLEFLIGHT_MODE == 'off':
+        return fn()
+    key = payload_key(name, payload)
+    if SINGLEFLIGHT_MODE == 'sqlite':
+        # Collapse duplicates within this worker first, so only one thread per worker polls
+        work = lambda: _get_shared_flight().do(key, fn)
+    else:
+        work = lambda: (fn(), False)
+
+    (result, shared_remotely), shared_locally = _local_flight.do(key, work)
+    role = 'follower' if shared_locally else ('remote_follower' if shared_remotely else 'leader')
+    COALESCED.inc(name=name, role=role)
+    return result
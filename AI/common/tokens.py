@@ -0,0 +1,57 @@
+import re
+import threading
+
+# Word runs and single non-space symbols; used when tiktoken isn't installed
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+_encoding = None
+_encoding_checked = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """
+    Returns a tiktoken encoding if tiktoken is installed, else None. Llama 3 uses a
+    tiktoken-style BPE, so cl100k_base is a close local stand-in.
+    """
+    global _encoding, _encoding_checked
+    if not _encoding_checked:
+        with _encoding_lock:
+            if not _encoding_checked:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoding = None
+                _encoding_checked = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Fast local token count. Exact for cl100k_base when tiktoken is available;
+    otherwise about one token per short word or symbol, plus one per extra six
+    characters of a long word.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(1 + (len(piece) - 1) // 6 for piece in _PIECE.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Returns the longest prefix of `text` that fits in `max_tokens`.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
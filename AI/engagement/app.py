@@ -1,18 +1,37 @@
 import os
+from datetime import datetime
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 # Import functions from your other logic files
-from style_analyzer import analyze_posts, refine_post_for_platforms
-from engagement_predictor import predict_engagement
+from style_analyzer import analyze_posts, refine_post_candidates, refine_post_for_platforms
+from engagement_predictor import ENGAGEMENT_PREDICTION_MODE, predict_engagement, predict_engagement_batch
+from prediction_table import table_status
+from model_updater import (OBSERVATIONS_TOKEN, append_observations, ensure_updater_started, observations_authorized,
+                           update_status, validate_observation)
+from common.metrics import instrument_app
+from common.profiling import init_profiling
+from common.resilience import register_error_handlers
+from common.singleflight import coalesce
 
 # Load environment variables
 load_dotenv()
 
+# --- Configuration ---
+# Upper bound on the "candidates" a /refine_post request may ask for (one LLM call each)
+REFINE_MAX_CANDIDATES = int(os.getenv("REFINE_MAX_CANDIDATES", "8"))
+RANK_METRICS = ('impressions', 'likes', 'comments')
+PLATFORMS = {'linkedin': 'linkedin_post', 'twitter': 'twitter_post'}
+
 # Initialize Flask app and CORS
 app = Flask(__name__)
 CORS(app)
+instrument_app(app, 'engagement')
+init_profiling(app, 'engagement')
+register_error_handlers(app)  # 503/504 when LLM calls time out or the circuit is open
+# Each worker's model updater starts with its first request, after any fork
+app.before_request(ensure_updater_started)
 
 
 # --- Endpoint 1: Style Analysis ---
@@ -25,13 +44,15 @@ def generate_style_analysis():
     if not data or 'posts' not in data:
         return jsonify({"error": "Invalid payload"}), 400
 
-    style_info = analyze_posts(data.get('posts'))
-    if not style_info:
-        return jsonify({"error": "Failed to analyze post style."}), 500
+    def analyze():
+        style_info = analyze_posts(data.get('posts'))
+        if not style_info:
+            return {"error": "Failed to analyze post style."}, 500
+        return {"identified_style": style_info.dict()}, 200
 
-    return jsonify({
-        "identified_style": style_info.dict()
-    })
+    # Identical concurrent requests share one analysis
+    body, status = coalesce('engagement.generate', {"posts": data.get('posts')}, analyze)
+    return jsonify(body), status
 
 
 # --- Endpoint 2: Refined Post Generation ---
@@ -39,16 +60,64 @@ def generate_style_analysis():
 def refine_post_endpoint():
     """
     Accepts style and topic, then generates platform-specific posts.
+    With "candidates": N (> 1), generates N drafts per platform and returns them
+    ranked by predicted engagement ("rank_by": impressions, likes or comments).
     """
     data = request.get_json()
     if not data or 'identified_style' not in data or 'topic' not in data:
         return jsonify({"error": "Invalid payload"}), 400
 
-    refined_posts = refine_post_for_platforms(data.get('topic'), data.get('identified_style'))
-    if not refined_posts:
+    candidates = data.get('candidates', 1)
+    if not isinstance(candidates, int) or not 1 <= candidates <= REFINE_MAX_CANDIDATES:
+        return jsonify({"error": f"'candidates' must be an integer from 1 to {REFINE_MAX_CANDIDATES}"}), 400
+    if candidates > 1:
+        return _refine_best_of_n(data, candidates)
+
+    def refine():
+        refined_posts = refine_post_for_platforms(data.get('topic'), data.get('identified_style'))
+        if not refined_posts:
+            return {"error": "Failed to generate refined posts."}, 500
+        return refined_posts.dict(), 200
+
+    payload = {"topic": data.get('topic'), "identified_style": data.get('identified_style')}
+    body, status = coalesce('engagement.refine_post', payload, refine)
+    return jsonify(body), status
+
+
+def _refine_best_of_n(data: dict, n: int):
+    """
+    Generates n candidate post sets and ranks each platform's drafts by the mean
+    of both models' predictions, scored in one batched pass.
+    """
+    rank_by = data.get('rank_by', 'impressions')
+    if rank_by not in RANK_METRICS:
+        return jsonify({"error": f"'rank_by' must be one of {list(RANK_METRICS)}"}), 400
+    timestamp = data.get('timestamp') or datetime.now().isoformat(timespec='minutes')
+
+    candidate_sets = refine_post_candidates(data.get('topic'), data.get('identified_style'), n)
+    if not candidate_sets:
         return jsonify({"error": "Failed to generate refined posts."}), 500
 
-    return jsonify(refined_posts.dict())
+    # Every platform's distinct drafts go through the models together
+    drafts = {platform: list(dict.fromkeys(getattr(candidate, field) for candidate in candidate_sets))
+              for platform, field in PLATFORMS.items()}
+    rows = [{"text": text, "platform": platform, "timestamp": timestamp}
+            for platform, texts in drafts.items() for text in texts]
+    predictions, error = predict_engagement_batch(rows)
+    if error:
+        return jsonify({"error": f"Prediction failed: {error}"}), 500
+
+    key = f"predicted_{rank_by}"
+    ranked = {platform: [] for platform in PLATFORMS}
+    for row, prediction in zip(rows, predictions):
+        score = (prediction['lightgbm_prediction'][key] + prediction['xgboost_prediction'][key]) / 2
+        ranked[row['platform']].append({"text": row['text'], "score": score, "predictions": prediction})
+    for platform_candidates in ranked.values():
+        platform_candidates.sort(key=lambda candidate: candidate['score'], reverse=True)
+
+    body = {field: ranked[platform][0]['text'] for platform, field in PLATFORMS.items()}
+    body.update({"ranked_by": rank_by, "timestamp": timestamp, "candidates": ranked})
+    return jsonify(body)
 
 
 # --- NEW Endpoint 3: Engagement Prediction ---
@@ -56,6 +125,7 @@ def refine_post_endpoint():
 def predict_engagement_endpoint():
     """
     API endpoint to predict engagement for a given social media post.
+    With "explain": true, the response also gives each feature's contribution.
     """
     data = request.get_json()
     if not data:
@@ -67,7 +137,7 @@ def predict_engagement_endpoint():
         return jsonify({"error": f"Missing required fields. Please provide {required_fields}"}), 400
 
     # Get predictions
-    predictions, error = predict_engagement(data)
+    predictions, error = predict_engagement(data, explain=bool(data.get('explain')))
 
     if error:
         return jsonify({"error": f"Prediction failed: {error}"}), 500
@@ -75,5 +145,48 @@ def predict_engagement_endpoint():
     return jsonify(predictions)
 
 
+@app.route('/prediction_table', methods=['GET'])
+def prediction_table_status():
+    """
+    Prediction mode, and the lookup table's readiness and error against the real models.
+    """
+    return jsonify({"mode": ENGAGEMENT_PREDICTION_MODE, **table_status()})
+
+
+@app.route('/observations', methods=['POST'])
+def add_observations():
+    """
+    Records real engagement of published posts: one observation, or
+    {"observations": [...]}, each with text, platform, timestamp, likes,
+    impressions and comments. The models are updated in the background once
+    enough observations are pending. Requires ENGAGEMENT_OBSERVATIONS_TOKEN in
+    the X-Admin-Token header.
+    """
+    if not OBSERVATIONS_TOKEN:
+        return jsonify({"error": "Observations are disabled; set ENGAGEMENT_OBSERVATIONS_TOKEN to enable them"}), 403
+    if not observations_authorized(request):
+        return jsonify({"error": "Unauthorized"}), 401
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid JSON payload"}), 400
+    observations = data.get('observations', [data]) if isinstance(data, dict) else data
+    if not isinstance(observations, list) or not observations:
+        return jsonify({"error": "Provide an observation or a non-empty 'observations' list"}), 400
+
+    try:
+        rows = [validate_observation(observation) for observation in observations]
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid observation: {e}"}), 400
+    return jsonify(append_observations(rows)), 202
+
+
+@app.route('/model_updates', methods=['GET'])
+def model_updates():
+    """
+    Pending observations and the outcome of recent model updates.
+    """
+    return jsonify(update_status())
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -1,12 +1,47 @@
-import joblib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 from textblob import TextBlob
 
+# Make the shared AI/common package importable when this service runs from its own directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import counter, stage
+from common.registry import get_engagement_models
+from prediction_table import get_table
+
+# --- Configuration ---
+# "model" evaluates both tree ensembles per request; "table" answers from the
+# precomputed prediction table (see prediction_table.py) once it is built
+ENGAGEMENT_PREDICTION_MODE = os.getenv("ENGAGEMENT_PREDICTION_MODE", "model")
+# Feature rows whose predictions (and explanations, once asked for) are kept in memory
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+# The models' output columns, in order; they were trained on [likes, impressions, comments]
+TARGETS = ['predicted_likes', 'predicted_impressions', 'predicted_comments']
+# The feature order required by the models
+FEATURE_ORDER = ['hour', 'day_of_week', 'text_length', 'sentiment', 'platform_LinkedIn', 'platform_Twitter']
+# Explained features -> model columns; the one-hot platform columns are reported together
+EXPLAINED_FEATURES = {
+    'hour': ['hour'],
+    'day_of_week': ['day_of_week'],
+    'text_length': ['text_length'],
+    'sentiment': ['sentiment'],
+    'platform': ['platform_LinkedIn', 'platform_Twitter'],
+}
+
+CACHE_LOOKUPS = counter('ai_engagement_cache_lookups_total', 'Engagement prediction cache lookups by result.',
+                        ['result'])
+
 # Load the pre-trained models
-# It's a good practice to load models once when the application starts
+# They are loaded once per process through the shared registry, so a gateway
+# hosting several services keeps a single copy in memory
 try:
-    lgbm_model = joblib.load('lightgbm_multi_engagement_model.pkl')
-    xgb_model = joblib.load('xgboost_multi_engagement_model.pkl')
+    lgbm_model, xgb_model = get_engagement_models()
     print("Engagement prediction models loaded successfully.")
 except FileNotFoundError:
     lgbm_model = None
@@ -17,14 +52,44 @@ except Exception as e:
     xgb_model = None
     print(f"An error occurred while loading models: {e}")
 
+# The models and their prediction cache, swapped as one reference by install_models()
+_current = (lgbm_model, xgb_model, OrderedDict())
+_cache = _current[2]
+_cache_lock = threading.Lock()
+
+if ENGAGEMENT_PREDICTION_MODE == 'table' and lgbm_model and xgb_model:
+    get_table({'lightgbm': lgbm_model, 'xgboost': xgb_model}, FEATURE_ORDER)  # Starts the build in the background
+
+
+def install_models(new_lgbm_model, new_xgb_model):
+    """
+    Hot-swaps the models. Requests that start afterwards use the new pair with
+    an empty prediction cache (and a rebuilt lookup table, in table mode);
+    requests already running finish on the old pair.
+    """
+    global lgbm_model, xgb_model, _cache, _current
+    with _cache_lock:
+        _current = (new_lgbm_model, new_xgb_model, OrderedDict())
+        lgbm_model, xgb_model, _cache = _current
+    if ENGAGEMENT_PREDICTION_MODE == 'table':
+        get_table({'lightgbm': new_lgbm_model, 'xgboost': new_xgb_model}, FEATURE_ORDER)
+
 
 def preprocess_input(data: dict):
     """
     Preprocesses the raw input from the API request into a format
     the model can understand.
     """
+    return preprocess_inputs([data])
+
+
+def preprocess_inputs(rows: list):
+    """
+    Builds the feature frame for several inputs at once. Timestamp parsing and
+    platform encoding are vectorised, and sentiment is computed once per distinct text.
+    """
     # Create a DataFrame from the input data
-    df = pd.DataFrame([data])
+    df = pd.DataFrame(rows)
 
     # 1. Feature Engineering for Timestamp
     df['timestamp'] = pd.to_datetime(df['timestamp'])
@@ -33,63 +98,182 @@ def preprocess_input(data: dict):
 
     # 2. Feature Engineering for Text
     df['text_length'] = df['text'].apply(len)
-    df['sentiment'] = df['text'].apply(lambda text: TextBlob(text).sentiment.polarity)
+    sentiments = {text: _sentiment(text) for text in df['text'].unique()}
+    df['sentiment'] = df['text'].map(sentiments)
 
     # 3. One-Hot Encode the Platform
-    df['platform_LinkedIn'] = df['platform'].apply(lambda x: 1 if x.lower() == 'linkedin' else 0)
-    df['platform_Twitter'] = df['platform'].apply(lambda x: 1 if x.lower() == 'twitter' else 0)
-
-    # Define the feature order required by the models
-    feature_order = [
-        'hour',
-        'day_of_week',
-        'text_length',
-        'sentiment',
-        'platform_LinkedIn',
-        'platform_Twitter'
-    ]
+    platforms = df['platform'].str.lower()
+    df['platform_LinkedIn'] = (platforms == 'linkedin').astype(int)
+    df['platform_Twitter'] = (platforms == 'twitter').astype(int)
 
     # Ensure the DataFrame has all the required columns in the correct order
-    df = df[feature_order]
+    df = df[FEATURE_ORDER]
 
     return df
 
 
-def predict_engagement(input_data: dict):
+def row_features(data: dict) -> tuple:
+    """
+    The FEATURE_ORDER values for one input, without building a DataFrame.
+    """
+    try:
+        timestamp = datetime.fromisoformat(str(data['timestamp']))
+    except ValueError:
+        timestamp = pd.to_datetime(data['timestamp'])
+    text = data['text']
+    platform = data['platform'].lower()
+    return (timestamp.hour, timestamp.weekday(), len(text), _sentiment(text),
+            int(platform == 'linkedin'), int(platform == 'twitter'))
+
+
+@lru_cache(maxsize=4096)
+def _sentiment(text: str) -> float:
+    return TextBlob(text).sentiment.polarity
+
+
+def predict_engagement(input_data: dict, explain: bool = False):
     """
     Predicts engagement metrics using both LightGBM and XGBoost models.
+    With `explain`, also returns each feature's contribution to every prediction.
+    """
+    predictions, error = predict_engagement_batch([input_data], explain=explain)
+    return (predictions[0] if predictions else None), error
+
+
+def predict_engagement_batch(inputs: list, explain: bool = False):
+    """
+    Predicts engagement for several posts in one pass per model, returning
+    (list of predictions in input order, error). Rows already predicted (and
+    explained, if asked) are answered from the cache.
     """
-    if not lgbm_model or not xgb_model:
+    # One snapshot for the whole request, so a concurrent model swap can't mix versions
+    lgbm, xgb, cache = _current
+    if not lgbm or not xgb:
         return None, "Models are not loaded. Cannot make predictions."
+    if not inputs:
+        return [], None
+
+    if ENGAGEMENT_PREDICTION_MODE == 'table' and not explain:
+        # None until the table for the loaded models is ready; the models answer meanwhile
+        table = get_table({'lightgbm': lgbm, 'xgboost': xgb}, FEATURE_ORDER)
+        if table is not None:
+            try:
+                with stage('engagement.table_lookup'):
+                    outputs = [table.lookup(*row_features(row)) for row in inputs]
+                return [_format_predictions(lgbm_preds, xgb_preds) for lgbm_preds, xgb_preds in outputs], None
+            except Exception as e:
+                print(f"Error during table prediction: {e}")
+                return None, str(e)
 
     try:
-        # Preprocess the input data
-        processed_df = preprocess_input(input_data)
-
-        # Make predictions with both models
-        lgbm_prediction = lgbm_model.predict(processed_df)
-        xgb_prediction = xgb_model.predict(processed_df)
-
-        # The models output an array of shape (1, 3) -> [[likes, comments, impressions]]
-        # We extract the first element.
-        lgbm_preds = lgbm_prediction[0]
-        xgb_preds = xgb_prediction[0]
-
-        # Structure the predictions into a dictionary
-        predictions = {
-            "lightgbm_prediction": {
-                "predicted_likes": round(max(0, lgbm_preds[0])),
-                "predicted_comments": round(max(0, lgbm_preds[1])),
-                "predicted_impressions": round(max(0, lgbm_preds[2]))
-            },
-            "xgboost_prediction": {
-                "predicted_likes": round(max(0, xgb_preds[0])),
-                "predicted_comments": round(max(0, xgb_preds[1])),
-                "predicted_impressions": round(max(0, xgb_preds[2]))
-            }
-        }
-        return predictions, None
+        with stage('engagement.preprocess'):
+            processed_df = preprocess_inputs(inputs)
+
+        # The models only see the features, so equal feature rows share a cache entry
+        keys = list(processed_df.itertuples(index=False, name=None))
+        with _cache_lock:
+            entries = [_cache_get(cache, key) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None or (explain and 'explanations' not in entry)]
+        CACHE_LOOKUPS.inc(len(keys) - len(missing), result='hit')
+        if missing:
+            CACHE_LOOKUPS.inc(len(missing), result='miss')
+            computed = _predict_rows(lgbm, xgb, processed_df.iloc[missing], explain)
+            with _cache_lock:
+                for i, entry in zip(missing, computed):
+                    entries[i] = entry
+                    _cache_put(cache, keys[i], entry)
+
+        results = []
+        for entry in entries:
+            result = dict(entry['predictions'])
+            if explain:
+                result['explanations'] = entry['explanations']
+            results.append(result)
+        return results, None
     except Exception as e:
         print(f"Error during prediction: {e}")
         return None, str(e)
 
+
+def _predict_rows(lgbm, xgb, processed_df, explain: bool) -> list:
+    """
+    Runs both models (and their TreeSHAP contributions, if asked) on the feature rows.
+    """
+    with stage('engagement.predict_lightgbm'):
+        lgbm_prediction = lgbm.predict(processed_df)
+    with stage('engagement.predict_xgboost'):
+        xgb_prediction = xgb.predict(processed_df)
+
+    # One [likes, impressions, comments] row per input
+    entries = [{'predictions': _format_predictions(lgbm_preds, xgb_preds)}
+               for lgbm_preds, xgb_preds in zip(lgbm_prediction, xgb_prediction)]
+    if explain:
+        with stage('engagement.explain_lightgbm'):
+            lgbm_contributions = tree_contributions(lgbm, processed_df)
+        with stage('engagement.explain_xgboost'):
+            xgb_contributions = tree_contributions(xgb, processed_df)
+        for row, entry in enumerate(entries):
+            entry['explanations'] = {
+                "lightgbm": _format_explanation(lgbm_contributions[:, row], processed_df.columns),
+                "xgboost": _format_explanation(xgb_contributions[:, row], processed_df.columns),
+            }
+    return entries
+
+
+def tree_contributions(model, processed_df) -> np.ndarray:
+    """
+    Exact TreeSHAP values from the boosting library's vectorised implementation,
+    shaped (targets, rows, features + 1); the last column is the expected value.
+    """
+    contributions = []
+    for estimator in model.estimators_:
+        if hasattr(estimator, 'booster_'):  # LightGBM
+            contributions.append(estimator.booster_.predict(processed_df, pred_contrib=True))
+        else:  # XGBoost
+            import xgboost
+            contributions.append(estimator.get_booster().predict(xgboost.DMatrix(processed_df), pred_contribs=True))
+    return np.stack(contributions)
+
+
+def _format_explanation(contributions: np.ndarray, columns) -> dict:
+    """
+    Per-target base value and feature contributions; they add up to the raw
+    model output (before the prediction is clipped at zero and rounded).
+    """
+    column_index = {column: i for i, column in enumerate(columns)}
+    explanation = {}
+    for target, values in zip(TARGETS, contributions):
+        explanation[target] = {
+            "base_value": round(float(values[-1]), 3),
+            "contributions": {feature: round(float(sum(values[column_index[c]] for c in feature_columns)), 3)
+                              for feature, feature_columns in EXPLAINED_FEATURES.items()},
+        }
+    return explanation
+
+
+def _format_predictions(lgbm_preds, xgb_preds) -> dict:
+    """
+    Structures one row of each model's output into the response dictionary,
+    labelling the columns by TARGETS.
+    """
+    return {
+        "lightgbm_prediction": {target: round(max(0, value)) for target, value in zip(TARGETS, lgbm_preds)},
+        "xgboost_prediction": {target: round(max(0, value)) for target, value in zip(TARGETS, xgb_preds)},
+    }
+
+
+# --- Prediction cache (LRU, per process and model version) ---
+def _cache_get(cache: OrderedDict, key):
+    entry = cache.get(key)
+    if entry is not None:
+        cache.move_to_end(key)
+    return entry
+
+
+def _cache_put(cache: OrderedDict, key, entry):
+    if PREDICTION_CACHE_SIZE <= 0:
+        return
+    cache[key] = entry
+    cache.move_to_end(key)
+    while len(cache) > PREDICTION_CACHE_SIZE:
+        cache.popitem(last=False)
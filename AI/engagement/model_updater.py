@@ -0,0 +1,343 @@
+import os
+import io
+import copy
+import json
+import time
+import fcntl
+import shutil
+import threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from common.metrics import counter
+from common.auth import token_authorized
+from common.registry import (ENGAGEMENT_DATA_DIR, UPDATED_LGBM_MODEL_PATH, UPDATED_XGB_MODEL_PATH,
+                             engagement_model_paths)
+import engagement_predictor
+from synthesize_dataset import add_features
+
+# --- Configuration ---
+ENGAGEMENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# The datasets shipped with the repo; copied into ENGAGEMENT_DATA_DIR before observations are appended
+SEED_DATASET_PATH = os.path.join(ENGAGEMENT_DIR, 'social_post_engagement_dataset.csv')
+SEED_PROCESSED_DATASET_PATH = os.path.join(ENGAGEMENT_DIR, 'social_post_engagement_dataset_processed.csv')
+DATASET_PATH = os.getenv("ENGAGEMENT_DATASET_PATH",
+                         os.path.join(ENGAGEMENT_DATA_DIR, os.path.basename(SEED_DATASET_PATH)))
+PROCESSED_DATASET_PATH = os.getenv("ENGAGEMENT_PROCESSED_DATASET_PATH",
+                                   os.path.join(ENGAGEMENT_DATA_DIR, os.path.basename(SEED_PROCESSED_DATASET_PATH)))
+# Rows the models were trained on, and the outcome of recent updates, shared by every worker process
+UPDATE_STATE_PATH = os.getenv("ENGAGEMENT_UPDATE_STATE_PATH",
+                              os.path.join(ENGAGEMENT_DATA_DIR, 'model_update_state.json'))
+# Required in the X-Admin-Token header to submit observations, since they change the served
+# models; /observations is disabled while it is unset
+OBSERVATIONS_TOKEN = os.getenv("ENGAGEMENT_OBSERVATIONS_TOKEN")
+UPDATES_ENABLED = os.getenv("ENGAGEMENT_UPDATES_ENABLED", "1") == "1"
+# New observations needed before an update is attempted
+UPDATE_MIN_OBSERVATIONS = int(os.getenv("ENGAGEMENT_UPDATE_MIN_OBSERVATIONS", "50"))
+# Boosting rounds added per update, fitted on the new observations only
+UPDATE_ROUNDS = int(os.getenv("ENGAGEMENT_UPDATE_ROUNDS", "20"))
+# Share of the new observations held out, plus this many earlier rows, to validate an update on
+UPDATE_HOLDOUT_FRACTION = float(os.getenv("ENGAGEMENT_UPDATE_HOLDOUT_FRACTION", "0.2"))
+UPDATE_HOLDOUT_EARLIER_ROWS = int(os.getenv("ENGAGEMENT_UPDATE_HOLDOUT_EARLIER_ROWS", "200"))
+# An updated model is kept if its holdout error is at most (1 + tolerance) x the current model's
+UPDATE_TOLERANCE = float(os.getenv("ENGAGEMENT_UPDATE_TOLERANCE", "0"))
+# How often each worker checks for new observations and for models updated by another worker
+UPDATE_CHECK_SECONDS = float(os.getenv("ENGAGEMENT_UPDATE_CHECK_SECONDS", "30"))
+UPDATE_HISTORY = 10
+
+# The column order the pickled models were fitted on
+TRAINING_TARGETS = ['likes', 'impressions', 'comments']
+OBSERVATION_FIELDS = ['text', 'platform', 'timestamp', 'likes', 'impressions', 'comments']
+LOCK_PATH = f"{UPDATE_STATE_PATH}.lock"
+UPDATE_LOCK_PATH = f"{UPDATE_STATE_PATH}.update.lock"
+
+OBSERVATIONS = counter('ai_engagement_observations_total', 'Observed engagement outcomes ingested.')
+MODEL_UPDATES = counter('ai_engagement_model_updates_total', 'Warm-start model updates by model and result.',
+                        ['model', 'result'])
+
+_updater_thread = None
+_updater_lock = threading.Lock()
+_updater_wakeup = threading.Event()
+
+
+def validate_observation(observation: dict) -> dict:
+    """
+    Returns the observation as a dataset row, or raises ValueError naming the problem.
+    """
+    if not isinstance(observation, dict):
+        raise ValueError("Each observation must be an object")
+    missing = [field for field in OBSERVATION_FIELDS if field not in observation]
+    if missing:
+        raise ValueError(f"Missing required fields {missing}")
+    row = {'text': str(observation['text']), 'platform': str(observation['platform'])}
+    try:
+        row['timestamp'] = pd.to_datetime(observation['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError):
+        raise ValueError(f"Unparseable timestamp {observation['timestamp']!r}")
+    for metric in TRAINING_TARGETS:
+        value = observation[metric]
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"'{metric}' must be a non-negative integer")
+        row[metric] = value
+    return row
+
+
+def append_observations(rows: list) -> dict:
+    """
+    Appends validated rows to the raw and processed datasets, and wakes the
+    updater if enough new observations are pending.
+    """
+    raw = pd.DataFrame(rows)[pd.read_csv(SEED_DATASET_PATH, nrows=0).columns]
+    processed = add_features(raw.copy(), {})[pd.read_csv(SEED_PROCESSED_DATASET_PATH, nrows=0).columns]
+    with _file_lock(fcntl.LOCK_EX):
+        state = _read_state()
+        for path, frame in ((DATASET_PATH, raw), (PROCESSED_DATASET_PATH, processed)):
+            with open(path, 'a+', encoding='utf-8', newline='') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(f.tell() - 1)
+                    if f.read(1) != '\n':
+                        f.write('\n')
+                frame.to_csv(f, header=False, index=False)
+        state['observed_rows'] += len(rows)
+        _write_state(state)
+    OBSERVATIONS.inc(len(rows))
+    pending = state['observed_rows'] - state['trained_rows']
+    if pending >= UPDATE_MIN_OBSERVATIONS:
+        _updater_wakeup.set()
+    return {'accepted': len(rows), 'pending': pending}
+
+
+def observations_authorized(request) -> bool:
+    return token_authorized(request, OBSERVATIONS_TOKEN)
+
+
+def update_status() -> dict:
+    with _file_lock(fcntl.LOCK_SH):
+        state = _read_state()
+    return {
+        'enabled': UPDATES_ENABLED,
+        'pending_observations': state['observed_rows'] - state['trained_rows'],
+        'min_observations': UPDATE_MIN_OBSERVATIONS,
+        'updates': state['updates'],
+    }
+
+
+def ensure_updater_started():
+    """
+    Starts this process's updater thread on first use (after any fork).
+    """
+    global _updater_thread
+    if _updater_thread is not None or not UPDATES_ENABLED:
+        return
+    with _updater_lock:
+        if _updater_thread is None:
+            _updater_thread = threading.Thread(target=updater_loop, daemon=True, name='engagement-updater')
+            _updater_thread.start()
+
+
+def updater_loop():
+    """
+    Picks up models updated by another worker, and updates them itself when
+    enough observations are pending and no other worker is already doing so.
+    """
+    while True:
+        try:
+            reload_if_changed()
+            with _file_lock(fcntl.LOCK_SH):
+                state = _read_state()
+            if state['observed_rows'] - state['attempted_rows'] >= UPDATE_MIN_OBSERVATIONS:
+                run_update()
+        except Exception as e:
+            print(f"❌ Engagement model update check failed: {e}")
+        _updater_wakeup.wait(UPDATE_CHECK_SECONDS)
+        _updater_wakeup.clear()
+
+
+def reload_if_changed():
+    """
+    Loads the pickles if another process has replaced them since this one loaded its models.
+    """
+    global _loaded_signature
+    with _file_lock(fcntl.LOCK_SH):
+        signature = _model_signature()
+        if signature == _loaded_signature:
+            return
+        lgbm_path, xgb_path = engagement_model_paths()
+        new_lgbm_model, new_xgb_model = joblib.load(lgbm_path), joblib.load(xgb_path)
+    engagement_predictor.install_models(new_lgbm_model, new_xgb_model)
+    _loaded_signature = signature
+    print("✅ Loaded engagement models updated by another worker.")
+
+
+def run_update() -> dict:
+    """
+    Warm-starts UPDATE_ROUNDS extra boosting rounds on the observations the
+    models haven't seen, keeps each model only if it does no worse on the
+    holdout, then saves and hot-swaps the kept models. Returns the update
+    report, or None if there was nothing to do or another worker is on it.
+    """
+    global _loaded_signature
+    # Held for the whole update; observations can still be appended meanwhile
+    with open(UPDATE_LOCK_PATH, 'a') as update_lock:
+        try:
+            fcntl.flock(update_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        # Build on the latest models, whichever worker produced them
+        reload_if_changed()
+        current = {'lightgbm': engagement_predictor.lgbm_model, 'xgboost': engagement_predictor.xgb_model}
+        if not all(current.values()):
+            return None
+        with _file_lock(fcntl.LOCK_EX):
+            state = _read_state()
+            dataset = pd.read_csv(DATASET_PATH)
+        observed = state['observed_rows']
+        if observed - state['attempted_rows'] < UPDATE_MIN_OBSERVATIONS:
+            return None
+
+        started = time.perf_counter()
+        earlier, new = dataset.iloc[:state['trained_rows']], dataset.iloc[state['trained_rows']:observed]
+        order = np.random.default_rng(observed).permutation(len(new))
+        holdout_size = max(1, int(len(new) * UPDATE_HOLDOUT_FRACTION))
+        train = new.iloc[order[holdout_size:]]
+        holdout = pd.concat([new.iloc[order[:holdout_size]],
+                             earlier.sample(min(len(earlier), UPDATE_HOLDOUT_EARLIER_ROWS), random_state=0)])
+
+        train_features, train_targets = _training_data(train)
+        holdout_features, holdout_targets = _training_data(holdout)
+        report = {'time': datetime.now().isoformat(timespec='seconds'), 'train_rows': len(train),
+                  'holdout_rows': len(holdout), 'rounds': UPDATE_ROUNDS, 'models': {}}
+        kept = dict(current)
+        for name, model in current.items():
+            try:
+                updated = warm_start(model, train_features, train_targets)
+            except Exception as e:
+                print(f"❌ Could not update the {name} model: {e}")
+                MODEL_UPDATES.inc(model=name, result='failed')
+                report['models'][name] = {'result': 'failed', 'error': str(e)}
+                continue
+            before = holdout_error(model, holdout_features, holdout_targets)
+            after = holdout_error(updated, holdout_features, holdout_targets)
+            accepted = after <= before * (1 + UPDATE_TOLERANCE)
+            if accepted:
+                kept[name] = updated
+            result = 'accepted' if accepted else 'rejected'
+            MODEL_UPDATES.inc(model=name, result=result)
+            report['models'][name] = {'result': result, 'holdout_error_before': round(before, 5),
+                                      'holdout_error_after': round(after, 5)}
+        report['seconds'] = round(time.perf_counter() - started, 2)
+
+        changed = any(kept[name] is not current[name] for name in kept)
+        with _file_lock(fcntl.LOCK_EX):
+            state = _read_state()
+            if changed:
+                _save_model(kept['lightgbm'], UPDATED_LGBM_MODEL_PATH)
+                _save_model(kept['xgboost'], UPDATED_XGB_MODEL_PATH)
+                _loaded_signature = _model_signature()
+                # Observations are consumed once they are in a kept model
+                state['trained_rows'] = observed
+            state['attempted_rows'] = observed
+            state['updates'] = (state['updates'] + [report])[-UPDATE_HISTORY:]
+            _write_state(state)
+        if changed:
+            engagement_predictor.install_models(kept['lightgbm'], kept['xgboost'])
+        print(f"✅ Engagement model update finished: {json.dumps(report['models'])}")
+        return report
+
+
+def warm_start(model, features: pd.DataFrame, targets: np.ndarray):
+    """
+    A copy of the MultiOutputRegressor with UPDATE_ROUNDS more trees per target,
+    fitted on the residuals of the existing trees.
+    """
+    updated = copy.deepcopy(model)
+    for target, estimator in enumerate(updated.estimators_):
+        if hasattr(estimator, 'booster_'):  # LightGBM
+            booster = estimator.booster_
+            estimator.set_params(n_estimators=UPDATE_ROUNDS, verbosity=-1)
+            estimator.fit(features, targets[:, target], init_model=booster)
+        else:  # XGBoost
+            booster = estimator.get_booster()
+            estimator.set_params(n_estimators=UPDATE_ROUNDS)
+            estimator.fit(features, targets[:, target], xgb_model=booster)
+    return updated
+
+
+def holdout_error(model, features: pd.DataFrame, targets: np.ndarray) -> float:
+    """
+    Mean absolute error in log1p space, averaged over the targets, so impressions
+    don't drown out likes and comments.
+    """
+    predictions = np.clip(model.predict(features), 0, None)
+    return float(np.mean(np.abs(np.log1p(predictions) - np.log1p(targets))))
+
+
+def _training_data(rows: pd.DataFrame) -> tuple:
+    features = engagement_predictor.preprocess_inputs(rows[['text', 'platform', 'timestamp']].to_dict('records'))
+    return features, rows[TRAINING_TARGETS].to_numpy(dtype=np.float64)
+
+
+def _save_model(model, path: str):
+    """
+    Writes the pickle next to its target and renames it into place, so readers never see a partial file.
+    """
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(temp_path, path)
+
+
+def _model_signature() -> tuple:
+    return tuple((path, os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else None
+                 for path in engagement_model_paths())
+
+
+class _file_lock:
+    """
+    Cross-process lock guarding the datasets, the state file and the model pickles.
+    Seeds the data directory with the shipped datasets on first use.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+        self.file = open(LOCK_PATH, 'a')
+        fcntl.flock(self.file, self.mode)
+        seeds = ((SEED_DATASET_PATH, DATASET_PATH), (SEED_PROCESSED_DATASET_PATH, PROCESSED_DATASET_PATH))
+        for seed_path, path in seeds:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                shutil.copyfile(seed_path, temp_path)
+                os.replace(temp_path, path)
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+def _read_state() -> dict:
+    if os.path.exists(UPDATE_STATE_PATH):
+        with open(UPDATE_STATE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    # First use: the models were trained on everything already in the dataset
+    rows = len(pd.read_csv(DATASET_PATH, usecols=[0]))
+    return {'observed_rows': rows, 'trained_rows': rows, 'attempted_rows': rows, 'updates': []}
+
+
+def _write_state(state: dict):
+    temp_path = f"{UPDATE_STATE_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, UPDATE_STATE_PATH)
+
+
+# Modification signature of the model files this process has loaded (at import, with engagement_predictor)
+_loaded_signature = _model_signature()
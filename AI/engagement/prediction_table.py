@@ -0,0 +1,313 @@
+import os
+import io
+import json
+import time
+import fcntl
+import pickle
+import hashlib
+import tempfile
+import threading
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+# Where the table is cached between restarts, shared by every worker process on the machine
+PREDICTION_TABLE_PATH = os.getenv("PREDICTION_TABLE_PATH",
+                                  os.path.join(tempfile.gettempdir(), "ai-engagement-table.npz"))
+# Regular cell edges, added to the models' own split thresholds
+TABLE_LENGTH_BUCKETS = int(os.getenv("TABLE_LENGTH_BUCKETS", "16"))
+TABLE_SENTIMENT_BUCKETS = int(os.getenv("TABLE_SENTIMENT_BUCKETS", "16"))
+TABLE_MAX_TEXT_LENGTH = int(os.getenv("TABLE_MAX_TEXT_LENGTH", "5000"))
+# Cap on cells per continuous feature; beyond it, thresholds are thinned to quantiles
+TABLE_MAX_CELLS = int(os.getenv("TABLE_MAX_CELLS", "96"))
+# Random feature rows compared against the real models after every build
+TABLE_VALIDATION_SAMPLES = int(os.getenv("TABLE_VALIDATION_SAMPLES", "5000"))
+BUILD_CHUNK_ROWS = 100000
+
+HOURS = 24
+DAYS = 7
+# Platform index: neither one-hot column set, LinkedIn, Twitter
+PLATFORM_COLUMNS = [(0, 0), (1, 0), (0, 1)]
+
+
+def model_fingerprint(models: dict) -> str:
+    """
+    Content hash of the fitted models, so a table is never used with models it wasn't built from.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(models):
+        digest.update(name.encode('utf-8'))
+        digest.update(pickle.dumps(models[name]))
+    return digest.hexdigest()
+
+
+def split_thresholds(model, feature: str) -> list:
+    """
+    Every split on `feature` in a MultiOutputRegressor of LightGBM or XGBoost
+    trees, as the largest value that still goes left. Tree outputs only change
+    at these values.
+    """
+    thresholds = set()
+
+    def walk(node, feature_key, threshold_key, children_key, strict=False):
+        if node.get(feature_key) == feature:
+            thresholds.add(_xgboost_boundary(node[threshold_key]) if strict else float(node[threshold_key]))
+        for key in children_key:
+            if key in node:
+                children = node[key] if isinstance(node[key], list) else [node[key]]
+                for child in children:
+                    walk(child, feature_key, threshold_key, children_key, strict)
+
+    for estimator in model.estimators_:
+        if hasattr(estimator, 'booster_'):  # LightGBM
+            dump = estimator.booster_.dump_model()
+            feature_names = dump['feature_names']
+            for tree in dump['tree_info']:
+                walk(_named(tree['tree_structure'], feature_names), 'split_feature', 'threshold',
+                     ('left_child', 'right_child'))
+        else:  # XGBoost
+            for tree in estimator.get_booster().get_dump(dump_format='json'):
+                walk(json.loads(tree), 'split', 'split_condition', ('children',), strict=True)
+    return sorted(thresholds)
+
+
+def _xgboost_boundary(threshold: float) -> float:
+    """
+    XGBoost goes left when float32(x) < threshold (a float32), i.e. for every x
+    below the midpoint between the threshold and the float32 just under it.
+    """
+    upper = np.float32(threshold)
+    lower = np.nextafter(upper, np.float32(-np.inf))
+    return float(np.nextafter((float(lower) + float(upper)) / 2, -np.inf))
+
+
+def _named(node: dict, feature_names: list) -> dict:
+    if 'split_feature' in node:
+        node = dict(node, split_feature=feature_names[node['split_feature']])
+        node['left_child'] = _named(node['left_child'], feature_names)
+        node['right_child'] = _named(node['right_child'], feature_names)
+    return node
+
+
+def _cell_edges(regular: np.ndarray, thresholds: list) -> np.ndarray:
+    """
+    Regular edges plus the models' thresholds, thinned to TABLE_MAX_CELLS.
+    """
+    edges = np.unique(np.concatenate([regular, thresholds]))
+    if len(edges) > TABLE_MAX_CELLS:
+        edges = np.unique(np.quantile(edges, np.linspace(0, 1, TABLE_MAX_CELLS)))
+    return edges
+
+
+def _cell_points(edges: np.ndarray) -> np.ndarray:
+    """
+    One sample point inside each cell (edges[i], edges[i + 1]]; the last cell,
+    above every edge, is sampled half a cell past it.
+    """
+    return np.append((edges[:-1] + edges[1:]) / 2, edges[-1] + (edges[-1] - edges[-2]) / 2)
+
+
+class PredictionTable:
+    """
+    Model outputs precomputed over hour x day x platform x text length cell x
+    sentiment cell. Cell edges include the trees' split thresholds, so a
+    lookup returns the value of the cell the features fall in (the trees are
+    constant between thresholds) and no model is evaluated.
+    """
+
+    def __init__(self, table: np.ndarray, length_edges: np.ndarray, sentiment_edges: np.ndarray,
+                 model_names: list, fingerprint: str, report: dict = None):
+        self.table = table  # (hours, days, platforms, lengths, sentiments, models, targets)
+        self.length_edges = length_edges
+        self.sentiment_edges = sentiment_edges
+        self.model_names = model_names
+        self.fingerprint = fingerprint
+        self.report = report or {}
+        self._length_edges = length_edges.tolist()
+        self._sentiment_edges = sentiment_edges.tolist()
+
+    @classmethod
+    def build(cls, models: dict, feature_columns: list, fingerprint: str = None):
+        started = time.perf_counter()
+        model_names = sorted(models)
+        length_edges = _cell_edges(
+            np.concatenate([[0], np.geomspace(1, TABLE_MAX_TEXT_LENGTH, TABLE_LENGTH_BUCKETS)]),
+            [t for name in model_names for t in split_thresholds(models[name], 'text_length')])
+        sentiment_edges = _cell_edges(np.linspace(-1, 1, TABLE_SENTIMENT_BUCKETS + 1),
+                                      [t for name in model_names for t in split_thresholds(models[name], 'sentiment')])
+
+        grid = np.stack(np.meshgrid(np.arange(HOURS), np.arange(DAYS), np.arange(len(PLATFORM_COLUMNS)),
+                                    _cell_points(length_edges), _cell_points(sentiment_edges),
+                                    indexing='ij'), axis=-1).reshape(-1, 5)
+        shape = (HOURS, DAYS, len(PLATFORM_COLUMNS), len(length_edges), len(sentiment_edges))
+        chunks = []
+        for start in range(0, len(grid), BUILD_CHUNK_ROWS):
+            frame = _feature_frame(grid[start:start + BUILD_CHUNK_ROWS], feature_columns)
+            chunks.append(np.stack([models[name].predict(frame) for name in model_names], axis=1).astype(np.float32))
+        outputs = np.concatenate(chunks)
+        table = cls(outputs.reshape(shape + outputs.shape[1:]), length_edges, sentiment_edges, model_names,
+                    fingerprint or model_fingerprint(models))
+        table.report = table.validate(models, feature_columns)
+        table.report['build_seconds'] = round(time.perf_counter() - started, 2)
+        return table
+
+    def validate(self, models: dict, feature_columns: list, samples: int = TABLE_VALIDATION_SAMPLES) -> dict:
+        """
+        Error of the table against the real models on random feature rows, per
+        model and target: the bound a caller gets from table mode. Half the
+        sentiments are neutral or small fractions, the values TextBlob averages
+        produce and the models' thresholds sit between.
+        """
+        rng = np.random.default_rng(0)
+        sentiments = rng.uniform(-1, 1, samples)
+        fractions = rng.random(samples) < 0.5
+        denominators = rng.integers(1, 49, fractions.sum())
+        sentiments[fractions] = rng.integers(-denominators, denominators + 1) / denominators
+        features = np.column_stack([
+            rng.integers(0, HOURS, samples), rng.integers(0, DAYS, samples),
+            rng.integers(0, len(PLATFORM_COLUMNS), samples),
+            np.round(np.exp(rng.uniform(0, np.log(TABLE_MAX_TEXT_LENGTH), samples))),
+            sentiments,
+        ])
+        expected = np.stack([models[name].predict(_feature_frame(features, feature_columns))
+                             for name in self.model_names], axis=1)
+        errors = np.abs(self.lookup_many(features) - expected)
+        report = {'samples': samples, 'cells': int(np.prod(self.table.shape[:5])),
+                  'memory_mb': round(self.table.nbytes / 2 ** 20, 2), 'errors': {}}
+        for m, name in enumerate(self.model_names):
+            report['errors'][name] = [{'max_abs': round(float(errors[:, m, t].max()), 4),
+                                       'p99_abs': round(float(np.quantile(errors[:, m, t], 0.99)), 4),
+                                       'mean_abs': round(float(errors[:, m, t].mean()), 4)}
+                                      for t in range(errors.shape[2])]
+        return report
+
+    def _cell(self, edges: list, value: float) -> int:
+        return min(max(bisect_left(edges, value) - 1, 0), len(edges) - 1)
+
+    def lookup(self, hour: int, day_of_week: int, text_length: float, sentiment: float,
+               platform_linkedin: int, platform_twitter: int) -> np.ndarray:
+        """
+        (models, targets) outputs for one feature row.
+        """
+        platform = 1 if platform_linkedin else 2 if platform_twitter else 0
+        return self.table[hour, day_of_week, platform, self._cell(self._length_edges, text_length),
+                          self._cell(self._sentiment_edges, sentiment)]
+
+    def lookup_many(self, features: np.ndarray) -> np.ndarray:
+        """
+        (rows, models, targets) outputs for rows of (hour, day, platform index, length, sentiment).
+        """
+        lengths = np.clip(np.searchsorted(self.length_edges, features[:, 3], side='left') - 1,
+                          0, len(self.length_edges) - 1)
+        sentiments = np.clip(np.searchsorted(self.sentiment_edges, features[:, 4], side='left') - 1,
+                             0, len(self.sentiment_edges) - 1)
+        index = features[:, :3].astype(np.int64)
+        return self.table[index[:, 0], index[:, 1], index[:, 2], lengths, sentiments]
+
+    def save(self, path: str):
+        """
+        Writes the table atomically, so readers in other processes never see a partial file.
+        """
+        buffer = io.BytesIO()
+        np.savez(buffer, table=self.table, length_edges=self.length_edges, sentiment_edges=self.sentiment_edges,
+                 meta=np.array(json.dumps({'model_names': self.model_names, 'fingerprint': self.fingerprint,
+                                           'report': self.report})))
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(data['table'], data['length_edges'], data['sentiment_edges'], meta['model_names'],
+                       meta['fingerprint'], meta['report'])
+
+
+def _feature_frame(features: np.ndarray, feature_columns: list) -> pd.DataFrame:
+    """
+    Model input frame for rows of (hour, day, platform index, length, sentiment).
+    """
+    platforms = np.array(PLATFORM_COLUMNS)[features[:, 2].astype(np.int64)]
+    values = {'hour': features[:, 0].astype(np.int64), 'day_of_week': features[:, 1].astype(np.int64),
+              'text_length': features[:, 3], 'sentiment': features[:, 4],
+              'platform_LinkedIn': platforms[:, 0], 'platform_Twitter': platforms[:, 1]}
+    return pd.DataFrame({column: values[column] for column in feature_columns})
+
+
+# --- Process-wide table for the currently loaded models ---
+_state = {'models': None, 'table': None, 'building': False}
+_state_lock = threading.Lock()
+
+
+def get_table(models: dict, feature_columns: list):
+    """
+    The table for exactly these model objects, or None while it is loaded or
+    (re)built in the background. New model objects trigger a rebuild.
+    """
+    current = _state['models']
+    if current is not None and current.keys() == models.keys() and all(
+            current[name] is models[name] for name in models):
+        return _state['table']
+    with _state_lock:
+        if _state['building']:
+            return None
+        _state['building'] = True
+    threading.Thread(target=_load_or_build, args=(dict(models), feature_columns), daemon=True,
+                     name='prediction-table').start()
+    return None
+
+
+def _load_or_build(models: dict, feature_columns: list):
+    try:
+        fingerprint = model_fingerprint(models)
+        # One process builds; the others wait for it and load the result
+        with open(f"{PREDICTION_TABLE_PATH}.lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                table = _load_matching(fingerprint)
+                if table is None:
+                    print("🧠 Building the engagement prediction table...")
+                    table = PredictionTable.build(models, feature_columns, fingerprint)
+                    table.save(PREDICTION_TABLE_PATH)
+                    print(f"✅ Prediction table built in {table.report['build_seconds']}s "
+                          f"({table.report['memory_mb']} MB): {json.dumps(table.report['errors'])}")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        with _state_lock:
+            _state.update(models=models, table=table)
+    except Exception as e:
+        # Not retried for these models; a model change tries again
+        print(f"❌ Could not build the prediction table, predicting with the models: {e}")
+        with _state_lock:
+            _state.update(models=models, table=None)
+    finally:
+        with _state_lock:
+            _state['building'] = False
+
+
+def _load_matching(fingerprint: str):
+    if not os.path.exists(PREDICTION_TABLE_PATH):
+        return None
+    try:
+        table = PredictionTable.load(PREDICTION_TABLE_PATH)
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable prediction table: {e}")
+        return None
+    return table if table.fingerprint == fingerprint else None
+
+
+def table_status() -> dict:
+    """
+    Readiness and the error report of the table in use.
+    """
+    table = _state['table']
+    return {
+        'ready': table is not None,
+        'building': _state['building'],
+        'fingerprint': table.fingerprint if table else None,
+        'report': table.report if table else None,
+    }
@@ -211,10 +211,21 @@
 
 
 import os
-from langchain_groq import ChatGroq
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel, Field
 from typing import List, Dict
 
+# Make the shared AI/common package importable when this service runs from its own directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm_cache import cached_llm_call
+from common.metrics import stage
+from common.post_sampler import select_representative_posts
+from common.resilience import LLMUnavailableError, call_with_resilience
+from common.registry import get_chat_llm
+
+CHAT_MODEL_NAME = "llama3-70b-8192"
+
 
 # --- Pydantic Model for Style Analysis ---
 class StyleAnalysis(BaseModel):
@@ -242,13 +253,16 @@ def analyze_posts(posts: List[str]) -> StyleAnalysis | None:
     """
     print("\nAnalyzing posts to find style...")
     try:
-        llm = ChatGroq(model="llama3-70b-8192",
-                       temperature=0,
-                       groq_api_key=os.getenv("GROQ_API_KEY"))
+        llm = get_chat_llm(CHAT_MODEL_NAME, temperature=0)
         structured_llm = llm.with_structured_output(StyleAnalysis)
 
+        # Dedup and keep a diverse subset within the token budget, however many posts were uploaded
+        with stage('style.sample_posts'):
+            sampled_posts = select_representative_posts(posts)
+        print(f"Using {len(sampled_posts)} of {len(posts)} posts for analysis.")
+
         # Ensure posts are joined correctly
-        posts_text = "\n\n---\n\n".join(posts)
+        posts_text = "\n\n---\n\n".join(sampled_posts)
 
         analysis_prompt = f"""
         You are an expert social media analyst. Based on the following three posts, please identify the following attributes in one word each: tone, niche, and writing style.
@@ -258,9 +272,17 @@ def analyze_posts(posts: List[str]) -> StyleAnalysis | None:
 
         Provide the response as a JSON object with the keys "tone", "niche", and "writing_style".
         """
-        analysis_data = structured_llm.invoke(analysis_prompt)
+        # Deterministic (temperature 0), so identical post sets are answered from the shared cache
+        with stage('style.analyze'):
+            analysis_data = cached_llm_call('style.analyze', CHAT_MODEL_NAME, 0, analysis_prompt,
+                                            lambda: call_with_resilience(
+                                                'style.analyze', lambda: structured_llm.invoke(analysis_prompt)),
+                                            schema=StyleAnalysis)
         print("\nAnalysis complete!")
         return analysis_data
+    except LLMUnavailableError:
+        # Deadline or open circuit: let the endpoint answer 503/504 instead of a generic failure
+        raise
     except Exception as e:
         print(f"Error during post analysis: {e}")
         return None
@@ -278,12 +300,32 @@ def refine_post_for_platforms(topic: str, style_info: Dict) -> RefinedPosts | No
     print(f"\nGenerating refined posts on the topic '{topic}'...")
 
     try:
-        llm = ChatGroq(model="llama3-70b-8192",
-                       temperature=0.7,
-                       groq_api_key=os.getenv("GROQ_API_KEY"))
+        llm = get_chat_llm(CHAT_MODEL_NAME, temperature=0.7)
         structured_llm = llm.with_structured_output(RefinedPosts)
 
-        meta_prompt = f"""
+        meta_prompt = _refine_prompt(topic, style_info)
+
+        # Creative call: only cached when LLM_CACHE_CREATIVE is enabled
+        with stage('style.refine'):
+            refined_posts_data = cached_llm_call('style.refine', CHAT_MODEL_NAME, 0.7, meta_prompt,
+                                                 lambda: call_with_resilience(
+                                                     'style.refine', lambda: structured_llm.invoke(meta_prompt)),
+                                                 schema=RefinedPosts)
+        print("\nRefined posts generation complete!")
+        return refined_posts_data
+
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error during refined post generation: {e}")
+        return None
+
+
+def _refine_prompt(topic: str, style_info: Dict) -> str:
+    """
+    The meta prompt asking for one LinkedIn and one Twitter post in the user's style.
+    """
+    return f"""
         You are an expert social media manager. Your task is to generate two distinct social media posts based on a user's writing style profile and a given topic.
 
         **User's Writing Style Profile:**
@@ -303,10 +345,38 @@ def refine_post_for_platforms(topic: str, style_info: Dict) -> RefinedPosts | No
         Provide the output as a single JSON object with two keys: "linkedin_post" and "twitter_post".
         """
 
-        refined_posts_data = structured_llm.invoke(meta_prompt)
-        print("\nRefined posts generation complete!")
-        return refined_posts_data
 
-    except Exception as e:
-        print(f"Error during refined post generation: {e}")
-        return None
+def refine_post_candidates(topic: str, style_info: Dict, n: int) -> List[RefinedPosts]:
+    """
+    Generates `n` independent RefinedPosts concurrently, giving `n` candidate
+    drafts per platform. Failed candidates are dropped; the call only fails
+    (with LLMUnavailableError) if every candidate hit a deadline or open circuit.
+    """
+    if not style_info:
+        print("Cannot generate posts without style information.")
+        return []
+
+    print(f"\nGenerating {n} candidate post sets on the topic '{topic}'...")
+    structured_llm = get_chat_llm(CHAT_MODEL_NAME, temperature=0.7).with_structured_output(RefinedPosts)
+    meta_prompt = _refine_prompt(topic, style_info)
+
+    def generate(_):
+        # Not cached: identical prompts are expected to give different candidates
+        try:
+            return call_with_resilience('style.refine', lambda: structured_llm.invoke(meta_prompt))
+        except LLMUnavailableError as e:
+            return e
+        except Exception as e:
+            print(f"Error during candidate generation: {e}")
+            return None
+
+    with stage('style.refine_candidates'):
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            results = list(pool.map(generate, range(n)))
+
+    unavailable = [result for result in results if isinstance(result, LLMUnavailableError)]
+    candidates = [result for result in results if result is not None and not isinstance(result, LLMUnavailableError)]
+    if not candidates and unavailable:
+        raise unavailable[0]
+    print(f"\nGenerated {len(candidates)} of {n} candidate post sets.")
+    return candidates
@@ -0,0 +1,190 @@
+"""
+Streams large synthetic engagement datasets shaped like social_post_engagement_dataset.csv:
+    python synthesize_dataset.py --rows 10000000 [--processed] --output engagement_10m.csv
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+SOURCE_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'social_post_engagement_dataset.csv')
+METRICS = ['likes', 'impressions', 'comments']
+WEEK = np.timedelta64(7, 'D')
+
+# Slots recombined around each source text, so the distinct texts grow with the row count
+TONES = ['positive', 'neutral', 'negative']
+TONE_WEIGHTS = [0.45, 0.4, 0.15]
+OPENERS = {
+    'positive': ["Thrilled to share this!", "Big news!", "So proud of this team.", "Loving this one.",
+                 "What a great week."],
+    'neutral': ["Quick update:", "A thought for today:", "Worth a read:", "From the team:", "In case you missed it:"],
+    'negative': ["Honestly, this was a tough one.", "Not everything went to plan.", "Hard lesson learned:",
+                 "We got this wrong at first.", "A frustrating week, but still:"],
+}
+DETAILS = ["It took us {n} days to get here.", "{n} people have already signed up.",
+           "We tested it with {n} customers.", "Thanks to all {n} of you who helped.",
+           "Here are {n} things we learned along the way.", "Step {n} is the one most people skip.",
+           "Day {n} of building in public.", "We went through {n} drafts before this one."]
+CLOSERS = {
+    'positive': ["Can't wait to hear what you think!", "Thank you all for the amazing support!",
+                 "Excited for what's next."],
+    'neutral': ["Link in the comments.", "What do you think?", "More details below."],
+    'negative': ["We'll do better next time.", "It was harder than it should have been.",
+                 "Still annoyed we missed it."],
+}
+HASHTAGS = ['#startup', '#product', '#AI', '#remotework', '#growth', '#design', '#leadership', '#teamwork',
+            '#marketing', '#tech']
+
+
+class EngagementSynthesizer:
+    """
+    Smoothed bootstrap over the source dataset. Each row starts from a random source
+    row, moved by whole weeks within the source date range (hour and weekday stay with
+    the engagement they produced), with its metrics jittered in log1p space by a
+    shared plus a per-metric factor, and its text rewritten around the source text by
+    recombining tone-matched opener, detail, closer and hashtag slots.
+    """
+
+    def __init__(self, source: pd.DataFrame, shared_jitter: float = 0.25, metric_jitter: float = 0.1, seed: int = 0):
+        self.texts = source['text'].to_numpy()
+        self.platforms = source['platform'].to_numpy()
+        self.timestamps = pd.to_datetime(source['timestamp']).to_numpy().astype('datetime64[s]')
+        self.log_metrics = np.log1p(source[METRICS].to_numpy(dtype=np.float64))
+        self.shared_jitter = shared_jitter
+        self.metric_jitter = metric_jitter
+        self.rng = np.random.default_rng(seed)
+
+        # Whole-week shifts that keep each source timestamp inside the source date range
+        start, end = self.timestamps.min(), self.timestamps.max()
+        self.min_weeks = np.ceil((start - self.timestamps) / WEEK).astype(np.int64)
+        self.max_weeks = np.floor((end - self.timestamps) / WEEK).astype(np.int64)
+
+    def sample(self, rows: int) -> pd.DataFrame:
+        idx = self.rng.integers(0, len(self.texts), size=rows)
+
+        spans = self.max_weeks[idx] - self.min_weeks[idx] + 1
+        weeks = self.min_weeks[idx] + np.floor(self.rng.random(rows) * spans).astype(np.int64)
+        timestamps = self.timestamps[idx] + weeks * WEEK
+
+        noise = self.rng.normal(0.0, self.shared_jitter, size=(rows, 1))
+        noise = noise + self.rng.normal(0.0, self.metric_jitter, size=(rows, len(METRICS)))
+        # Lognormal bias correction, so the jitter doesn't inflate the means
+        noise -= (self.shared_jitter ** 2 + self.metric_jitter ** 2) / 2
+        metrics = np.clip(np.rint(np.expm1(self.log_metrics[idx] + noise)), 0, None).astype(np.int64)
+
+        df = pd.DataFrame({
+            'text': self.compose_texts(self.texts[idx]),
+            'platform': self.platforms[idx],
+            'timestamp': np.char.replace(np.datetime_as_string(timestamps, unit='s'), 'T', ' '),
+        })
+        for column, values in zip(METRICS, metrics.T):
+            df[column] = values
+        return df
+
+    def compose_texts(self, cores) -> list:
+        """
+        Rewrites each text with randomly picked slots of one tone, with 0-2 details
+        and 0-3 hashtags, so length and sentiment vary as well as the wording.
+        """
+        rows = len(cores)
+        tones = self.rng.choice(len(TONES), size=rows, p=TONE_WEIGHTS)
+        has_opener = self.rng.random(rows) < 0.5
+        has_closer = self.rng.random(rows) < 0.6
+        detail_counts = self.rng.integers(0, 3, size=rows)
+        hashtag_counts = self.rng.integers(0, 4, size=rows)
+        picks = self.rng.integers(0, 1 << 30, size=(rows, 7))
+        numbers = self.rng.integers(2, 500, size=(rows, 2))
+
+        texts = []
+        for i in range(rows):
+            tone = TONES[tones[i]]
+            parts = [OPENERS[tone][picks[i, 0] % len(OPENERS[tone])]] if has_opener[i] else []
+            parts.append(cores[i])
+            parts.extend(DETAILS[picks[i, 1 + d] % len(DETAILS)].format(n=numbers[i, d])
+                         for d in range(detail_counts[i]))
+            if has_closer[i]:
+                parts.append(CLOSERS[tone][picks[i, 3] % len(CLOSERS[tone])])
+            parts.extend(dict.fromkeys(HASHTAGS[picks[i, 4 + h] % len(HASHTAGS)] for h in range(hashtag_counts[i])))
+            texts.append(' '.join(parts))
+        return texts
+
+
+def add_features(df: pd.DataFrame, sentiment_cache: dict) -> pd.DataFrame:
+    """
+    Adds the same feature columns as social_post_engagement_dataset_processed.csv.
+    """
+    timestamps = pd.to_datetime(df['timestamp'], format='%Y-%m-%d %H:%M:%S')
+    df['hour'] = timestamps.dt.hour
+    df['day_of_week'] = timestamps.dt.dayofweek
+    df['text_length'] = df['text'].str.len()
+
+    missing = [text for text in df['text'].unique() if text not in sentiment_cache]
+    if missing:
+        from textblob import TextBlob
+        for text in missing:
+            sentiment_cache[text] = TextBlob(text).sentiment.polarity
+    df['sentiment'] = df['text'].map(sentiment_cache)
+
+    df['platform_LinkedIn'] = df['platform'].str.lower() == 'linkedin'
+    df['platform_Twitter'] = df['platform'].str.lower() == 'twitter'
+    return df
+
+
+def synthesize(output: str, rows: int, chunk_size: int = 250_000, processed: bool = False, seed: int = 0,
+               source_path: str = SOURCE_DATASET, shared_jitter: float = 0.25, metric_jitter: float = 0.1) -> dict:
+    """
+    Streams `rows` synthetic rows to `output` in chunks and returns per-platform
+    metric means for the source and the synthetic data.
+    """
+    source = pd.read_csv(source_path)
+    synthesizer = EngagementSynthesizer(source, shared_jitter, metric_jitter, seed)
+    sums = {}
+    counts = {}
+
+    start = time.perf_counter()
+    written = 0
+    while written < rows:
+        df = synthesizer.sample(min(chunk_size, rows - written))
+        if processed:
+            df = add_features(df, {})  # Texts rarely repeat across chunks, so the cache stays per chunk
+        df.to_csv(output, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += len(df)
+
+        grouped = df.groupby('platform')[METRICS]
+        for platform, total in grouped.sum().iterrows():
+            sums[platform] = sums.get(platform, 0) + total.to_numpy()
+        for platform, count in grouped.size().items():
+            counts[platform] = counts.get(platform, 0) + count
+        print(f"  {written:,}/{rows:,} rows ({written / (time.perf_counter() - start):,.0f} rows/s)")
+
+    source_means = source.groupby('platform')[METRICS].mean()
+    return {
+        'rows': written,
+        'seconds': round(time.perf_counter() - start, 2),
+        'platform_share': {p: round(c / written, 4) for p, c in counts.items()},
+        'source_platform_share': source['platform'].value_counts(normalize=True).round(4).to_dict(),
+        'mean_by_platform': {p: dict(zip(METRICS, np.round(sums[p] / counts[p], 2).tolist())) for p in counts},
+        'source_mean_by_platform': {p: row.round(2).to_dict() for p, row in source_means.iterrows()},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--chunk-size', type=int, default=250_000)
+    parser.add_argument('--processed', action='store_true',
+                        help='Also write the model feature columns (slower: sentiment is computed per distinct text).')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source', default=SOURCE_DATASET)
+    parser.add_argument('--shared-jitter', type=float, default=0.25, help='Std-dev of the shared log1p noise.')
+    parser.add_argument('--metric-jitter', type=float, default=0.1, help='Std-dev of the per-metric log1p noise.')
+    args = parser.parse_args()
+
+    summary = synthesize(args.output, args.rows, args.chunk_size, args.processed, args.seed, args.source,
+                         args.shared_jitter, args.metric_jitter)
+    print(f"✅ Wrote {summary['rows']:,} rows to {args.output} in {summary['seconds']}s.")
+    print(f"Platform share: {summary['platform_share']} (source {summary['source_platform_share']})")
+    for platform, means in summary['mean_by_platform'].items():
+        print(f"{platform} means: {means} (source {summary['source_mean_by_platform'].get(platform)})")
@@ -0,0 +1,161 @@
+"""
+Single-process gateway hosting all four AI services.
+
+Each service's existing Flask app is mounted unchanged under a path prefix:
+
+    /style       -> AI/app.py                (standalone port 5005)
+    /engagement  -> AI/engagement/app.py     (standalone port 5001)
+    /rag         -> AI/ragdheeraj/app.py     (standalone port 5002)
+    /schedule    -> AI/Schedule/app.py       (standalone port 5003)
+
+e.g. POST /engagement/predict_engagement or POST /rag/generate_rag_post.
+The prefixes are needed because the style and engagement services both expose
+/generate and /refine_post with different response shapes.
+
+LLM clients, the embedding model and the engagement models come from the shared
+registry in common/registry.py, so the gateway holds one copy of each and warms
+them up once at startup. Running each service on its own (python app.py in its
+directory) keeps working as before.
+
+Usage:
+    python gateway.py                     # serve on GATEWAY_PORT (default 5000)
+    python gateway.py --memory-report     # compare RSS of four processes vs the gateway
+"""
+import os
+import sys
+import json
+import argparse
+import importlib.util
+import subprocess
+from flask import Flask, jsonify
+from flask_cors import CORS
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from dotenv import load_dotenv
+
+from common import registry
+from common.metrics import instrument_app
+
+AI_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (directory, standalone port, registry components the service uses)
+SERVICES = {
+    'style': (AI_ROOT, 5005, ('chat_llm',)),
+    'engagement': (os.path.join(AI_ROOT, 'engagement'), 5001, ('chat_llm', 'engagement_models')),
+    'rag': (os.path.join(AI_ROOT, 'ragdheeraj'), 5002, ('chat_llm', 'embeddings', 'langchain')),
+    'schedule': (os.path.join(AI_ROOT, 'Schedule'), 5003, ('groq_client',)),
+}
+
+
+def _purge_local_modules(directory: str):
+    """
+    Drops cached modules whose names match files in `directory`, so a service's
+    `from style_analyzer import ...` resolves to its own copy rather than
+    whichever service imported that name first.
+    """
+    for filename in os.listdir(directory):
+        if filename.endswith('.py'):
+            sys.modules.pop(filename[:-3], None)
+
+
+def load_service(name: str):
+    """
+    Imports a service's app.py under a unique module name and returns the module.
+    """
+    directory = SERVICES[name][0]
+    _purge_local_modules(directory)
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(f"{name}_service", os.path.join(directory, 'app.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+
+def shared_components(service_names) -> list:
+    """
+    The registry components used by any of the services, without repeats.
+    """
+    components = []
+    for name in service_names:
+        components.extend(c for c in SERVICES[name][2] if c not in components)
+    return components
+
+
+def create_gateway(service_names=tuple(SERVICES), warm: bool = True):
+    """
+    Builds the WSGI application mounting every requested service under /<name>.
+    With `warm`, shared components are loaded as registry.WARM_UP_MODE says.
+    """
+    load_dotenv()
+    services = {name: load_service(name) for name in service_names}
+
+    if warm:
+        registry.warm_up_on_start(shared_components(service_names))
+
+    root = Flask(__name__)
+    CORS(root)
+    instrument_app(root, 'gateway')
+
+    @root.route('/healthz', methods=['GET'])
+    def healthz():
+        return jsonify({
+            "services": {name: f"/{name}" for name in services},
+            "shared_components": registry.loaded_components(),
+        })
+
+    root.wsgi_app = DispatcherMiddleware(root.wsgi_app, {
+        f"/{name}": module.app for name, module in services.items()
+    })
+    return root
+
+
+def _current_rss_kb() -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _measure_in_subprocess(service_names) -> dict:
+    code = (
+        "import json, sys; sys.path.insert(0, %r); import gateway; "
+        "gateway.create_gateway(%r); "
+        "print(json.dumps({'rss_kb': gateway._current_rss_kb()}))"
+    ) % (AI_ROOT, tuple(service_names))
+    output = subprocess.run([sys.executable, '-c', code], cwd=AI_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def memory_report() -> dict:
+    """
+    Measures the resident memory of each service loaded and warmed up alone, then
+    of all services in one gateway process.
+    """
+    separate = {name: _measure_in_subprocess([name])['rss_kb'] for name in SERVICES}
+    combined = _measure_in_subprocess(list(SERVICES))['rss_kb']
+    total_separate = sum(separate.values())
+    return {
+        "separate_rss_mb": {name: round(kb / 1024, 1) for name, kb in separate.items()},
+        "separate_total_rss_mb": round(total_separate / 1024, 1),
+        "gateway_rss_mb": round(combined / 1024, 1),
+        "saved_mb": round((total_separate - combined) / 1024, 1),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--memory-report', action='store_true', help='Print a memory-footprint comparison and exit.')
+    parser.add_argument('--services', default=','.join(SERVICES), help='Comma-separated services to mount.')
+    parser.add_argument('--no-warmup', action='store_true', help='Load shared components lazily on first use.')
+    args = parser.parse_args()
+
+    if args.memory_report:
+        print(json.dumps(memory_report(), indent=2))
+    else:
+        gateway = create_gateway(tuple(args.services.split(',')), warm=not args.no_warmup)
+        # No debug reloader: it would load and warm every service twice
+        gateway.run(host='0.0.0.0', port=int(os.getenv("GATEWAY_PORT", "5000")), threaded=True)
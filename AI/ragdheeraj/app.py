@@ -4,7 +4,14 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 
 # Import the refactored RAG logic
-from rag_logic import create_and_invoke_rag_chain
+from rag_logic import add_to_library, create_and_invoke_rag_chain, create_post_from_library
+from library_index import RAG_LIBRARY_TOKEN, get_library
+from rag_jobs import RAG_ASYNC_THRESHOLD_BYTES, JobQueueFullError, get_job, submit_job
+from common import registry
+from common.auth import token_authorized
+from common.metrics import instrument_app
+from common.profiling import init_profiling
+from common.resilience import LLMUnavailableError, register_error_handlers
 
 # Load environment variables
 load_dotenv()
@@ -12,6 +19,9 @@ load_dotenv()
 # --- Flask App Initialization ---
 app = Flask(__name__)
 CORS(app)
+instrument_app(app, 'rag')
+init_profiling(app, 'rag')
+register_error_handlers(app)
 
 
 @app.route('/generate_rag_post', methods=['POST'])
@@ -19,6 +29,8 @@ def generate_rag_post_endpoint():
     """
     API endpoint to generate a LinkedIn post from an uploaded document.
     Accepts multipart/form-data with a 'document' file and an 'instruction' text field.
+    Documents over RAG_ASYNC_THRESHOLD_BYTES are queued as a job: the response is
+    202 with a job id to poll at /rag_jobs/<job_id>, or 503 if the job queue is full.
     """
     # 1. Check for the file part in the request
     if 'document' not in request.files:
@@ -35,18 +47,135 @@ def generate_rag_post_endpoint():
 
     try:
         # 3. Read the file content and decode it
-        document_content = file.read().decode('utf-8')
+        raw_content = file.read()
+        document_content = raw_content.decode('utf-8')
+
+        # Large documents run in the background so the request doesn't hit proxy timeouts
+        if len(raw_content) > RAG_ASYNC_THRESHOLD_BYTES:
+            try:
+                job_id = submit_job(create_and_invoke_rag_chain, document_content, instruction)
+            except JobQueueFullError as e:
+                response = jsonify({"error": str(e)})
+                response.headers['Retry-After'] = '30'
+                return response, 503
+            response = jsonify({"job_id": job_id, "status": "queued", "status_url": f"rag_jobs/{job_id}"})
+            response.headers['Location'] = f"rag_jobs/{job_id}"
+            return response, 202
 
         # 4. Call the RAG logic function with the content and instruction
         generated_post = create_and_invoke_rag_chain(document_content, instruction)
 
         return jsonify({"generated_post": generated_post})
 
+    except LLMUnavailableError:
+        # Answered as 503/504 by the resilience error handlers
+        raise
     except Exception as e:
         # This will catch errors from file reading or the RAG chain logic
         print(f"An error occurred: {e}")
         return jsonify({"error": f"Failed to process request: {e}"}), 500
 
 
+@app.route('/rag_jobs/<job_id>', methods=['GET'])
+def rag_job_status_endpoint(job_id):
+    """
+    Status of a queued RAG job: stage, chunks embedded / total, and the
+    generated post (or error) once it has finished.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown or expired job '{job_id}'."}), 404
+    return jsonify(job)
+
+
+def _library_auth_error():
+    """
+    The error response for a library request without a valid token, else None.
+    """
+    if not RAG_LIBRARY_TOKEN:
+        return jsonify({"error": "Library endpoints are disabled; set RAG_LIBRARY_TOKEN to enable them"}), 403
+    if not token_authorized(request, RAG_LIBRARY_TOKEN):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+@app.route('/library/<tenant>/documents', methods=['POST'])
+def add_library_document_endpoint(tenant):
+    """
+    Adds an uploaded document to the tenant's content library (multipart/form-data
+    with a 'document' file, plus optional 'source' name and ISO 'date' fields).
+    Re-uploading a source replaces its earlier chunks. Like every /library endpoint,
+    requires RAG_LIBRARY_TOKEN in the X-Admin-Token header.
+    """
+    error = _library_auth_error()
+    if error:
+        return error
+    if 'document' not in request.files:
+        return jsonify({"error": "No 'document' file part in the request"}), 400
+    file = request.files['document']
+    source = request.form.get('source') or file.filename
+    if not source:
+        return jsonify({"error": "No 'source' name or filename provided"}), 400
+
+    try:
+        chunks = add_to_library(tenant, file.read().decode('utf-8'), source, request.form.get('date'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"tenant": tenant, "source": source, "chunks": chunks}), 201
+
+
+@app.route('/library/<tenant>/documents/<path:source>', methods=['DELETE'])
+def delete_library_document_endpoint(tenant, source):
+    """
+    Removes every chunk of a source document from the tenant's library.
+    """
+    error = _library_auth_error()
+    if error:
+        return error
+    try:
+        deleted = get_library(tenant).delete_source(source)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not deleted:
+        return jsonify({"error": f"No document '{source}' in the '{tenant}' library."}), 404
+    return jsonify({"tenant": tenant, "source": source, "deleted_chunks": deleted})
+
+
+@app.route('/library/<tenant>', methods=['GET'])
+def library_stats_endpoint(tenant):
+    error = _library_auth_error()
+    if error:
+        return error
+    try:
+        return jsonify(get_library(tenant).stats())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/library/<tenant>/generate', methods=['POST'])
+def generate_library_post_endpoint(tenant):
+    """
+    Generates a post grounded in the tenant's whole library. JSON body: 'instruction',
+    and optional 'sources' (list of source names), 'date_from' and 'date_to'.
+    """
+    error = _library_auth_error()
+    if error:
+        return error
+    data = request.get_json()
+    if not data or not data.get('instruction'):
+        return jsonify({"error": "Payload must include an 'instruction' string."}), 400
+
+    try:
+        generated_post = create_post_from_library(tenant, data['instruction'], sources=data.get('sources'),
+                                                  date_from=data.get('date_from'), date_to=data.get('date_to'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"generated_post": generated_post})
+
+
 if __name__ == '__main__':
+    # Serve right away; the LLM client and embedding model load in the background
+    # Only in the serving process, not in the debug reloader's watcher parent
+    if registry.WARM_UP_MODE != 'off' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        registry.start_background_warm_up(('chat_llm', 'embeddings', 'langchain'))
     app.run(host='0.0.0.0', port=5002, debug=True)
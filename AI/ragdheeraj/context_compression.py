@@ -0,0 +1,116 @@
+import os
+import re
+import math
+from collections import Counter
+
+import numpy as np
+
+from common.metrics import histogram
+from common.tokens import count_tokens, truncate_to_tokens
+
+# --- Configuration ---
+# Token budget for the context put into the prompt; 0 keeps the selected chunks verbatim
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "400"))
+# Chunks selected for the prompt, from the closest `fetch_k` by cosine similarity
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+RAG_FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+# 1.0 ranks purely by relevance, 0.0 purely by diversity
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.5"))
+# Weight of the chunk's embedding similarity vs the sentence's word overlap with the instruction
+CHUNK_SCORE_WEIGHT = 0.5
+
+SENTENCE = re.compile(r'[^.!?…\n]+(?:[.!?…]+|$)', re.MULTILINE)
+WORD = re.compile(r'\w+')
+
+CONTEXT_TOKENS = histogram('ai_rag_context_tokens', 'Retrieved context tokens before and after compression.',
+                           ['phase'], buckets=(50, 100, 200, 400, 800, 1600, 3200, 6400))
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_vector, doc_vectors, k: int = RAG_TOP_K, fetch_k: int = RAG_FETCH_K,
+               lambda_mult: float = RAG_MMR_LAMBDA):
+    """
+    Maximal marginal relevance over the `fetch_k` chunks closest to the query.
+    Returns (indices in selection order, cosine similarity of every chunk to the query).
+    """
+    docs = _unit_rows(doc_vectors)
+    similarity = docs @ _unit_rows(query_vector)[0]
+    candidates = list(np.argsort(-similarity)[:fetch_k])
+    selected = []
+    # Highest similarity of each candidate to anything already selected
+    redundancy = np.full(len(docs), -np.inf, dtype=np.float32)
+
+    while candidates and len(selected) < k:
+        if selected:
+            scores = [lambda_mult * similarity[i] - (1 - lambda_mult) * redundancy[i] for i in candidates]
+            best = candidates[int(np.argmax(scores))]
+        else:
+            best = candidates[0]
+        selected.append(int(best))
+        candidates.remove(best)
+        redundancy = np.maximum(redundancy, docs @ docs[best])
+    return selected, similarity
+
+
+def _sentences(text: str) -> list:
+    return [m.group().strip() for m in SENTENCE.finditer(text) if m.group().strip()]
+
+
+def compress_context(instruction: str, query_vector, docs: list, doc_vectors,
+                     token_budget: int = RAG_CONTEXT_TOKEN_BUDGET) -> list:
+    """
+    Picks chunks by MMR, then keeps the sentences most relevant to the instruction
+    until `token_budget` is spent. Sentence relevance mixes the chunk's (already
+    computed) embedding similarity with the sentence's idf-weighted word overlap
+    with the instruction, so nothing is embedded twice. Returns Documents of the
+    same type as `docs`, in selection order with each chunk's sentences in order.
+    """
+    if not docs:
+        return []
+    selected, similarity = mmr_select(query_vector, doc_vectors)
+    chosen = [docs[i] for i in selected]
+    before = sum(count_tokens(doc.page_content) for doc in chosen)
+    CONTEXT_TOKENS.observe(before, phase='before')
+    if token_budget <= 0:
+        CONTEXT_TOKENS.observe(before, phase='after')
+        return chosen
+
+    # (chunk rank, position in chunk, text, words)
+    sentences = []
+    for rank, doc in enumerate(chosen):
+        for position, sentence in enumerate(_sentences(doc.page_content)):
+            sentences.append((rank, position, sentence, set(WORD.findall(sentence.lower()))))
+
+    document_frequency = Counter(word for *_, words in sentences for word in words)
+    idf = {word: math.log(1 + len(sentences) / count) for word, count in document_frequency.items()}
+    query_words = set(WORD.findall(instruction.lower()))
+    max_overlap = sum(idf.get(word, 0.0) for word in query_words) or 1.0
+
+    def score(entry):
+        rank, _, _, words = entry
+        overlap = sum(idf[word] for word in words & query_words) / max_overlap
+        return CHUNK_SCORE_WEIGHT * float(similarity[selected[rank]]) + (1 - CHUNK_SCORE_WEIGHT) * overlap
+
+    kept, used = [], 0
+    for entry in sorted(sentences, key=score, reverse=True):
+        tokens = count_tokens(entry[2])
+        if used + tokens <= token_budget:
+            kept.append(entry)
+            used += tokens
+        elif not kept:
+            # Even the best sentence is over budget: keep its start
+            kept.append(entry[:2] + (truncate_to_tokens(entry[2], token_budget), entry[3]))
+            used = token_budget
+
+    compressed = []
+    for rank, doc in enumerate(chosen):
+        parts = [entry[2] for entry in sorted(kept, key=lambda e: e[:2]) if entry[0] == rank]
+        if parts:
+            compressed.append(type(doc)(page_content=' '.join(parts), metadata=dict(doc.metadata)))
+    CONTEXT_TOKENS.observe(sum(count_tokens(doc.page_content) for doc in compressed), phase='after')
+    return compressed
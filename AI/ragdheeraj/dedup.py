@@ -0,0 +1,102 @@
+import os
+import re
+import zlib
+import threading
+
+import numpy as np
+
+from common.metrics import counter
+
+# --- Configuration ---
+RAG_DEDUP_ENABLED = os.getenv("RAG_DEDUP_ENABLED", "1") == "1"
+# Estimated Jaccard similarity (of word 3-gram sets) at which a chunk counts as a duplicate
+RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+# 16 bands of 4 rows: pairs above ~0.5 similarity are likely to share a band and get compared
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+# Smallest prime above 2**32: (a * h + b) stays below 2**64 for 32-bit hashes
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 2 ** 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, NUM_PERM, dtype=np.uint64)
+WORD = re.compile(r'\w+')
+
+CHUNKS_SKIPPED = counter('ai_rag_dedup_chunks_skipped_total', 'Near-duplicate chunks dropped before embedding.',
+                         ['pipeline'])
+EMBED_SECONDS_SAVED = counter('ai_rag_dedup_embed_seconds_saved_total',
+                              'Embedding time avoided by dropping duplicates (at the recent per-chunk rate).',
+                              ['pipeline'])
+
+# Recent embedding cost per chunk, for estimating the time saved
+_embed_rate = {'seconds_per_chunk': None}
+_rate_lock = threading.Lock()
+
+
+def record_embedding_time(chunks: int, seconds: float):
+    """
+    Updates the moving average embedding cost per chunk.
+    """
+    if chunks <= 0:
+        return
+    with _rate_lock:
+        rate = seconds / chunks
+        previous = _embed_rate['seconds_per_chunk']
+        _embed_rate['seconds_per_chunk'] = rate if previous is None else 0.8 * previous + 0.2 * rate
+
+
+def minhash(text: str) -> np.ndarray:
+    """
+    MinHash signature of the text's word 3-grams (its words, if shorter).
+    """
+    words = WORD.findall(text.lower())
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def find_duplicates(texts: list, threshold: float = RAG_DEDUP_THRESHOLD) -> dict:
+    """
+    Maps the index of every near-duplicate text to the index of the earlier text
+    it duplicates. Candidates come from LSH buckets and are confirmed on the
+    estimated Jaccard similarity of their full signatures.
+    """
+    buckets = [{} for _ in range(BANDS)]
+    signatures = []
+    duplicates = {}
+    for i, text in enumerate(texts):
+        signature = minhash(text)
+        signatures.append(signature)
+        keys = [signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+        candidates = {j for band, key in enumerate(keys) for j in buckets[band].get(key, ())}
+        match = next((j for j in sorted(candidates)
+                      if np.mean(signatures[j] == signature) >= threshold), None)
+        if match is not None:
+            duplicates[i] = match
+            continue
+        # Only originals go into the buckets, so every duplicate points at a kept text
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(i)
+    return duplicates
+
+
+def deduplicate(texts: list, pipeline: str) -> tuple:
+    """
+    Returns (indices of the texts to keep, {kept index: number of duplicates dropped}),
+    counting the skipped chunks and the estimated embedding time saved.
+    """
+    if not RAG_DEDUP_ENABLED or len(texts) < 2:
+        return list(range(len(texts))), {}
+    duplicates = find_duplicates(texts)
+    merged = {}
+    for original in duplicates.values():
+        merged[original] = merged.get(original, 0) + 1
+    if duplicates:
+        CHUNKS_SKIPPED.inc(len(duplicates), pipeline=pipeline)
+        with _rate_lock:
+            rate = _embed_rate['seconds_per_chunk']
+        if rate is not None:
+            EMBED_SECONDS_SAVED.inc(rate * len(duplicates), pipeline=pipeline)
+        print(f"✅ Skipped {len(duplicates)} near-duplicate chunk(s) of {len(texts)} before embedding.")
+    return [i for i in range(len(texts)) if i not in duplicates], merged
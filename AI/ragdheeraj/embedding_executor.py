@@ -0,0 +1,108 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+# --- Configuration ---
+# Chunks per forward pass of the embedding model
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "32"))
+# Batches run concurrently, shared by every document being embedded in this process
+RAG_EMBED_WORKERS = int(os.getenv("RAG_EMBED_WORKERS", "1"))
+# Torch threads within one op and across independent ops; 0 leaves torch's default (all cores).
+# With several workers, intra-op threads x workers should be about the number of cores.
+RAG_EMBED_INTRA_OP_THREADS = int(os.getenv("RAG_EMBED_INTRA_OP_THREADS", "0"))
+RAG_EMBED_INTER_OP_THREADS = int(os.getenv("RAG_EMBED_INTER_OP_THREADS", "0"))
+
+_threads_configured = False
+_threads_lock = threading.Lock()
+
+
+def configure_torch_threads(intra_op: int = RAG_EMBED_INTRA_OP_THREADS, inter_op: int = RAG_EMBED_INTER_OP_THREADS):
+    """
+    Applies the torch thread settings once per process. Inter-op threads can only
+    be set before torch runs any parallel work, so a late call keeps the default.
+    """
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured:
+            return
+        _threads_configured = True
+        try:
+            import torch
+        except ImportError:
+            return
+        if intra_op > 0:
+            torch.set_num_threads(intra_op)
+        if inter_op > 0:
+            try:
+                torch.set_num_interop_threads(inter_op)
+            except RuntimeError as e:
+                print(f"⚠️ Could not set torch inter-op threads: {e}")
+
+
+class EmbeddingExecutor:
+    """
+    Embeds texts in fixed-size batches on a shared worker pool. Texts are sorted
+    by length first, so each batch pads to a similar length, and the vectors are
+    returned in the original order.
+    """
+
+    def __init__(self, embed_documents, batch_size: int = RAG_EMBED_BATCH_SIZE, workers: int = RAG_EMBED_WORKERS):
+        self.embed_documents = embed_documents
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='embed')
+
+    def batches(self, texts: list) -> list:
+        """
+        Index lists of the batches, longest texts first.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        return [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+
+    def embed(self, texts: list, progress=None) -> np.ndarray:
+        """
+        Returns a (len(texts), dim) float32 array. `progress(done, total)` is called
+        as batches finish, in completion order.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batches = self.batches(texts)
+        if self.workers == 1 or len(batches) == 1:
+            results = []
+            for batch in batches:
+                results.append((batch, self.embed_documents([texts[i] for i in batch])))
+                if progress:
+                    progress(sum(len(b) for b, _ in results), len(texts))
+        else:
+            futures = {self._pool.submit(self.embed_documents, [texts[i] for i in batch]): batch
+                       for batch in batches}
+            results, done = [], 0
+            for future in as_completed(futures):
+                results.append((futures[future], future.result()))
+                done += len(futures[future])
+                if progress:
+                    progress(done, len(texts))
+
+        dim = len(results[0][1][0])
+        vectors = np.empty((len(texts), dim), dtype=np.float32)
+        for batch, batch_vectors in results:
+            vectors[batch] = np.asarray(batch_vectors, dtype=np.float32)
+        return vectors
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_embedding_executor(embeddings) -> EmbeddingExecutor:
+    """
+    The process-wide executor for a (shared) embedding model, created on first use.
+    """
+    configure_torch_threads()
+    with _executors_lock:
+        executor = _executors.get(id(embeddings))
+        if executor is None:
+            executor = _executors[id(embeddings)] = EmbeddingExecutor(embeddings.embed_documents)
+        return executor
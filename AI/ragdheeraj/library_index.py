@@ -0,0 +1,606 @@
+import os
+import re
+import math
+import time
+import fcntl
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+import numpy as np
+
+from common.metrics import counter, histogram
+
+# --- Configuration ---
+RAG_LIBRARY_DIR = os.getenv("RAG_LIBRARY_DIR", os.path.join(tempfile.gettempdir(), "ai-rag-library"))
+# Below this many vectors a tenant is searched exhaustively; at it the IVF lists are trained
+RAG_LIBRARY_TRAIN_MIN = int(os.getenv("RAG_LIBRARY_TRAIN_MIN", "4096"))
+# Lists are retrained once the library has grown this many times over since the last training
+RAG_LIBRARY_RETRAIN_GROWTH = float(os.getenv("RAG_LIBRARY_RETRAIN_GROWTH", "4"))
+# Inverted lists probed per query
+RAG_LIBRARY_NPROBE = int(os.getenv("RAG_LIBRARY_NPROBE", "32"))
+# Rank candidates by their int8 codes, then rescore this many per result with the float vectors
+RAG_LIBRARY_QUANTIZED = os.getenv("RAG_LIBRARY_QUANTIZED", "1") == "1"
+RAG_LIBRARY_RESCORE_FACTOR = int(os.getenv("RAG_LIBRARY_RESCORE_FACTOR", "4"))
+# Required in the X-Admin-Token header by the /library endpoints; unset disables them
+RAG_LIBRARY_TOKEN = os.getenv("RAG_LIBRARY_TOKEN")
+# Deletes compact the files once tombstoned rows make up this fraction of them (0 disables)
+RAG_LIBRARY_COMPACT_RATIO = float(os.getenv("RAG_LIBRARY_COMPACT_RATIO", "0.5"))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+# Inserted vectors are searched exhaustively until this many are pending, then merged into the lists
+PENDING_MERGE_MIN = 8192
+ASSIGN_BLOCK = 65536
+
+TENANT_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+LIBRARY_QUERY_DURATION = histogram('ai_rag_library_query_seconds', 'Library index search latency.', ['mode'])
+LIBRARY_VECTORS = counter('ai_rag_library_vectors_total', 'Vectors inserted into / deleted from library indexes.',
+                          ['operation'])
+
+
+def _date_ordinal(value) -> int:
+    """
+    Days since 0001-01-01 for an ISO date (or date), 0 when missing.
+    """
+    if not value:
+        return 0
+    if isinstance(value, str):
+        try:
+            value = date.fromisoformat(value[:10])
+        except ValueError:
+            raise ValueError(f"Invalid date {value!r}; use YYYY-MM-DD.") from None
+    return value.toordinal()
+
+
+def validate_date(value):
+    """
+    Raises ValueError unless `value` is empty or an ISO date, so callers can reject
+    bad input before doing any work.
+    """
+    _date_ordinal(value)
+    return value
+
+
+def _unit_rows(matrix) -> np.ndarray:
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def quantize(vectors: np.ndarray):
+    """
+    Per-vector symmetric int8 codes: vector ~= code * scale, scale = max|x| / 127.
+    """
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12).astype(np.float32) / 127
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def _append_rows(path: str, data: np.ndarray) -> int:
+    """
+    Appends whole rows to a flat binary file, first dropping any partial row left by
+    an interrupted write. Returns the index of the first appended row.
+    """
+    row_bytes = data.dtype.itemsize * (data.shape[1] if data.ndim > 1 else 1)
+    with open(path, 'ab') as f:
+        rows = f.seek(0, os.SEEK_END) // row_bytes
+        f.truncate(rows * row_bytes)
+        f.write(data.tobytes())
+    return rows
+
+
+def _grow(array: np.ndarray, size: int, fill) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array), 1024), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def spherical_kmeans(vectors: np.ndarray, clusters: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0):
+    """
+    K-means on unit vectors by cosine similarity; returns unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.flatnonzero(~sums.any(axis=1))
+        # Re-seed empty clusters from random points
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = _unit_rows(sums)
+    return centroids
+
+
+class LibraryIndex:
+    """
+    Persistent IVF index of one tenant's chunk embeddings.
+
+    On disk, in the tenant's directory:
+      vectors.f32    unit float32 vectors, appended in insert order and memory-mapped
+      codes.i8       the same vectors as int8 codes, with per-vector scales in scales.f32
+      centroids.npy  IVF centroids, once the library is large enough to train them
+      meta.sqlite    per-chunk metadata (list, source, date, text, tombstone)
+
+    A chunk's id is its row in vectors.f32. Deletes are tombstones. Every insert,
+    delete or retrain bumps a version number, so each process catches up by
+    loading only the rows changed since its last sync. Writers take a file lock.
+
+    Once tombstones make up RAG_LIBRARY_COMPACT_RATIO of the rows, compact()
+    rewrites the vector files without them into a new generation (vectors.<n>.f32
+    and so on) and renumbers the chunks; other processes see the generation change
+    and reload from scratch.
+
+    Candidates are ranked by their int8 codes (a quarter of the float size, so the
+    part of the index a search touches stays in RAM), and only the best few per
+    result are rescored with exact float vectors, read lazily from the memmap.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.centroids_path = os.path.join(directory, 'centroids.npy')
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+        self.dim = None
+        self.centroids = None
+        self._reset(0)
+
+    def _paths(self, generation: int) -> tuple:
+        """
+        The vector, code and scale files of a generation.
+        """
+        suffix = f'.{generation}' if generation else ''
+        return tuple(os.path.join(self.directory, name + suffix + ext)
+                     for name, ext in (('vectors', '.f32'), ('codes', '.i8'), ('scales', '.f32')))
+
+    def _reset(self, generation: int):
+        """
+        Drops all per-row state, so the next sync reloads the given generation.
+        """
+        self._generation = generation
+        self.vectors_path, self.codes_path, self.scales_path = self._paths(generation)
+        self._centroid_version = None
+        self._version = 0
+        self._rows = 0
+        self._vectors = None
+        self._codes = None
+        self._scales = None
+        # Per-row state, indexed by chunk id
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._sources = np.zeros(0, dtype=np.int32)
+        self._dates = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        # Rows below _merged_rows are grouped by list in _order (offsets in _offsets)
+        self._order = np.zeros(0, dtype=np.int64)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._merged_rows = 0
+
+    # --- Storage ---
+
+    def _db(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(os.path.join(self.directory, 'meta.sqlite'), timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(
+                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER);"
+                "CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, name TEXT UNIQUE);"
+                "CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, list_id INTEGER, source_id INTEGER, "
+                "day INTEGER, start_index INTEGER, text TEXT, deleted INTEGER DEFAULT 0, version INTEGER);"
+                "CREATE INDEX IF NOT EXISTS chunks_version ON chunks (version);"
+                "CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source_id);")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _state(self, key: str, default=None):
+        row = self._db().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_state(connection, key: str, value: int):
+        connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    @contextmanager
+    def _writing(self):
+        """
+        Serializes writers across threads and processes, and syncs before the write.
+        """
+        with self._lock, open(os.path.join(self.directory, 'write.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._sync()
+                if self.dim is not None:
+                    self._backfill_codes()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _map_vectors(self):
+        rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        if rows != self._rows or self._vectors is None:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                      shape=(rows, self.dim)) if rows else np.zeros((0, self.dim), np.float32)
+            self._rows = rows
+            coded = min(os.path.getsize(self.codes_path) // self.dim if os.path.exists(self.codes_path) else 0,
+                        os.path.getsize(self.scales_path) // 4 if os.path.exists(self.scales_path) else 0, rows)
+            if coded:
+                self._codes = np.memmap(self.codes_path, dtype=np.int8, mode='r', shape=(coded, self.dim))
+                self._scales = np.memmap(self.scales_path, dtype=np.float32, mode='r', shape=(coded,))
+            else:
+                self._codes = self._scales = None
+        return self._vectors
+
+    def _backfill_codes(self):
+        """
+        Quantizes rows that have float vectors but no codes yet (libraries created
+        before codes were stored, or a write interrupted between the two files).
+        """
+        vectors = self._map_vectors()
+        coded = 0 if self._codes is None else len(self._codes)
+        if coded == len(vectors):
+            return
+        for path, row_bytes in ((self.codes_path, self.dim), (self.scales_path, 4)):
+            with open(path, 'ab') as f:
+                f.truncate(coded * row_bytes)
+        for start in range(coded, len(vectors), ASSIGN_BLOCK):
+            codes, scales = quantize(np.asarray(vectors[start:start + ASSIGN_BLOCK]))
+            _append_rows(self.codes_path, codes)
+            _append_rows(self.scales_path, scales)
+        print(f"✅ Quantized {len(vectors) - coded} library vectors in {self.directory}")
+        self._vectors = None
+        self._map_vectors()
+
+    def _sync(self):
+        """
+        Loads rows changed by any process since the last sync.
+        """
+        with self._lock:
+            generation = self._state('generation', 0)
+            if generation != self._generation:
+                self._reset(generation)
+            version = self._state('version', 0)
+            if version == self._version and self._vectors is not None:
+                return
+            self.dim = self._state('dim')
+            if self.dim is None:
+                return
+            centroid_version = self._state('centroid_version')
+            if centroid_version != self._centroid_version:
+                self.centroids = np.load(self.centroids_path) if centroid_version is not None else None
+                self._centroid_version = centroid_version
+                self._merged_rows = 0
+
+            vectors = self._map_vectors()
+            size = len(vectors)
+            self._lists = _grow(self._lists, size, -1)
+            self._sources = _grow(self._sources, size, 0)
+            self._dates = _grow(self._dates, size, 0)
+            self._alive = _grow(self._alive, size, False)
+
+            # Bounded by the version read above: writers append vectors before committing their rows, so
+            # every row up to it has its vector in the mapping, while later commits may not
+            rows = np.array(self._db().execute(
+                "SELECT id, list_id, source_id, day, deleted FROM chunks WHERE version > ? AND version <= ?",
+                (self._version, version)).fetchall(), dtype=np.int64).reshape(-1, 5)
+            if self._state('generation', 0) != generation:
+                return self._sync()  # Compacted meanwhile: the mapping and the rows may not match
+            if len(rows):
+                ids = rows[:, 0]
+                if np.any((self._lists[ids] != rows[:, 1]) & (ids < self._merged_rows)):
+                    self._merged_rows = 0  # A merged row moved lists: rebuild the inverted lists
+                self._lists[ids] = rows[:, 1]
+                self._sources[ids] = rows[:, 2]
+                self._dates[ids] = rows[:, 3]
+                self._alive[ids] = rows[:, 4] == 0
+            self._version = version
+            pending = size - self._merged_rows
+            if self.centroids is not None and (self._merged_rows == 0 or pending >= max(PENDING_MERGE_MIN, size // 20)):
+                self._merge_lists(size)
+
+    def _merge_lists(self, size: int):
+        lists = self._lists[:size]
+        self._order = np.argsort(lists, kind='stable')
+        self._offsets = np.searchsorted(lists[self._order], np.arange(len(self.centroids) + 1))
+        self._merged_rows = size
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int64)
+        return np.concatenate([np.argmax(vectors[i:i + ASSIGN_BLOCK] @ self.centroids.T, axis=1)
+                               for i in range(0, len(vectors), ASSIGN_BLOCK)] or [np.zeros(0, np.int64)])
+
+    # --- Writes ---
+
+    def _source_ids(self, connection, names) -> dict:
+        ids = {}
+        for name in set(names):
+            connection.execute("INSERT OR IGNORE INTO sources (name) VALUES (?)", (name,))
+            ids[name] = connection.execute("SELECT id FROM sources WHERE name = ?", (name,)).fetchone()[0]
+        return ids
+
+    def add(self, vectors, texts: list, sources: list, dates: list = None, start_indexes: list = None,
+            replace: bool = False) -> list:
+        """
+        Appends chunks and returns their ids. `sources` names each chunk's document;
+        `dates` are ISO dates (or None) used by date filters. With `replace`, earlier
+        chunks of those sources are tombstoned in the same write, so a failed add
+        leaves the previous version in place.
+        """
+        vectors = _unit_rows(vectors)
+        count = len(vectors)
+        dates = dates or [None] * count
+        start_indexes = start_indexes or [0] * count
+        if not (len(texts) == len(sources) == len(dates) == len(start_indexes) == count):
+            raise ValueError("vectors, texts, sources, dates and start_indexes must have the same length.")
+        # Everything that can reject the input is checked before the files are touched
+        days = [_date_ordinal(day) for day in dates]
+        start_indexes = [int(start) for start in start_indexes]
+        with self._writing():
+            connection = self._db()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with connection:
+                    self._set_state(connection, 'dim', self.dim)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vectors have dimension {vectors.shape[1]}; this library stores {self.dim}.")
+
+            first = _append_rows(self.vectors_path, vectors)
+            codes, scales = quantize(vectors)
+            _append_rows(self.codes_path, codes)
+            _append_rows(self.scales_path, scales)
+            lists = self._assign(vectors)
+            with connection:
+                version = self._state('version', 0) + 1
+                source_ids = self._source_ids(connection, sources)
+                replaced = 0
+                if replace:
+                    replaced = connection.execute(
+                        f"UPDATE chunks SET deleted = 1, version = ? WHERE deleted = 0 AND source_id IN "
+                        f"({','.join('?' * len(source_ids))})", (version, *source_ids.values())).rowcount
+                connection.executemany(
+                    "INSERT INTO chunks (id, list_id, source_id, day, start_index, text, deleted, version) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                    ((first + i, int(lists[i]), source_ids[sources[i]], days[i], start_indexes[i], texts[i], version)
+                     for i in range(count)))
+                self._set_state(connection, 'version', version)
+            if replaced:
+                LIBRARY_VECTORS.inc(replaced, operation='delete')
+            LIBRARY_VECTORS.inc(count, operation='insert')
+            self._sync()
+            if replaced and self._should_compact():
+                self._compact()
+                first = None
+
+            trained_rows = self._state('trained_rows', 0)
+            live = int(self._alive[:self._rows].sum())
+            if (self.centroids is None and live >= RAG_LIBRARY_TRAIN_MIN) or \
+                    (self.centroids is not None and live >= RAG_LIBRARY_RETRAIN_GROWTH * trained_rows):
+                self._train()
+            if first is None:  # Compacted: the new chunks are the last rows
+                first = self._rows - count
+        return list(range(first, first + count))
+
+    def delete_source(self, source: str) -> int:
+        """
+        Tombstones every chunk of a source document; returns how many were removed.
+        """
+        with self._writing():
+            connection = self._db()
+            with connection:
+                version = self._state('version', 0) + 1
+                cursor = connection.execute(
+                    "UPDATE chunks SET deleted = 1, version = ? WHERE deleted = 0 AND source_id = "
+                    "(SELECT id FROM sources WHERE name = ?)", (version, source))
+                self._set_state(connection, 'version', version)
+            LIBRARY_VECTORS.inc(cursor.rowcount, operation='delete')
+            self._sync()
+            if cursor.rowcount and self._should_compact():
+                self._compact()
+            return cursor.rowcount
+
+    def _should_compact(self) -> bool:
+        dead = self._rows - int(self._alive[:self._rows].sum())
+        return RAG_LIBRARY_COMPACT_RATIO > 0 and dead > 0 and dead >= RAG_LIBRARY_COMPACT_RATIO * self._rows
+
+    def compact(self) -> int:
+        """
+        Rewrites the library without its tombstoned rows; returns how many were
+        dropped. Chunks are renumbered, so ids returned by earlier adds are stale.
+        """
+        with self._writing():
+            return self._compact()
+
+    def _compact(self) -> int:
+        if self.dim is None:
+            return 0
+        vectors = self._map_vectors()
+        live = np.flatnonzero(self._alive[:len(vectors)])
+        dropped = len(vectors) - len(live)
+        if dropped == 0:
+            return 0
+        old_paths = self._paths(self._generation)
+        generation = self._generation + 1
+        new_paths = self._paths(generation)
+        for path in new_paths:  # Left over from an interrupted compaction
+            if os.path.exists(path):
+                os.remove(path)
+        for start in range(0, len(live), ASSIGN_BLOCK):
+            block = live[start:start + ASSIGN_BLOCK]
+            _append_rows(new_paths[0], np.asarray(vectors[block]))
+            _append_rows(new_paths[1], np.asarray(self._codes[block]))
+            _append_rows(new_paths[2], np.asarray(self._scales[block]))
+
+        connection = self._db()
+        with connection:
+            version = self._state('version', 0) + 1
+            connection.execute("DELETE FROM chunks WHERE deleted = 1")
+            # Ascending, so each row moves down into an id already vacated
+            connection.executemany("UPDATE chunks SET id = ?, version = ? WHERE id = ?",
+                                   ((new_id, version, int(old_id)) for new_id, old_id in enumerate(live)))
+            connection.execute("DELETE FROM sources WHERE id NOT IN (SELECT DISTINCT source_id FROM chunks)")
+            self._set_state(connection, 'version', version)
+            self._set_state(connection, 'generation', generation)
+        # Processes still reading the old files keep their mappings; the next sync moves them over
+        for path in old_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self._sync()
+        print(f"✅ Compacted {self.directory}: dropped {dropped} deleted vectors, kept {len(live)}")
+        return dropped
+
+    def train(self):
+        """
+        (Re)trains the IVF centroids on the live vectors and reassigns every row.
+        """
+        with self._writing():
+            self._train()
+
+    def _train(self):
+        vectors = self._map_vectors()
+        live = np.flatnonzero(self._alive[:len(vectors)])
+        if len(live) == 0:
+            return
+        clusters = max(1, min(len(live) // 39, int(math.sqrt(len(live)))))
+        rng = np.random.default_rng(len(live))
+        sample = np.sort(rng.choice(live, min(len(live), clusters * KMEANS_SAMPLE_PER_LIST), replace=False))
+        centroids = spherical_kmeans(np.asarray(vectors[sample]), clusters)
+        print(f"🧠 Trained {clusters} IVF lists on {len(sample)} of {len(live)} vectors in {self.directory}")
+
+        np.save(self.centroids_path + '.tmp.npy', centroids)
+        os.replace(self.centroids_path + '.tmp.npy', self.centroids_path)
+        self.centroids = centroids
+        connection = self._db()
+        with connection:
+            version = self._state('version', 0) + 1
+            for start in range(0, len(vectors), ASSIGN_BLOCK):
+                lists = self._assign(np.asarray(vectors[start:start + ASSIGN_BLOCK]))
+                connection.executemany("UPDATE chunks SET list_id = ?, version = ? WHERE id = ?",
+                                       ((int(l), version, start + i) for i, l in enumerate(lists)))
+            self._set_state(connection, 'version', version)
+            self._set_state(connection, 'centroid_version', version)
+            self._set_state(connection, 'trained_rows', len(live))
+        self._sync()
+
+    # --- Reads ---
+
+    def _filter_mask(self, rows: np.ndarray, sources=None, date_from=None, date_to=None) -> np.ndarray:
+        mask = self._alive[rows]
+        if sources:
+            placeholders = ','.join('?' * len(sources))
+            ids = [r[0] for r in self._db().execute(f"SELECT id FROM sources WHERE name IN ({placeholders})",
+                                                    list(sources))]
+            mask &= np.isin(self._sources[rows], ids)
+        if date_from:
+            mask &= self._dates[rows] >= _date_ordinal(date_from)
+        if date_to:
+            mask &= (self._dates[rows] <= _date_ordinal(date_to)) & (self._dates[rows] > 0)
+        return mask
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        size = len(self._vectors)
+        if self.centroids is None:
+            return np.arange(size)
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        parts = [self._order[self._offsets[l]:self._offsets[l + 1]] for l in probe]
+        parts.append(np.arange(self._merged_rows, size))  # Not yet merged into the lists
+        return np.sort(np.concatenate(parts))
+
+    def search(self, query_vector, k: int = 10, nprobe: int = RAG_LIBRARY_NPROBE, exact: bool = False,
+               sources=None, date_from=None, date_to=None, with_vectors: bool = False, quantized: bool = None,
+               rescore_factor: int = RAG_LIBRARY_RESCORE_FACTOR) -> list:
+        """
+        Returns up to `k` hits, best first: dicts with id, score (cosine), text,
+        source, date, start_index and, if asked for, the stored vector. Filters on
+        source names and an inclusive ISO date range are applied before ranking.
+
+        `exact` scans every float vector. Otherwise the IVF candidates are ranked
+        by int8 codes (unless `quantized` is False) and the best `k * rescore_factor`
+        rescored with float vectors; rescore_factor=0 returns the int8 ranking as is.
+        """
+        self._sync()
+        if self.dim is None:
+            return []
+        query = _unit_rows(query_vector)[0]
+        quantized = RAG_LIBRARY_QUANTIZED if quantized is None else quantized
+        start = time.perf_counter()
+        with self._lock:
+            generation = self._generation
+            vectors, codes, scales = self._vectors, self._codes, self._scales
+            rows = np.arange(len(vectors)) if exact else self._candidates(query, nprobe)
+            rows = rows[self._filter_mask(rows, sources, date_from, date_to)]
+        if len(rows) == 0:
+            return []
+        quantized = quantized and not exact and codes is not None and len(codes) == len(vectors)
+        mode = 'exact' if exact else ('int8' if quantized else 'float') + ('_ivf' if self.centroids is not None else '')
+
+        if quantized:
+            scores = (np.asarray(codes[rows], dtype=np.float32) @ query) * scales[rows]
+            if rescore_factor:
+                shortlist = min(len(rows), k * rescore_factor)
+                rows = np.sort(rows[np.argpartition(-scores, shortlist - 1)[:shortlist]])
+                scores = np.asarray(vectors[rows]) @ query
+        else:
+            scores = np.asarray(vectors[rows]) @ query
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        LIBRARY_QUERY_DURATION.observe(time.perf_counter() - start, mode=mode)
+        hits = [(int(rows[i]), float(scores[i])) for i in top]
+        described = self._describe(hits, vectors if with_vectors else None)
+        if self._state('generation', 0) != generation:  # Compacted meanwhile: the ids were renumbered
+            return self.search(query_vector, k, nprobe, exact, sources, date_from, date_to, with_vectors, quantized,
+                               rescore_factor)
+        return described
+
+    def _describe(self, hits: list, vectors=None) -> list:
+        if not hits:
+            return []
+        placeholders = ','.join('?' * len(hits))
+        rows = {r[0]: r[1:] for r in self._db().execute(
+            f"SELECT c.id, c.text, s.name, c.day, c.start_index FROM chunks c JOIN sources s ON s.id = c.source_id "
+            f"WHERE c.id IN ({placeholders})", [chunk_id for chunk_id, _ in hits])}
+        results = []
+        for chunk_id, score in hits:
+            if chunk_id not in rows:
+                continue  # Renumbered by a concurrent compaction; search() retries
+            text, source, day, start_index = rows[chunk_id]
+            hit = {"id": chunk_id, "score": round(score, 6), "text": text, "source": source,
+                   "date": date.fromordinal(day).isoformat() if day else None, "start_index": start_index}
+            if vectors is not None:
+                hit["vector"] = np.asarray(vectors[chunk_id])
+            results.append(hit)
+        return results
+
+    def stats(self) -> dict:
+        self._sync()
+        return {
+            "vectors": int(self._rows),
+            "live": int(self._alive[:self._rows].sum()),
+            "dim": self.dim,
+            "lists": 0 if self.centroids is None else len(self.centroids),
+            "pending": int(self._rows - self._merged_rows) if self.centroids is not None else int(self._rows),
+            "sources": self._db().execute(
+                "SELECT COUNT(DISTINCT source_id) FROM chunks WHERE deleted = 0").fetchone()[0],
+        }
+
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+
+def get_library(tenant: str) -> LibraryIndex:
+    """
+    The tenant's index, opened once per process.
+    """
+    if not TENANT_PATTERN.match(tenant or ''):
+        raise ValueError("Tenant must be 1-64 letters, digits, '-' or '_'.")
+    with _libraries_lock:
+        if tenant not in _libraries:
+            _libraries[tenant] = LibraryIndex(os.path.join(RAG_LIBRARY_DIR, tenant))
+        return _libraries[tenant]
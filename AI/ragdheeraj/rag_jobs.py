@@ -0,0 +1,178 @@
+import os
+import time
+import uuid
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from common.metrics import counter
+
+# --- Configuration ---
+# Uploads larger than this are processed as background jobs (202 + polling)
+RAG_ASYNC_THRESHOLD_BYTES = int(os.getenv("RAG_ASYNC_THRESHOLD_BYTES", str(200 * 1024)))
+RAG_JOB_WORKERS = int(os.getenv("RAG_JOB_WORKERS", "2"))
+# Jobs a worker process holds waiting for a free job thread; each holds its whole document
+# in memory, so further submissions are refused (503) until the queue drains
+RAG_JOB_QUEUE_SIZE = int(os.getenv("RAG_JOB_QUEUE_SIZE", "8"))
+# Job state lives in SQLite so any worker process can answer a status poll
+RAG_JOBS_DB_PATH = os.getenv("RAG_JOBS_DB_PATH", os.path.join(tempfile.gettempdir(), "ai-rag-jobs.sqlite"))
+# Jobs are kept this long after their last update
+RAG_JOB_TTL_SECONDS = float(os.getenv("RAG_JOB_TTL_SECONDS", "3600"))
+# A queued or running job not updated for this long is reported failed (its worker died);
+# a live worker refreshes its queued jobs whenever its running jobs make progress
+RAG_JOB_STALE_SECONDS = float(os.getenv("RAG_JOB_STALE_SECONDS", "600"))
+
+JOBS = counter('ai_rag_jobs_total', 'Background RAG jobs by final status.', ['status'])
+
+
+class JobQueueFullError(Exception):
+    """
+    Raised by submit_job when this worker already holds RAG_JOB_QUEUE_SIZE waiting jobs.
+    """
+    status_code = 503
+
+
+_COLUMNS = ('id', 'status', 'stage', 'done', 'total', 'result', 'error', 'created', 'updated')
+
+
+class RagJobStore:
+    """
+    Job rows in a shared SQLite file (WAL mode); each thread gets its own connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rag_jobs (id TEXT PRIMARY KEY, status TEXT, stage TEXT, "
+                "done INTEGER, total INTEGER, result TEXT, error TEXT, created REAL, updated REAL)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def create(self) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        connection = self._connection()
+        connection.execute("DELETE FROM rag_jobs WHERE updated < ?", (now - RAG_JOB_TTL_SECONDS,))
+        connection.execute("INSERT INTO rag_jobs VALUES (?, 'queued', 'queued', 0, 0, NULL, NULL, ?, ?)",
+                           (job_id, now, now))
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        fields['updated'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._connection().execute(f"UPDATE rag_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def touch(self, job_ids):
+        """
+        Marks still-queued jobs as alive.
+        """
+        job_ids = list(job_ids)
+        if job_ids:
+            self._connection().execute(
+                f"UPDATE rag_jobs SET updated = ? WHERE status = 'queued' AND id IN ({','.join('?' * len(job_ids))})",
+                (time.time(), *job_ids))
+
+    def get(self, job_id: str):
+        row = self._connection().execute(f"SELECT {', '.join(_COLUMNS)} FROM rag_jobs WHERE id = ?",
+                                         (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        if job['status'] in ('queued', 'running') and time.time() - job['updated'] > RAG_JOB_STALE_SECONDS:
+            job.update(status='failed', error="Job stopped reporting progress; its worker may have exited.")
+        return job
+
+
+_store = None
+_executor = None
+_lock = threading.Lock()
+# Ids of this process's jobs still waiting for a job thread
+_queued = set()
+
+
+def _get_store() -> RagJobStore:
+    global _store
+    with _lock:
+        if _store is None:
+            _store = RagJobStore(RAG_JOBS_DB_PATH)
+        return _store
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RAG_JOB_WORKERS, thread_name_prefix='rag-job')
+        return _executor
+
+
+def _run_job(job_id: str, run, document_content: str, instruction: str):
+    store = _get_store()
+    with _lock:
+        _queued.discard(job_id)
+    store.update(job_id, status='running', stage='split')
+
+    def progress(stage: str, done: int = None, total: int = None):
+        counts = {'done': done, 'total': total}
+        store.update(job_id, stage=stage, **{name: value for name, value in counts.items() if value is not None})
+        with _lock:
+            waiting = list(_queued)
+        store.touch(waiting)
+
+    try:
+        result = run(document_content, instruction, progress=progress)
+    except Exception as e:
+        print(f"❌ RAG job {job_id} failed: {e}")
+        store.update(job_id, status='failed', error=str(e))
+        JOBS.inc(status='failed')
+        return
+    store.update(job_id, status='done', stage='done', result=result)
+    JOBS.inc(status='done')
+
+
+def submit_job(run, document_content: str, instruction: str) -> str:
+    """
+    Queues `run(document_content, instruction, progress=...)` on the job pool and
+    returns the job id. `progress(stage, done, total)` is saved for status polls.
+    Raises JobQueueFullError if RAG_JOB_QUEUE_SIZE jobs are already waiting here.
+    """
+    store = _get_store()
+    with _lock:
+        if len(_queued) >= RAG_JOB_QUEUE_SIZE:
+            JOBS.inc(status='rejected')
+            raise JobQueueFullError(f"{len(_queued)} RAG jobs are already queued; retry later.")
+        job_id = store.create()
+        _queued.add(job_id)
+    _get_executor().submit(_run_job, job_id, run, document_content, instruction)
+    return job_id
+
+
+def get_job(job_id: str):
+    """
+    Returns the job's public status dict, or None if it is unknown or expired.
+    """
+    job = _get_store().get(job_id)
+    if job is None:
+        return None
+    status = {
+        "job_id": job['id'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "progress": {"chunks_embedded": job['done'], "chunks_total": job['total']},
+        "elapsed_seconds": round((job['updated'] if job['status'] in ('done', 'failed') else time.time())
+                                 - job['created'], 3),
+    }
+    if job['status'] == 'done':
+        status["generated_post"] = job['result']
+    elif job['status'] == 'failed':
+        status["error"] = job['error']
+    return status
@@ -82,66 +82,209 @@
 
 
 import os
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+import sys
+import json
+import time
+import numpy as np
+
+# Make the shared AI/common package importable when this service runs from its own directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.llm_cache import cached_llm_call
+from common.metrics import stage
+from common.registry import get_chat_llm, get_embeddings
+from common.resilience import call_with_resilience
+import context_compression
+import dedup
+from context_compression import RAG_FETCH_K, compress_context
+from dedup import deduplicate, record_embedding_time
+from embedding_executor import get_embedding_executor
+from library_index import get_library, validate_date
+from text_splitter import SentenceAwareSplitter
 
 # --- Configuration ---
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 CHAT_MODEL_NAME = "llama3-70b-8192"
+CHAT_TEMPERATURE = 0.7
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Bump when a change to splitting, retrieval or compression changes answers for the same inputs
+RAG_PIPELINE_VERSION = 1
+RAG_PROMPT_TEMPLATE = """
+    You are an expert content writer for LinkedIn, specializing in professional posts with a critical and negative tone.
+    Use only the provided context to inform your response.
+
+    Context:
+    {context}
+
+    Instruction:
+    {input}
+
+    Write a concise LinkedIn post (under 100 words) based on the instruction, using a negative tone and including relevant hashtags.
+    """
 
 
-def create_and_invoke_rag_chain(document_content: str, instruction: str):
+def create_and_invoke_rag_chain(document_content: str, instruction: str, progress=None):
     """
     Takes document content and an instruction, builds the RAG chain on the fly,
-    invokes it, and returns the generated post.
+    invokes it, and returns the generated post. `progress(stage, done, total)`, if
+    given, is called as the pipeline moves through its stages.
     """
     # 1. Check for Groq API Key
     groq_api_key = os.getenv("GROQ_API_KEY")
     if not groq_api_key:
         raise ValueError("GROQ_API_KEY environment variable not set on the server.")
 
+    # The answer depends only on the pipeline settings, template, instruction and document, so
+    # a cache hit skips splitting and embedding as well as the LLM call (temperature > 0: opt-in only)
+    cache_prompt = "\n".join([pipeline_signature(), RAG_PROMPT_TEMPLATE, instruction, document_content])
+    return cached_llm_call('rag.generate', CHAT_MODEL_NAME, CHAT_TEMPERATURE, cache_prompt,
+                           lambda: _run_rag_chain(document_content, instruction, progress))
+
+
+def pipeline_signature() -> str:
+    """
+    The settings besides the prompt that shape a RAG answer, so changing any of
+    them stops cached answers from being served.
+    """
+    return json.dumps({
+        'version': RAG_PIPELINE_VERSION,
+        'embedding_model': EMBEDDING_MODEL_NAME,
+        'chunk_size': CHUNK_SIZE,
+        'chunk_overlap': CHUNK_OVERLAP,
+        'context_token_budget': context_compression.RAG_CONTEXT_TOKEN_BUDGET,
+        'top_k': context_compression.RAG_TOP_K,
+        'fetch_k': context_compression.RAG_FETCH_K,
+        'mmr_lambda': context_compression.RAG_MMR_LAMBDA,
+        'dedup_enabled': dedup.RAG_DEDUP_ENABLED,
+        'dedup_threshold': dedup.RAG_DEDUP_THRESHOLD,
+    }, sort_keys=True)
+
+
+def _run_rag_chain(document_content: str, instruction: str, progress=None) -> str:
+    """
+    Splits and embeds the document, then runs retrieval, context compression and generation.
+    """
     print("Processing uploaded document...")
+    progress = progress or (lambda stage, done=None, total=None: None)
 
     # 2. Split the document content into chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    docs = text_splitter.create_documents([document_content])
+    with stage('rag.split'):
+        text_splitter = SentenceAwareSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        docs = text_splitter.create_documents([document_content])
     print(f"Document split into {len(docs)} chunks.")
 
-    # 3. Create vector store from the chunks
+    # Drop near-duplicate chunks (repeated boilerplate) before they are embedded
+    with stage('rag.dedup'):
+        keep, merged = deduplicate([doc.page_content for doc in docs], 'rag')
+    docs = [docs[i] for i in keep]
+    for doc, i in zip(docs, keep):
+        if i in merged:
+            doc.metadata['duplicates'] = merged[i]
+
+    # 3. Embed the chunks and the instruction
     # Note: This happens for every request, which can be slow for very large documents.
-    print("Creating vector store for the request...")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    vector_store = Chroma.from_documents(documents=docs, embedding=embeddings)
-    retriever = vector_store.as_retriever()
-    print("Vector store created.")
-
-    # 4. Initialize Chat LLM & Prompt
-    llm = ChatGroq(model=CHAT_MODEL_NAME, temperature=0.7, groq_api_key=groq_api_key)
-    prompt = ChatPromptTemplate.from_template("""
-    You are an expert content writer for LinkedIn, specializing in professional posts with a critical and negative tone.
-    Use only the provided context to inform your response.
+    # The embedding model itself is loaded once per process and shared.
+    doc_vectors = _embed_texts([doc.page_content for doc in docs], progress)
+    with stage('rag.embed_query'):
+        query_vector = np.asarray(get_embeddings(EMBEDDING_MODEL_NAME).embed_query(instruction), dtype=np.float32)
 
-    Context:
-    {context}
+    # 4. Retrieve diverse chunks (MMR) and keep only their most relevant sentences
+    progress('retrieve')
+    with stage('rag.retrieve'):
+        context = compress_context(instruction, query_vector, docs, doc_vectors)
+    print(f"Context compressed to {len(context)} chunk(s).")
 
-    Instruction:
-    {input}
+    progress('generate')
+    return _generate(instruction, context)
 
-    Write a concise LinkedIn post (under 100 words) based on the instruction, using a negative tone and including relevant hashtags.
-    """)
 
-    # 5. Create and invoke the RAG chain
+def _embed_texts(texts: list, progress=None) -> np.ndarray:
+    """
+    Embeds `texts` in length-sorted batches on the shared embedding executor,
+    reporting ('embed', done, total) as batches finish.
+    """
+    progress = progress or (lambda stage, done=None, total=None: None)
+    executor = get_embedding_executor(get_embeddings(EMBEDDING_MODEL_NAME))
+    progress('embed', 0, len(texts))
+    started = time.perf_counter()
+    with stage('rag.embed'):
+        vectors = executor.embed(texts, lambda done, total: progress('embed', done, total))
+    record_embedding_time(len(texts), time.perf_counter() - started)
+    return vectors
+
+
+def _generate(instruction: str, context: list) -> str:
+    """
+    Runs the stuff-documents chain on the retrieved (compressed) context.
+    """
+    # Imported on first use (or by the registry's warm-up), not at service start
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+
+    # 5. Initialize Chat LLM & Prompt
+    llm = get_chat_llm(CHAT_MODEL_NAME, temperature=CHAT_TEMPERATURE)
+    prompt = ChatPromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
+
+    # 6. Invoke the stuff-documents chain on the compressed context
     document_chain = create_stuff_documents_chain(llm, prompt)
-    retrieval_chain = create_retrieval_chain(retriever, document_chain)
 
     print("Invoking RAG chain...")
-    response = retrieval_chain.invoke({"input": instruction})
+    with stage('rag.generate'):
+        answer = call_with_resilience('rag.generate',
+                                      lambda: document_chain.invoke({"input": instruction, "context": context}))
+
+    return answer or "No response generated."
+
+
+def add_to_library(tenant: str, document_content: str, source: str, document_date: str = None) -> int:
+    """
+    Splits and embeds a document into the tenant's library index, replacing any
+    earlier version of the same source. Returns the number of chunks stored.
+    The old version is replaced in one write, and only once the new one is ready.
+    """
+    validate_date(document_date)
+    library = get_library(tenant)
+    with stage('rag.split'):
+        spans = SentenceAwareSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP).split_spans(document_content)
+    texts = [document_content[start:end] for start, end in spans]
+    with stage('rag.dedup'):
+        keep, _ = deduplicate(texts, 'library')
+    spans = [spans[i] for i in keep]
+    texts = [texts[i] for i in keep]
+    vectors = _embed_texts(texts)
+    with stage('rag.library_insert'):
+        if texts:
+            library.add(vectors, texts, [source] * len(texts), [document_date] * len(texts),
+                        [start for start, _ in spans], replace=True)
+        else:
+            library.delete_source(source)
+    print(f"✅ Added {len(texts)} chunks of '{source}' to the '{tenant}' library.")
+    return len(texts)
 
-    return response.get("answer", "No response generated.")
 
+def create_post_from_library(tenant: str, instruction: str, sources: list = None, date_from: str = None,
+                             date_to: str = None) -> str:
+    """
+    Generates a post grounded in the tenant's library, optionally restricted to
+    some source documents and an inclusive date range.
+    """
+    if sources is not None and (not isinstance(sources, list) or not all(isinstance(s, str) for s in sources)):
+        raise ValueError("'sources' must be a list of source names.")
+    validate_date(date_from)
+    validate_date(date_to)
+    library = get_library(tenant)
+    with stage('rag.embed_query'):
+        query_vector = np.asarray(get_embeddings(EMBEDDING_MODEL_NAME).embed_query(instruction), dtype=np.float32)
+    with stage('rag.library_search'):
+        hits = library.search(query_vector, k=RAG_FETCH_K, sources=sources, date_from=date_from, date_to=date_to,
+                              with_vectors=True)
+    if not hits:
+        raise ValueError("No library content matches the requested filters.")
 
+    from langchain_core.documents import Document
+    docs = [Document(page_content=hit['text'],
+                     metadata={"source": hit['source'], "date": hit['date'], "start_index": hit['start_index']})
+            for hit in hits]
+    with stage('rag.retrieve'):
+        context = compress_context(instruction, query_vector, docs, np.stack([hit['vector'] for hit in hits]))
+    return _generate(instruction, context)
@@ -0,0 +1,109 @@
+import re
+from bisect import bisect_right
+
+# Terminal punctuation followed by whitespace, or a line break. Kept free of lookarounds
+# and leading optional parts so the regex engine can skip ahead on the first character.
+SENTENCE_BREAK = re.compile(r'[.!?\u2026]\s+|\n\s*')
+SENTENCE_END = '.!?\u2026'
+WHITESPACE = re.compile(r'\s+')
+
+
+class SentenceAwareSplitter:
+    """
+    Splits text into chunks of at most `chunk_size` characters that end on a
+    paragraph break if possible, else a sentence end, else a word break, with
+    about `chunk_overlap` characters repeated between neighbouring chunks.
+
+    Boundaries are found in one pass over the text and chunks are (start, end)
+    offsets into it; strings are only sliced out when Documents are created.
+    Drop-in for RecursiveCharacterTextSplitter's split_text / create_documents.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, add_start_index: bool = True):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size}).")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.add_start_index = add_start_index
+        # Weaker boundaries are only used when a stronger one would leave the chunk under half full
+        self.min_fill = chunk_size // 2
+
+    @staticmethod
+    def _boundaries(text: str):
+        """
+        One pass over the sentence breaks of `text`. Returns the offsets where a
+        chunk may end on a paragraph break, and on a sentence break (a superset).
+        Word breaks are found around each chunk's limit as it is cut.
+        """
+        paragraphs, sentences = [], []
+        for match in SENTENCE_BREAK.finditer(text):
+            start, end = match.span()
+            if text[start] in SENTENCE_END:
+                start += 1
+            else:
+                # Spaces before the line break belong to the break
+                while start > 0 and text[start - 1] in ' \t':
+                    start -= 1
+            sentences.append(start)
+            if text.count('\n', start, end) >= 2:
+                paragraphs.append(start)
+        return paragraphs, sentences
+
+    def split_spans(self, text: str) -> list:
+        """
+        Returns the chunks as (start, end) offsets into `text`, trimmed of whitespace.
+        """
+        paragraphs, sentences = self._boundaries(text)
+        spans = []
+
+        leading = WHITESPACE.match(text)
+        position = leading.end() if leading else 0
+        length = len(text)
+        while length > position and text[length - 1].isspace():
+            length -= 1
+        while position < length:
+            limit = position + self.chunk_size
+            if limit >= length:
+                spans.append((position, length))
+                break
+
+            end = None
+            for boundaries in (paragraphs, sentences):
+                # Last boundary of this strength that fits and fills the chunk at least halfway
+                index = bisect_right(boundaries, limit) - 1
+                if index >= 0 and boundaries[index] > position + self.min_fill:
+                    end = boundaries[index]
+                    break
+            if end is None:
+                # Last word break in the window; the chunk ends where its whitespace run starts
+                space = max(text.rfind(c, position + 1, limit + 1) for c in ' \n\t')
+                if space > position:
+                    end = space
+                    while text[end - 1].isspace():
+                        end -= 1
+            spans.append((position, end if end is not None else limit))
+
+            # The next chunk starts at the first word inside the overlap window; without one
+            # that is the word after the boundary, or straight after a cut through a long word
+            after = WHITESPACE.search(text, max((end or limit) - self.chunk_overlap, position + 1) - 1)
+            next_start = after.end() if after else length
+            position = next_start if end is not None or next_start <= limit else limit
+        return spans
+
+    def split_text(self, text: str) -> list:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def create_documents(self, texts: list, metadatas: list = None) -> list:
+        """
+        LangChain Documents for each chunk, with 'start_index' (the chunk's offset in
+        its source text) in the metadata when add_start_index is set.
+        """
+        from langchain_core.documents import Document
+
+        documents = []
+        for i, text in enumerate(texts):
+            base = dict(metadatas[i]) if metadatas else {}
+            for start, end in self.split_spans(text):
+                metadata = dict(base, start_index=start) if self.add_start_index else dict(base)
+                documents.append(Document(page_content=text[start:end], metadata=metadata))
+        return documents
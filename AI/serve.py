@@ -0,0 +1,297 @@
+"""
+Production serving mode: preload heavy state once, then fork workers.
+
+The master process loads the requested service (or the whole gateway), warms
+the shared registry (LLM clients, embedding model, engagement pickles), freezes
+the GC so those objects aren't touched again, and only then forks the workers.
+Workers therefore share the loaded state copy-on-write instead of each loading
+their own copy. Every worker serves the same listening socket with a fixed-size
+thread pool.
+
+Usage:
+    python serve.py --service engagement --workers 4 --threads 8 --port 5001
+    python serve.py --service gateway                        # all services, prefixed, one worker
+
+Prefork safety: the style, engagement and rag services keep their cross-request
+state in SQLite or flock'd files, so any number of workers can serve them. The
+schedule service keeps its job queue, pre-generated drafts and recurring
+schedules in process memory, so it (and the gateway, which hosts it) runs in a
+single worker and ignores SIGHUP reloads, which would discard that state.
+
+Set WARM_UP_MODE=background to fork the workers straight away and let each one
+load the shared components on a background thread (faster start, no sharing),
+or WARM_UP_MODE=off to load everything on first use.
+
+Signals (sent to the master):
+    SIGHUP           graceful reload: re-exec the master with fresh code and models,
+                     fork new workers on the same socket, then drain the old ones
+    SIGTERM/SIGINT   graceful shutdown: workers finish in-flight requests and exit
+
+Metrics: every process publishes its metrics to SERVE_METRICS_DIR (by default one
+directory per port under the temp dir) every METRICS_FLUSH_SECONDS, and /metrics
+on any worker returns the sum over all of them, at most that many seconds stale.
+The directory is cleared on a fresh start and kept across SIGHUP reloads.
+"""
+import os
+import gc
+import sys
+import time
+import json
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer
+from dotenv import load_dotenv
+
+import gateway
+from common import metrics, registry
+
+# Standalone ports, matching each service's own app.run()
+DEFAULT_PORTS = {name: port for name, (_, port, _) in gateway.SERVICES.items()}
+DEFAULT_PORTS['gateway'] = int(os.getenv("GATEWAY_PORT", "5000"))
+
+# Environment variables used to hand the socket and old workers to a re-exec'd master
+LISTEN_FD_ENV = 'SERVE_LISTEN_FD'
+OLD_WORKERS_ENV = 'SERVE_OLD_WORKERS'
+
+# Services whose state lives in process memory: one worker only, no reload
+SINGLE_PROCESS_SERVICES = {'schedule'}
+
+# Seconds a stopping worker gets to finish in-flight requests before it is killed
+GRACEFUL_TIMEOUT = float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30"))
+# Where the processes publish their metrics for /metrics to merge; {port} is filled in
+METRICS_DIR = os.getenv("SERVE_METRICS_DIR", os.path.join(tempfile.gettempdir(), "ai-metrics-{port}"))
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Werkzeug WSGI server that handles connections on a bounded thread pool
+    instead of one new thread per connection.
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, threads: int, fd: int = None):
+        super().__init__(host, port, app, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='serve-worker')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def hosted_services(service: str) -> list:
+    return list(gateway.SERVICES) if service == 'gateway' else [service]
+
+
+def service_components(service: str) -> list:
+    return gateway.shared_components(hosted_services(service))
+
+
+def load_application(service: str):
+    """
+    Loads the WSGI app for one service, or for the gateway. In eager warm-up mode
+    the shared components are loaded here too, before the workers are forked;
+    in background mode each worker loads them after the fork.
+    """
+    load_dotenv()
+    eager = registry.WARM_UP_MODE == 'eager'
+    if service == 'gateway':
+        return gateway.create_gateway(warm=eager)
+    module = gateway.load_service(service)
+    if eager:
+        registry.warm_up(service_components(service))
+    return module.app
+
+
+def _create_listen_socket(host: str, port: int, backlog: int) -> socket.socket:
+    inherited_fd = os.environ.get(LISTEN_FD_ENV)
+    if inherited_fd:
+        sock = socket.socket(fileno=int(inherited_fd))
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, host: str, threads: int, components=(), metrics_dir: str = None):
+    """
+    Worker process body: serve until SIGTERM, then drain in-flight requests and exit.
+    """
+    if metrics_dir:
+        metrics.share_across_processes(metrics_dir, fresh=True)
+    if registry.WARM_UP_MODE == 'background':
+        registry.start_background_warm_up(components)
+    server = PooledWSGIServer(host, 0, app, threads=threads, fd=sock.fileno())
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so it can't run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        server.serve_forever()
+    finally:
+        server.pool.shutdown(wait=True)
+        if metrics_dir:
+            metrics.publish_metrics()
+        os._exit(0)
+
+
+class Master:
+    """
+    Forks and supervises workers; replaces any worker that dies unexpectedly.
+    """
+
+    def __init__(self, app, sock: socket.socket, host: str, workers: int, threads: int, argv: list,
+                 components=(), reloadable: bool = True, metrics_dir: str = None):
+        self.app = app
+        self.sock = sock
+        self.host = host
+        self.worker_count = workers
+        self.threads = threads
+        self.argv = argv
+        self.components = components
+        self.reloadable = reloadable
+        self.metrics_dir = metrics_dir
+        self.workers = set()
+        self.stopping = False
+        self.reload_requested = False
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.app, self.sock, self.host, self.threads, self.components, self.metrics_dir)
+        self.workers.add(pid)
+
+    def stop_workers(self, pids, timeout: float = GRACEFUL_TIMEOUT):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    remaining.discard(pid)
+            time.sleep(0.1)
+        for pid in remaining:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+    def reexec(self):
+        """
+        Replaces the master with a fresh interpreter that keeps the listening socket.
+        The new master preloads again, forks its workers, then drains the current ones.
+        """
+        print(f"🔄 Reloading: re-executing master, {len(self.workers)} old worker(s) will be drained.")
+        env = dict(os.environ)
+        env[LISTEN_FD_ENV] = str(self.sock.fileno())
+        env[OLD_WORKERS_ENV] = ','.join(str(pid) for pid in self.workers)
+        os.execve(sys.executable, [sys.executable] + self.argv, env)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        if self.metrics_dir:
+            # Published once: the master's metrics (warm-up) don't change after this, and a
+            # publishing thread could hold a metric lock at fork time
+            metrics.share_across_processes(self.metrics_dir, publish_every=0)
+
+        # Objects created so far are shared with the workers; keep the GC from writing to them
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.worker_count):
+            self.spawn_worker()
+        print(f"✅ Serving on {self.sock.getsockname()} with {self.worker_count} worker(s) "
+              f"x {self.threads} thread(s).")
+
+        old_workers = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid]
+        if old_workers:
+            self.stop_workers(old_workers)
+            print(f"✅ Drained {len(old_workers)} worker(s) from the previous master.")
+
+        while not self.stopping:
+            if self.reload_requested:
+                self.reexec()
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid and pid in self.workers:
+                self.workers.discard(pid)
+                print(f"⚠️ Worker {pid} exited unexpectedly, starting a replacement.")
+                self.spawn_worker()
+            time.sleep(0.2)
+
+        self.stop_workers(list(self.workers))
+        print("✅ All workers stopped.")
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        if not self.reloadable:
+            print("⚠️ Reload ignored: the service keeps its jobs in process memory; restart it explicitly.")
+            return
+        self.reload_requested = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--service', default='gateway', choices=sorted(DEFAULT_PORTS))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=None, help="Defaults to the service's standalone port.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Defaults to SERVE_WORKERS or the CPU count; always 1 for single-process services.")
+    parser.add_argument('--threads', type=int, default=int(os.getenv("SERVE_THREADS", "8")))
+    parser.add_argument('--backlog', type=int, default=1024)
+    args = parser.parse_args()
+
+    stateful = sorted(SINGLE_PROCESS_SERVICES.intersection(hosted_services(args.service)))
+    if args.workers is None:
+        args.workers = 1 if stateful else int(os.getenv("SERVE_WORKERS", os.cpu_count() or 1))
+    elif args.workers > 1 and stateful:
+        parser.error(f"--service {args.service} hosts {', '.join(stateful)}, which keeps its state in process "
+                     f"memory and must run with --workers 1")
+
+    port = args.port if args.port is not None else DEFAULT_PORTS[args.service]
+    reloading = LISTEN_FD_ENV in os.environ
+    sock = _create_listen_socket(args.host, port, args.backlog)
+    metrics_dir = METRICS_DIR.format(port=port)
+    if not reloading and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):  # Left by a previous server on this port
+            os.remove(os.path.join(metrics_dir, name))
+    app = load_application(args.service)
+    print(json.dumps({"service": args.service, "shared_components": registry.loaded_components()}))
+    Master(app, sock, args.host, args.workers, args.threads, [os.path.abspath(__file__)] + sys.argv[1:],
+           service_components(args.service), reloadable=not stateful, metrics_dir=metrics_dir).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Multi-process metrics test: with serve.py's shared metrics directory, /metrics
+on any worker must report the sum over every worker, not just its own.
+
+    python -m pytest tests/test_metrics.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import metrics
+
+
+def test_render_sums_forked_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, '_shared_dir', None)  # Restored after the test
+    requests = metrics.counter('test_requests_total', 'Requests handled.', ['route'])
+    latency = metrics.histogram('test_latency_seconds', 'Request latency.', buckets=(0.1, 1))
+    requests.inc(route='/warm-up')  # In the parent before forking, like a preloading master
+    metrics.share_across_processes(str(tmp_path), publish_every=0)
+
+    for worker in range(3):
+        pid = os.fork()
+        if pid == 0:
+            metrics.share_across_processes(str(tmp_path), fresh=True, publish_every=0)
+            requests.inc(worker + 1, route='/predict')
+            latency.observe(0.5)
+            metrics.publish_metrics()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+    rendered = metrics.render_prometheus()
+    assert 'test_requests_total{route="/warm-up"} 1' in rendered
+    assert 'test_requests_total{route="/predict"} 6' in rendered
+    assert 'test_latency_seconds_bucket{le="1.0"} 3' in rendered
+    assert 'test_latency_seconds_count 3' in rendered
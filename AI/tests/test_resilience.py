@@ -0,0 +1,69 @@
+"""
+Circuit-breaker tests: the half-open probe must always settle the breaker, so a
+probe that fails with a non-transient error does not leave it jammed half-open.
+
+    python -m pytest tests/test_resilience.py
+"""
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.resilience import CircuitOpenError, call_with_resilience, call_with_resilience_async, get_breaker
+
+
+def _expire(breaker: str):
+    """Puts the breaker in the open state with its reset timeout already elapsed."""
+    circuit = get_breaker(breaker)
+    circuit.state = 'open'
+    circuit.opened_at = time.monotonic() - circuit.reset_seconds - 1
+    return circuit
+
+
+def _bad_request():
+    raise ValueError("bad request")
+
+
+def test_non_transient_probe_error_closes_breaker():
+    circuit = _expire('test-probe-sync')
+    with pytest.raises(ValueError):
+        call_with_resilience('test', _bad_request, breaker='test-probe-sync', hedge=False)
+    assert circuit.state == 'closed'
+    assert call_with_resilience('test', lambda: 1, breaker='test-probe-sync', hedge=False) == 1
+
+
+def test_non_transient_probe_error_closes_breaker_async():
+    circuit = _expire('test-probe-async')
+
+    async def bad_request():
+        _bad_request()
+
+    async def ok():
+        return 1
+
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_resilience_async('test', bad_request, breaker='test-probe-async', hedge=False))
+    assert circuit.state == 'closed'
+    assert asyncio.run(call_with_resilience_async('test', ok, breaker='test-probe-async', hedge=False)) == 1
+
+
+def test_cancelled_probe_reopens_breaker():
+    circuit = _expire('test-probe-cancel')
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(call_with_resilience_async('test', slow, breaker='test-probe-cancel'))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert circuit.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        call_with_resilience('test', lambda: 1, breaker='test-probe-cancel')
@@ -0,0 +1,31 @@
+"""
+Startup-time regression test: the LLM services must load within a time budget
+and without importing the integrations deferred to first use or warm-up
+(langchain, torch, ...). Runs bench/import_report.py, which loads each service
+in a fresh interpreter the way gateway.py does.
+
+    python -m pytest tests/test_startup.py
+    STARTUP_BUDGET_MS=800 python -m pytest tests/test_startup.py
+"""
+import os
+import sys
+import json
+import subprocess
+
+AI_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_REPORT = os.path.join(AI_ROOT, 'bench', 'import_report.py')
+
+# Generous for CI machines; the services load in a few hundred ms on a laptop
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "2000"))
+# The engagement service loads its models at import on purpose (serve.py preloads them before forking)
+BUDGETED_SERVICES = ['style', 'rag', 'schedule']
+
+
+def test_services_start_within_budget():
+    result = subprocess.run(
+        [sys.executable, IMPORT_REPORT, '--services', *BUDGETED_SERVICES, '--budget-ms', str(STARTUP_BUDGET_MS)],
+        cwd=AI_ROOT, capture_output=True, text=True)
+    report = json.loads(result.stdout) if result.stdout.strip() else {}
+    assert result.returncode == 0, f"{result.stderr}\n{json.dumps(report.get('services', {}), indent=2)}"
+    for name in BUDGETED_SERVICES:
+        assert report['services'][name]['deferred_loaded'] == []